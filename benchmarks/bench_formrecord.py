@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory held by many loaded forms as plain dicts against FormRecords.
+
+Each form is decoded from its own JSON text, as it would be when read from
+its own file, so the dicts carry their own copies of every field label.
+Reports the tracemalloc size of the whole collection and the cost of
+converting each way.
+
+    python3 benchmarks/bench_formrecord.py --forms 10000 100000
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from synthetic import inspection_form
+
+from formrecord import FormRecord, ValuePool
+
+
+def measure(build):
+    """
+    (result, bytes still allocated by build(), seconds)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the memory used by form dicts and FormRecords')
+    parser.add_argument('--forms', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'forms':>8} {'layout':<18} {'MiB':>8} {'bytes/form':>11} {'seconds':>8}")
+    for count in args.forms:
+        texts = [json.dumps(inspection_form(n)) for n in range(count)]
+        rows = {}
+        dicts, rows["dict"], elapsed_dicts = measure(lambda: [json.loads(text) for text in texts])
+        timings = {"dict": elapsed_dicts}
+        records, rows["FormRecord"], timings["FormRecord"] = measure(
+            lambda: [FormRecord.from_json(text) for text in texts])
+        pooled, rows["FormRecord+pool"], timings["FormRecord+pool"] = measure(
+            lambda: (lambda pool: [FormRecord.from_json(text, pool=pool) for text in texts])(ValuePool()))
+        for layout, size in rows.items():
+            print(f"{count:>8} {layout:<18} {size / 2 ** 20:>8.1f} {size / count:>11.0f} {timings[layout]:>8.2f}")
+
+        start = time.perf_counter()
+        for record in records:
+            record.to_dict()
+        to_dict = time.perf_counter() - start
+        start = time.perf_counter()
+        for data in dicts:
+            FormRecord.from_dict(data)
+        from_dict = time.perf_counter() - start
+        assert records[-1].to_dict() == dicts[-1] and pooled[-1] == dicts[-1]
+        print(f"{'':>8} to_dict {to_dict / count * 1e6:.2f} us/form, from_dict {from_dict / count * 1e6:.2f} us/form, "
+              f"{rows['dict'] / rows['FormRecord+pool']:.1f}x smaller with a pool")
+        del dicts, records, pooled
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
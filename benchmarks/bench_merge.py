@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark: streaming mail-merge throughput and peak memory against source size.
+
+Generates CSV files of increasing length and merges each with the zip engine,
+reporting forms/s and the tracemalloc peak. The peak should stay flat as the
+row count grows.
+
+    python3 benchmarks/bench_merge.py --rows 500 5000 20000
+"""
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import synthetic  # noqa: F401  (puts src/ on the path)
+
+from formfields import input_fields
+from merge import run_merge
+from render import load_engine
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'template.docx')
+
+
+def write_source(path, rows):
+    fields = input_fields()
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        for n in range(rows):
+            writer.writerow([f"{field} {n}" for field in fields])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the streaming mail-merge')
+    parser.add_argument('--rows', type=int, nargs='+', default=[500, 5000])
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--template', default=TEMPLATE_PATH)
+    args = parser.parse_args()
+
+    load_engine(args.template, 'zip')  # Keep template compilation out of the measurements
+    print(f"{'rows':>8} {'seconds':>9} {'forms/s':>9} {'peak MiB':>9}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, 'jobs.csv')
+            write_source(source, rows)
+            tracemalloc.start()
+            start = time.perf_counter()
+            stats = run_merge(source, os.path.join(tmp_dir, 'out'), args.template, write_json=False,
+                              workers=args.workers, engine='zip', checkpoint_every=1000)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        print(f"{rows:>8} {elapsed:>9.2f} {stats.rendered / elapsed:>9.1f} {peak / 2 ** 20:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
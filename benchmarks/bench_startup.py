@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: what importing the GUI module costs, measured with -X importtime.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter, reports the
+total import time and the most expensive modules, and fails if python-docx is
+imported at startup (it should only load on first render) or if the import
+takes longer than --max-import-ms. With a display available it also times
+building the window, up to the point it is first shown.
+
+    python3 benchmarks/bench_startup.py --repeat 5 --max-import-ms 150
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+# Modules that must not be imported until something is rendered
+DEFERRED_MODULES = ('docx', 'lxml')
+
+
+def parse_importtime(stderr):
+    """
+    Map module name -> (self us, cumulative us, nesting depth) from -X importtime output
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.rstrip()[1:]  # One space after the bar, then two per nesting level
+        depth = (len(name) - len(name.lstrip())) // 2
+        times[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return times
+
+
+def measure_import(module='main'):
+    """
+    Import module in a fresh interpreter; returns (wall seconds, importtime table)
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SRC_DIR, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return elapsed, parse_importtime(result.stderr)
+
+
+def measure_window():
+    """
+    Seconds from creating the Tk root to the first window update, in a fresh interpreter
+    """
+    code = (
+        "import time; start = time.perf_counter()\n"
+        "import tkinter as tk, main\n"
+        "root = tk.Tk(); app = main.InspectionFormApp(root)\n"
+        "root.update(); print(time.perf_counter() - start)\n"
+        "app.worker.shutdown(); app.global_store.close(); root.destroy()\n"
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=SRC_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Building the window failed:\n{result.stderr[-2000:]}")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark GUI startup imports')
+    parser.add_argument('--module', default='main', help='Module to import (from src/)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='Number of heaviest modules to list')
+    parser.add_argument('--max-import-ms', type=float, default=None,
+                        help='Fail if importing the module takes longer than this')
+    args = parser.parse_args()
+
+    runs = [measure_import(args.module) for _ in range(args.repeat)]
+    wall, times = min(runs, key=lambda run: run[1][args.module][1])
+    import_ms = times[args.module][1] / 1000
+
+    print(f"import {args.module}: {import_ms:.1f} ms (best of {args.repeat}, {wall * 1000:.0f} ms interpreter wall time)")
+    top_level = sorted(((cumulative, name) for name, (_, cumulative, depth) in times.items() if depth <= 1),
+                       reverse=True)
+    for cumulative, name in top_level[:args.top]:
+        print(f"  {name:<30} {cumulative / 1000:8.1f} ms")
+
+    failed = False
+    deferred = sorted(name for name in times if name.split('.')[0] in DEFERRED_MODULES)
+    if deferred:
+        print(f"FAIL: imported at startup but should load on first render: {', '.join(deferred[:5])}")
+        failed = True
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"FAIL: import took {import_ms:.1f} ms, limit is {args.max_import_ms:.1f} ms")
+        failed = True
+
+    if os.environ.get('DISPLAY') or sys.platform in ('win32', 'darwin'):
+        print(f"window shown after {measure_window() * 1000:.1f} ms")
+    else:
+        print("No display available; skipping the window timing")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite and performance regression gate.
+
+Measures, on synthetic inputs of increasing size:
+
+- render latency (median and p90) and peak traced memory per template size and engine
+- batch throughput (forms/s, including the JSON written alongside each DOCX)
+- global.json store costs: load, adding an unchanged record, adding a new
+  record (journal append with fsync) and compaction (full rewrite), for
+  stores of 10k to 100k records
+
+Results can be saved as a baseline and later runs checked against it; any
+metric that is worse than the baseline by more than --threshold fails the
+run. Timings are normalised by a calibration workload run just before each
+group of measurements, which absorbs most drift in machine speed (frequency
+scaling, other load), but a baseline is still only meaningful on the machine
+that recorded it.
+
+    python3 benchmarks/bench_suite.py --save-baseline --rounds 3
+    python3 benchmarks/bench_suite.py --check --rounds 3 --threshold 0.25
+    python3 benchmarks/bench_suite.py --quick --check
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from synthetic import build_template, form_data_for, global_details
+
+from globalstore import GlobalDetailsStore, atomic_write_json
+from render import load_engine, render_form
+from template import CompiledTemplate
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_THRESHOLD = 0.25
+
+# name -> build_template arguments, smallest first
+TEMPLATE_SIZES = {
+    "small": dict(paragraphs=20, tables=2, rows=4, cols=3, placeholders_per_cell=1, fields=30),
+    "medium": dict(paragraphs=100, tables=10, rows=6, cols=4, placeholders_per_cell=2, fields=100),
+    "large": dict(paragraphs=300, tables=30, rows=8, cols=6, placeholders_per_cell=3, fields=300,
+                  filler_paragraphs=500),
+}
+STORE_SIZES = (10000, 50000, 100000)
+ENGINES = ('docx', 'zip')
+# Fast operations are repeated until they cover at least this long
+MIN_MEASURE_SECONDS = 0.3
+MAX_RUNS = 1000
+# Batches rendered for the throughput figure; the best is kept
+BATCH_ROUNDS = 3
+# Differences smaller than this are timer noise, whatever the percentage
+NOISE_FLOOR = {"ms": 0.5, "us": 0.5}
+# Units that scale with machine speed
+TIMED_UNITS = ("ms", "us", "forms/s")
+
+
+class Metric:
+    """
+    One measured value; higher_is_better for rates, lower for times and sizes.
+    Tail figures are too noisy to gate on, so they are reported with gated=False.
+    """
+
+    def __init__(self, name, value, unit, higher_is_better=False, gated=True, calibration=None):
+        self.name = name
+        self.value = value
+        self.unit = unit
+        self.higher_is_better = higher_is_better
+        self.gated = gated
+        # calibrate() result taken just before this metric's group was measured
+        self.calibration = calibration
+
+    def to_dict(self):
+        return {"value": self.value, "unit": self.unit, "higher_is_better": self.higher_is_better,
+                "gated": self.gated, "calibration": self.calibration}
+
+
+def timed(function, repeat):
+    """
+    Wall times of repeat calls to function()
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def calibrate(repeat=7):
+    """
+    Best time of a fixed pure-Python workload, as a measure of how fast the
+    machine is running right now (CPU frequency scaling, noisy neighbours)
+    """
+    records = [{"name": f"Record {n}", "value": str(n * 7919 % 10007)} for n in range(20000)]
+
+    def workload():
+        text = json.dumps(records)
+        sorted(json.loads(text), key=lambda record: record["value"])
+
+    return min(timed(workload, repeat))
+
+
+def bench_template(size, params, tmp_dir, repeat, batch):
+    path = os.path.join(tmp_dir, f"{size}.docx")
+    names = build_template(path, **params)
+    form_data = form_data_for(names)
+    compiled = CompiledTemplate.compile(path)
+    metrics = []
+    for engine_name in ENGINES:
+        engine = load_engine(path, engine_name) if engine_name == 'zip' else compiled
+        prefix = f"render.{engine_name}.{size}"
+        # Warm up, and run fast renders more often so each figure covers enough time to be stable
+        warm_up = min(timed(lambda: engine.render(form_data, io.BytesIO()), 3))
+        runs = max(repeat, min(MAX_RUNS, int(MIN_MEASURE_SECONDS / warm_up)))
+
+        times = sorted(timed(lambda: engine.render(form_data, io.BytesIO()), runs))
+        metrics.append(Metric(f"{prefix}.latency_p50_ms", statistics.median(times) * 1000, "ms"))
+        metrics.append(Metric(f"{prefix}.latency_p90_ms", times[int(0.9 * (len(times) - 1))] * 1000, "ms",
+                              gated=False))
+
+        tracemalloc.start()
+        engine.render(form_data, io.BytesIO())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        metrics.append(Metric(f"{prefix}.peak_mib", peak / 2 ** 20, "MiB"))
+
+        out_dir = os.path.join(tmp_dir, f"out-{engine_name}-{size}")
+        os.makedirs(out_dir)
+
+        forms = max(batch, min(MAX_RUNS, int(MIN_MEASURE_SECONDS / warm_up)))
+
+        def render_batch():
+            for n in range(forms):
+                result = render_form(form_data, os.path.join(out_dir, f"form-{n}.docx"), engine)
+                if not result.ok:
+                    raise RuntimeError(result.error)
+
+        elapsed = min(timed(render_batch, BATCH_ROUNDS))
+        metrics.append(Metric(f"{prefix}.throughput_per_s", forms / elapsed, "forms/s", higher_is_better=True))
+        shutil.rmtree(out_dir)
+    return metrics
+
+
+def bench_store(records, tmp_dir, repeat):
+    path = os.path.join(tmp_dir, f"global-{records}.json")
+    atomic_write_json(path, global_details(records))
+    prefix = f"store.{records}"
+    metrics = [Metric(f"{prefix}.file_mib", os.path.getsize(path) / 2 ** 20, "MiB")]
+
+    store = GlobalDetailsStore(path, flush_delay=0)
+    metrics.append(Metric(f"{prefix}.load_ms", min(timed(store.load, repeat)) * 1000, "ms"))
+
+    existing = dict(store.records("appointed_competent_person")[records // 4])
+    unchanged = timed(lambda: store.add("appointed_competent_person", existing), repeat * 100)
+    metrics.append(Metric(f"{prefix}.add_unchanged_us", statistics.median(unchanged) * 1e6, "us"))
+
+    counter = iter(range(10 ** 9))
+    added = timed(lambda: store.add("building_certifier",
+                                    {"name": f"New certifier {next(counter)}", "approval_number": "BA1"}), repeat)
+    metrics.append(Metric(f"{prefix}.add_new_ms", statistics.median(added) * 1000, "ms"))
+
+    metrics.append(Metric(f"{prefix}.compact_ms", min(timed(store.compact, repeat)) * 1000, "ms"))
+    store.close()
+    return metrics
+
+
+def run_suite(template_sizes, store_sizes, repeat=15, batch=20, progress=None):
+    """
+    Run every benchmark; returns {metric name: Metric}
+    """
+    results = {}
+
+    def add(metrics, calibration):
+        for metric in metrics:
+            metric.calibration = calibration
+            results[metric.name] = metric
+            if progress:
+                progress(metric)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in template_sizes:
+            calibration = calibrate()
+            add(bench_template(size, TEMPLATE_SIZES[size], tmp_dir, repeat, batch), calibration)
+        for records in store_sizes:
+            calibration = calibrate()
+            add(bench_store(records, tmp_dir, max(3, repeat // 3)), calibration)
+    return results
+
+
+def best_of(rounds):
+    """
+    Merge several runs of the suite, keeping each metric's best value; noise
+    only ever makes a run slower, so the best is the most repeatable figure
+    """
+    best = {}
+    for results in rounds:
+        for name, metric in results.items():
+            kept = best.get(name)
+            if kept is None or (metric.value > kept.value if metric.higher_is_better else metric.value < kept.value):
+                best[name] = metric
+    return best
+
+
+def compare(results, baseline, threshold):
+    """
+    (name, baseline value, current value, relative change) for every metric
+    worse than the baseline by more than threshold. Timings and rates are first
+    scaled by how much faster or slower the machine ran than when the baseline
+    was recorded, according to the calibration workload.
+    """
+    regressions = []
+    for name, metric in results.items():
+        previous = baseline.get(name)
+        if not metric.gated or not previous or not previous["value"]:
+            continue
+        value = metric.value
+        if metric.unit in TIMED_UNITS and metric.calibration and previous.get("calibration"):
+            speed = metric.calibration / previous["calibration"]
+            value = value * speed if metric.higher_is_better else value / speed
+        if abs(value - previous["value"]) < NOISE_FLOOR.get(metric.unit, 0):
+            continue
+        change = (value - previous["value"]) / previous["value"]
+        worse = -change if metric.higher_is_better else change
+        if worse > threshold:
+            regressions.append((name, previous["value"], value, worse))
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, 'r') as f:
+        return json.load(f)["metrics"]
+
+
+def save_baseline(path, results):
+    atomic_write_json(path, {
+        "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "machine": os.uname().machine if hasattr(os, 'uname') else sys.platform,
+        "metrics": {name: metric.to_dict() for name, metric in sorted(results.items())},
+    })
+
+
+def print_metric(metric):
+    print(f"{metric.name:<40} {metric.value:>12.3f} {metric.unit}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite with a regression gate')
+    parser.add_argument('--quick', action='store_true',
+                        help='Small and medium templates and a 10k-record store only')
+    parser.add_argument('--repeat', type=int, default=15, help='Renders timed per template and engine')
+    parser.add_argument('--batch', type=int, default=20, help='Forms rendered for the throughput figure')
+    parser.add_argument('--rounds', type=int, default=1,
+                        help='Run the suite this many times and keep the best figures (steadier on busy machines)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline results file')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the baseline')
+    parser.add_argument('--check', action='store_true', help='Fail if any metric regressed past --threshold')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed slowdown as a fraction of the baseline (0.25 = 25%%)')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    template_sizes = ['small', 'medium'] if args.quick else list(TEMPLATE_SIZES)
+    store_sizes = STORE_SIZES[:1] if args.quick else STORE_SIZES
+    rounds = []
+    for number in range(1, max(1, args.rounds) + 1):
+        if args.rounds > 1:
+            print(f"Round {number} of {args.rounds}")
+        rounds.append(run_suite(template_sizes, store_sizes, args.repeat, args.batch, progress=print_metric))
+    results = best_of(rounds)
+
+    if args.json:
+        save_baseline(args.json, results)
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+    if not args.check:
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; record one with --save-baseline")
+        return 1
+
+    regressions = compare(results, load_baseline(args.baseline), args.threshold)
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} of {args.baseline}")
+        return 0
+    print(f"{len(regressions)} metrics regressed beyond {args.threshold:.0%}:")
+    for name, previous, current, worse in regressions:
+        print(f"  {name}: {previous:.3f} -> {current:.3f} ({worse:+.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
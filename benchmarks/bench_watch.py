@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark: watch-folder rescan cost against archive size.
+
+Fills a directory tree with saved forms that are already recorded in the
+watch state, then times a rescan that finds nothing to do. Only stat calls
+should be involved, so a rescan of tens of thousands of files takes a
+fraction of a second.
+
+    python3 benchmarks/bench_watch.py --files 1000 10000 50000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import synthetic  # noqa: F401  (puts src/ on the path)
+
+from watch import FolderWatcher
+
+
+class _Template:
+    hash = "bench"
+    engine = "zip"
+
+
+def populate(watcher, files, per_dir=500):
+    for n in range(files):
+        directory = os.path.join(watcher.source_dir, f"site-{n // per_dir:04d}")
+        if n % per_dir == 0:
+            os.makedirs(directory)
+        path = os.path.join(directory, f"form-{n}.json")
+        with open(path, 'w') as f:
+            json.dump({"Job no": str(n)}, f)
+        stat = os.stat(path)
+        watcher.state.record(watcher._rel(path), (stat.st_mtime_ns, stat.st_size), "0" * 64)
+    watcher.state.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark watch-folder rescans')
+    parser.add_argument('--files', type=int, nargs='+', default=[1000, 10000])
+    args = parser.parse_args()
+
+    print(f"{'files':>8} {'rescan ms':>10} {'state KiB':>10}")
+    for files in args.files:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, 'drop')
+            os.makedirs(source)
+            populate(FolderWatcher(source, os.path.join(tmp_dir, 'out'), _Template()), files)
+            start = time.perf_counter()
+            watcher = FolderWatcher(source, os.path.join(tmp_dir, 'out'), _Template())
+            assert watcher.run_once() == []
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(watcher.state.path)
+        print(f"{files:>8} {elapsed * 1000:>10.1f} {size / 1024:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Synthetic templates and form data for benchmarks.
+
+Placeholders are written the way Word tends to store them, split across
+three runs ("<<", field name, ">>"), so run-aware replacement is exercised.
+"""
+
+import os
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+from docx import Document
+
+
+def field_names(count):
+    return [f"Synthetic field {i}" for i in range(count)]
+
+
+def _add_placeholders(paragraph, names):
+    for index, name in enumerate(names):
+        if index:
+            paragraph.add_run(" / ")
+        paragraph.add_run("<<")
+        paragraph.add_run(name).bold = True
+        paragraph.add_run(">>")
+
+
+def build_template(path, paragraphs=50, tables=10, rows=5, cols=4, placeholders_per_cell=1,
+                   fields=100, filler_paragraphs=0):
+    """
+    Write a DOCX template and return the field names it uses.
+    Body paragraphs hold one placeholder each and every table cell holds
+    placeholders_per_cell of them, cycling through `fields` distinct names.
+    filler_paragraphs adds plain text paragraphs with no placeholders.
+    """
+    names = field_names(fields)
+    doc = Document()
+    counter = 0
+
+    def next_names(count):
+        nonlocal counter
+        chosen = [names[(counter + i) % len(names)] for i in range(count)]
+        counter += count
+        return chosen
+
+    for _ in range(paragraphs):
+        _add_placeholders(doc.add_paragraph("Label: "), next_names(1))
+    for i in range(filler_paragraphs):
+        doc.add_paragraph(f"Filler paragraph {i} with no placeholders in it at all.")
+    for _ in range(tables):
+        table = doc.add_table(rows=rows, cols=cols)
+        for row in table.rows:
+            for cell in row.cells:
+                _add_placeholders(cell.paragraphs[0], next_names(placeholders_per_cell))
+    doc.save(path)
+    return names
+
+
+def form_data_for(names):
+    return {name: f"Value for {name}" for name in names}
+
+
+def global_details(records):
+    """
+    A global.json store with `records` entries, split evenly between building
+    certifiers and appointed competent persons
+    """
+    from formfields import COMPETENT_PERSON_FIELDS
+
+    certifiers = [{"name": f"Certifier {n}", "contact": f"A{1000000 + n}", "approval_number": f"BA{n:05d}"}
+                  for n in range(records // 2)]
+    people = []
+    for n in range(records - len(certifiers)):
+        person = {field: f"{field} {n}" for field in COMPETENT_PERSON_FIELDS}
+        person["name"] = f"Competent person {n}"
+        people.append(person)
+    return {"building_certifier": certifiers, "appointed_competent_person": people}
+
+
+def inspection_form(n):
+    """
+    A filled-in Form 12 that looks like a real one: unique address and
+    description, a certifier and competent person from a small pool, a
+    state, suburb and dates that repeat across forms, and some fields left empty
+    """
+    from formfields import input_fields
+
+    form = dict.fromkeys(input_fields(), "")
+    del form["Signature (Manual)"]
+    suburb = ("Charleville", "Augathella", "Morven", "Cooladdi")[n % 4]
+    date = f"2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}"
+    form.update({
+        "Aspect of building work (indicate the aspect)": ("Footing", "Slab", "Frame", "Final")[n % 4] + " inspection",
+        "Street address": f"{n % 400 + 1} {('Alfred', 'Galatea', 'Edward', 'Wills')[n % 4]} Street",
+        "Suburb/locality": suburb,
+        "State": "QLD",
+        "Postcode": "4470",
+        "Lot and plan details": f"Lot {n % 97 + 1} RP{100000 + n}",
+        "Local government area the land is situated in": "Murweh Shire Council",
+        "Building/structure description": f"Class 1a dwelling, job {n}",
+        "Class of building/structure": "1a",
+        "Description of the extent of aspect/s certified": f"Inspected {suburb.lower()} job {n} to the approved plans.",
+        "Basis of certification": "Visual inspection against the approved plans and NCC Volume Two.",
+        "Building certifier's name (in full)": f"Certifier {n % 25}",
+        "Building certifier reference number": f"A{1000000 + n % 25}",
+        "Building development approval number": f"BA{n:06d}",
+        "Appointed competent person name (in full)": f"Competent person {n % 10}",
+        "Company name (if applicable)": "Murweh Shire Council",
+        "State (postal)": "QLD",
+        "Licence class or registration type (if applicable)": "RPEQ",
+        "Date request to inspect received from building certifier": date,
+        "Date (signature)": date,
+    })
+    return form
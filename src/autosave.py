@@ -0,0 +1,232 @@
+"""
+Crash-safe autosave journal for the form being edited.
+
+The GUI reports every field edit (Entry and Text changes arrive through
+FormModel listeners) to AutosaveJournal.record(), which only updates a dict
+in memory, so it is cheap enough to call on every keystroke. The first edit
+after a write starts a timer; when it fires, everything edited since is
+appended to the journal as one JSON line and fsynced together, on the
+timer's thread rather than the Tk main loop. Edits are therefore on disk
+within FLUSH_DELAY seconds, however fast the user types.
+
+Journal lines, one JSON object each:
+
+    {"snapshot": {...all fields...}, "path": ..., "dirty": false, "ts": ...}
+    {"set": {"Street address": "12 Alfred St"}, "ts": ...}
+    {"saved": "job.json", "clean": true, "ts": ...}
+
+A snapshot starts the journal. Loading or resetting the form, and every
+COMPACT_THRESHOLD lines, rewrite it as a single snapshot with an atomic
+rename, so the file stays small. read_journal() replays it after a crash or
+on the next start; a torn last line is ignored.
+"""
+
+import json
+import os
+import threading
+import time
+
+AUTOSAVE_PATH = '.form12_autosave.jsonl'
+# Seconds between the first unsaved edit and the write that covers it
+FLUSH_DELAY = 1.0
+# Journal lines appended before it is rewritten as one snapshot
+COMPACT_THRESHOLD = 500
+
+
+class AutosaveState:
+    """
+    The form as recovered from a journal
+    """
+
+    def __init__(self, fields, json_path, dirty, modified):
+        self.fields = fields
+        self.json_path = json_path
+        # True if there are edits that were never saved to a form file
+        self.dirty = dirty
+        self.modified = modified
+
+
+def read_journal(path=AUTOSAVE_PATH):
+    """
+    Replay a journal; returns an AutosaveState, or None if there is nothing to recover
+    """
+    try:
+        with open(path, 'rb') as f:
+            lines = f.read().split(b"\n")
+    except OSError:
+        return None
+    fields, json_path, dirty, modified = None, None, False, None
+    # The last piece has no newline: either empty or a write cut short by a crash
+    for line in lines[:-1]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if "snapshot" in entry:
+            fields = dict(entry["snapshot"])
+            json_path = entry.get("path")
+            dirty = entry.get("dirty", False)
+        elif fields is None:
+            continue
+        elif "set" in entry:
+            fields.update(entry["set"])
+            dirty = True
+        elif "saved" in entry:
+            json_path = entry["saved"]
+            dirty = dirty and not entry.get("clean", True)
+        modified = entry.get("ts", modified)
+    if fields is None:
+        return None
+    return AutosaveState(fields, json_path, dirty, modified)
+
+
+class AutosaveJournal:
+    """
+    Debounced, batched journal of field edits for one form
+    """
+
+    def __init__(self, path=AUTOSAVE_PATH, flush_delay=FLUSH_DELAY, compact_threshold=COMPACT_THRESHOLD):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.compact_threshold = compact_threshold
+        # Edits recorded so far; save_form compares it to tell whether the form changed while saving
+        self.sequence = 0
+        self.stats = {"edits": 0, "writes": 0, "compactions": 0}
+        # Queued entries in order; consecutive edits share one "set" entry
+        self._queue = []
+        self._snapshot = None
+        self._timer = None
+        self._lock = threading.Lock()
+        # Held while writing, so the timer thread and close() don't interleave
+        self._write_lock = threading.Lock()
+        # The form as written so far
+        self._fields = {}
+        self._json_path = None
+        self._dirty = False
+        self._lines = 0
+        self._rewrite = True
+
+    def start(self, fields, json_path=None, dirty=False):
+        """
+        Begin journalling a newly loaded, reset or restored form; replaces
+        whatever was queued and rewrites the journal as one snapshot
+        """
+        with self._lock:
+            self._queue = []
+            self._snapshot = (dict(fields), json_path, dirty)
+            self._schedule(0)
+
+    def record(self, field_name, value):
+        """
+        Note one edit; called on the Tk main loop for every change
+        """
+        with self._lock:
+            self.sequence += 1
+            self.stats["edits"] += 1
+            if self._queue and "set" in self._queue[-1]:
+                self._queue[-1]["set"][field_name] = value
+            else:
+                self._queue.append({"set": {field_name: value}})
+            self._schedule(self.flush_delay)
+
+    def mark_saved(self, json_path, sequence):
+        """
+        Note that the form was written to json_path when self.sequence was
+        sequence; edits made since then still count as unsaved
+        """
+        with self._lock:
+            self._queue.append({"saved": json_path, "clean": sequence == self.sequence})
+            self._schedule(0)
+
+    def _schedule(self, delay):
+        # The timer isn't pushed back by later edits, so a write is never put off for long
+        if self._timer is not None:
+            if delay > 0:
+                return
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """
+        Write everything queued: one append and one fsync, or a rewrite as a snapshot
+        """
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                queue, self._queue = self._queue, []
+                snapshot, self._snapshot = self._snapshot, None
+            if snapshot is None and not queue:
+                return
+            now = round(time.time(), 3)
+            if snapshot is not None:
+                self._fields, self._json_path, self._dirty = snapshot
+                self._rewrite = True
+            for entry in queue:
+                entry["ts"] = now
+                if "set" in entry:
+                    self._fields.update(entry["set"])
+                    self._dirty = True
+                else:
+                    self._json_path = entry["saved"]
+                    self._dirty = self._dirty and not entry["clean"]
+            try:
+                if self._rewrite or self._lines + len(queue) >= self.compact_threshold:
+                    self._write_snapshot(now)
+                else:
+                    self._append(queue)
+            except OSError as e:
+                # The in-memory form is up to date; rewrite it whole next time
+                self._rewrite = True
+                print(f"Error writing autosave journal: {e}")
+
+    def _append(self, entries):
+        data = "".join(json.dumps(entry) + "\n" for entry in entries).encode('utf-8')
+        with open(self.path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._lines += len(entries)
+        self.stats["writes"] += 1
+
+    def _write_snapshot(self, now):
+        entry = {"snapshot": self._fields, "path": self._json_path, "dirty": self._dirty, "ts": now}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._lines = 1
+        self._rewrite = False
+        self.stats["compactions"] += 1
+
+    def close(self):
+        """
+        Write anything still queued; the journal is kept so unsaved work survives the next start
+        """
+        self.flush()
+
+    def discard(self):
+        """
+        Forget the journal, e.g. when the user chooses not to restore it
+        """
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                self._queue = []
+                self._snapshot = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self._rewrite = True
+
+    def stats_summary(self):
+        return ("Autosave: {edits} edits, {writes} journal writes, "
+                "{compactions} compactions").format(**self.stats)
@@ -0,0 +1,207 @@
+"""
+Streamed bundles: many rendered forms in one ZIP archive.
+
+For a submission every inspection of a project goes to the certifier
+together. BundleWriter renders each form into memory and writes the DOCX
+and its JSON straight into the archive as they are produced, so nothing is
+written to disk but the bundle itself and memory use is one document,
+however many forms it holds (plus a few KB per form for the central
+directory and the manifest, which are written at the end). The archive
+never needs to seek (entries on a pipe carry data descriptors), so it can
+go to stdout or a socket as well as a file, and ZIP64 records are used once
+it passes 4 GiB or 65,535 entries.
+
+manifest.json is written last: the template's hash, and for every form its
+source and the size and SHA-256 of each file, plus the forms that failed.
+
+    python3 src/main.py bundle --batch "jobs/*.json" --out project-12.zip
+    python3 src/main.py bundle --batch "jobs/*.json" --out - | ssh host 'cat > project-12.zip'
+    python3 src/main.py bundle --batch "jobs/*.json" --connect intake.local:9000
+"""
+
+import hashlib
+import io
+import json
+import os
+import socket
+import sys
+import time
+import zipfile
+
+import instrumentation
+from render import JobResult, expand_batch_paths, format_summary, load_engine, load_form_data
+from template import ZIP_TIMESTAMP
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+class BundleWriter:
+    """
+    Writes rendered forms into a ZIP archive on a binary stream, front to back
+    """
+
+    def __init__(self, output, template, write_json=True):
+        self.template = template
+        self.write_json = write_json
+        self.forms = []
+        self.failed = []
+        self.bytes_written = 0
+        self._names = set()
+        # The stream is left open; whoever opened it closes it
+        self._zip = zipfile.ZipFile(output, 'w', allowZip64=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _unique_name(self, stem):
+        name, n = stem, 1
+        # Compared ignoring case, since the archive may be extracted on Windows or macOS
+        while name.lower() in self._names:
+            n += 1
+            name = f"{stem}-{n}"
+        self._names.add(name.lower())
+        return name
+
+    def _write(self, name, data, compress):
+        # DOCX files are already deflated; only the JSON is worth compressing
+        info = zipfile.ZipInfo(name, date_time=ZIP_TIMESTAMP)
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        self._zip.writestr(info, data)
+        self.bytes_written += len(data)
+        return {"name": name, "size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+
+    def add(self, form_data, stem, source=None):
+        """
+        Render one form into the bundle as <stem>.docx (and <stem>.json);
+        returns a JobResult whose output is the DOCX's name in the archive
+        """
+        start = time.perf_counter()
+        name = self._unique_name(stem)
+        try:
+            # No output path: a profile written next to it would be a stray file outside the bundle
+            with instrumentation.measure("render", source=source, entry=name, engine=self.template.engine):
+                buffer = io.BytesIO()
+                self.template.render(form_data, buffer)
+                entry = {"source": source, "docx": self._write(f"{name}.docx", buffer.getvalue(), False)}
+                del buffer
+                if self.write_json:
+                    with instrumentation.phase("write_json"):
+                        text = json.dumps(dict(form_data), indent=2).encode('utf-8')
+                        entry["json"] = self._write(f"{name}.json", text, True)
+        except Exception as e:
+            self.failed.append({"source": source, "error": str(e)})
+            return JobResult(source, elapsed=time.perf_counter() - start, error=str(e))
+        self.forms.append(entry)
+        return JobResult(source, entry["docx"]["name"], time.perf_counter() - start)
+
+    def add_file(self, json_path):
+        """
+        Render a saved form JSON file into the bundle, named after the file
+        """
+        try:
+            form_data = load_form_data(json_path)
+        except Exception as e:
+            self.failed.append({"source": json_path, "error": str(e)})
+            return JobResult(json_path, error=str(e))
+        return self.add(form_data, os.path.splitext(os.path.basename(json_path))[0], json_path)
+
+    def manifest(self):
+        return {
+            "version": MANIFEST_VERSION,
+            "template": {"name": os.path.basename(self.template.path), "sha256": self.template.hash},
+            "forms": self.forms,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        """
+        Write the manifest and the archive's central directory
+        """
+        if self._zip is None:
+            return
+        self._write(MANIFEST_NAME, json.dumps(self.manifest(), indent=2).encode('utf-8'), True)
+        self._zip.close()
+        self._zip = None
+
+
+def write_bundle(json_paths, output, template, write_json=True, progress=None):
+    """
+    Render saved form JSON files into a bundle on output (a binary stream).
+    progress, if given, is called with (index, total, result) after each form.
+    """
+    results = []
+    with BundleWriter(output, template, write_json) as bundle:
+        for index, json_path in enumerate(json_paths, 1):
+            result = bundle.add_file(json_path)
+            results.append(result)
+            if progress:
+                progress(index, len(json_paths), result)
+    return results
+
+
+def open_bundle_output(out=None, connect=None):
+    """
+    (binary stream, close function) for --out FILE, --out - (stdout) or --connect HOST:PORT
+    """
+    if connect:
+        host, _, port = connect.rpartition(':')
+        if not host or not port.isdigit():
+            raise ValueError(f"--connect needs HOST:PORT, not {connect}")
+        sock = socket.create_connection((host, int(port)))
+        stream = sock.makefile('wb')
+
+        def close():
+            stream.close()
+            sock.shutdown(socket.SHUT_WR)
+            sock.close()
+        return stream, close
+    if out == '-':
+        sys.stdout.flush()
+        return sys.stdout.buffer, sys.stdout.buffer.flush
+    directory = os.path.dirname(out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    stream = open(out, 'wb')
+    return stream, stream.close
+
+
+def run_bundle_command(args, template_path):
+    """
+    Entry point for `main.py bundle`; returns a process exit code.
+    Progress goes to stderr, since the bundle itself may be on stdout.
+    """
+    json_paths = expand_batch_paths(args.batch)
+    if not json_paths:
+        print("No form JSON files matched --batch", file=sys.stderr)
+        return 1
+    if not args.no_validate:
+        from validation import finish_validation, template_fields, validate_files
+        report = validate_files(json_paths, template_fields(template_path))
+        if not finish_validation(report, args.validation_report, file=sys.stderr):
+            return 1
+    template = load_engine(template_path, args.engine)
+
+    def progress(index, total, result):
+        width = len(str(total))
+        if result.ok:
+            print(f"[{index:>{width}}/{total}] {result.source} -> {result.output} "
+                  f"({result.elapsed * 1000:.1f} ms)", file=sys.stderr)
+        else:
+            print(f"[{index:>{width}}/{total}] {result.source} FAILED: {result.error}", file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        output, close = open_bundle_output(args.out, args.connect)
+    except (OSError, ValueError) as e:
+        print(f"Could not open the bundle output: {e}", file=sys.stderr)
+        return 1
+    try:
+        results = write_bundle(json_paths, output, template, not args.no_json, progress)
+    finally:
+        close()
+    print(format_summary(results, time.perf_counter() - start), file=sys.stderr)
+    return 0 if all(r.ok for r in results) else 1
@@ -0,0 +1,199 @@
+"""
+Type-ahead search over the building certifier and appointed competent person
+records in global.json, for the "+" picker.
+
+DetailIndex keeps every word of a record's name, contact, approval number
+and company in one sorted list, so each word typed is a binary search for
+the range of indexed words it prefixes; a record matches when every typed
+word prefixes one of its words ("kev miz", "ba78", "murweh"). Matches are
+ranked by when the record was last used, then by name, and only the first
+`limit` are returned for the picker to show.
+
+An index is a snapshot of the store at one GlobalDetailsStore.version;
+DetailIndexes rebuilds it when the store has changed since.
+
+DetailUsage remembers when each record was last picked or saved into a
+form, in .form12_cache/detail_usage.json.
+"""
+
+import bisect
+import heapq
+import json
+import os
+import re
+import threading
+import time
+
+from globalstore import atomic_write_json, record_key
+
+USAGE_PATH = os.path.join('.form12_cache', 'detail_usage.json')
+# Record attributes searched, by detail type
+SEARCH_KEYS = {
+    "building_certifier": ("name", "contact", "approval_number"),
+    "appointed_competent_person": ("name", "company", "contact_person", "licence_number"),
+}
+# Most matches handed to the picker
+RESULT_LIMIT = 200
+# Letters and digits; punctuation and underscores split words
+WORD = re.compile(r'[^\W_]+')
+# Sorts after any word that starts with a given prefix
+PREFIX_END = '\U0010ffff'
+
+
+def words(text):
+    return WORD.findall(text.lower())
+
+
+def describe(detail_type, detail):
+    """
+    One line for a record in the picker
+    """
+    if detail_type == "building_certifier":
+        parts = (detail.get("name", ""), detail.get("approval_number", ""), detail.get("contact", ""))
+    else:
+        parts = (detail.get("name", ""), detail.get("company", ""), detail.get("licence_number", ""))
+    return " - ".join(part for part in parts if part)
+
+
+class DetailUsage:
+    """
+    When each record was last used, keyed like the store (record_key)
+    """
+
+    def __init__(self, path=USAGE_PATH):
+        self.path = path
+        self._used = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r') as f:
+                stored = json.load(f)
+            for detail_type, entries in stored.items():
+                self._used[detail_type] = {tuple(key) if isinstance(key, list) else key: used
+                                           for key, used in entries}
+        except (OSError, ValueError, TypeError) as e:
+            if os.path.exists(path):
+                print(f"Ignoring unreadable detail usage file {path}: {e}")
+
+    def used(self, detail_type):
+        """
+        {record key: last used time} for one detail type
+        """
+        return self._used.get(detail_type, {})
+
+    def touch(self, detail_type, detail, when=None):
+        with self._lock:
+            self._used.setdefault(detail_type, {})[record_key(detail_type, detail)] = when or time.time()
+
+    def save(self):
+        with self._lock:
+            data = {detail_type: [[list(key) if isinstance(key, tuple) else key, used]
+                                  for key, used in entries.items()]
+                    for detail_type, entries in self._used.items()}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        atomic_write_json(self.path, data, indent=None)
+
+
+class DetailIndex:
+    """
+    Prefix index over one detail type's records
+    """
+
+    def __init__(self, detail_type, records, version=None):
+        self.detail_type = detail_type
+        self.records = list(records)
+        self.version = version
+        keys = SEARCH_KEYS[detail_type]
+        entries = []
+        self._positions = {}
+        for position, detail in enumerate(self.records):
+            self._positions.setdefault(record_key(detail_type, detail), position)
+            text = " ".join(str(detail.get(key, "")) for key in keys)
+            entries.extend((word, position) for word in set(words(text)))
+        entries.sort()
+        self._words = [word for word, _ in entries]
+        self._word_positions = [position for _, position in entries]
+        # Position -> rank in name order, for ordering records that haven't been used
+        by_name = sorted(range(len(self.records)), key=lambda p: self.records[p].get("name", "").lower())
+        self._name_rank = [0] * len(self.records)
+        for rank, position in enumerate(by_name):
+            self._name_rank[position] = rank
+        self._by_name = by_name
+
+    def __len__(self):
+        return len(self.records)
+
+    def _prefixed(self, prefix):
+        start = bisect.bisect_left(self._words, prefix)
+        end = bisect.bisect_left(self._words, prefix + PREFIX_END, start)
+        return set(self._word_positions[start:end])
+
+    def matches(self, query):
+        """
+        Positions of the records matching every word of query; None means all of them
+        """
+        query_words = words(query)
+        if not query_words:
+            return None
+        matched = None
+        # Longest words first: they usually narrow the set the most
+        for word in sorted(set(query_words), key=len, reverse=True):
+            found = self._prefixed(word)
+            matched = found if matched is None else matched & found
+            if not matched:
+                break
+        return matched
+
+    def search(self, query, used=None, limit=RESULT_LIMIT):
+        """
+        (records, total matches): the first limit matching records, most
+        recently used first and then by name
+        """
+        matched = self.matches(query)
+        total = len(self.records) if matched is None else len(matched)
+        recent = []
+        for key, when in (used or {}).items():
+            position = self._positions.get(key)
+            if position is not None and (matched is None or position in matched):
+                recent.append((-when, position))
+        recent.sort()
+        ranked = [position for _, position in recent[:limit]]
+        remaining = limit - len(ranked)
+        if remaining > 0:
+            shown = set(ranked)
+            if matched is None:
+                rest = (position for position in self._by_name if position not in shown)
+                ranked.extend(position for _, position in zip(range(remaining), rest))
+            else:
+                ranked.extend(heapq.nsmallest(remaining, matched - shown, key=self._name_rank.__getitem__))
+        return [self.records[position] for position in ranked], total
+
+
+class DetailIndexes:
+    """
+    One DetailIndex per detail type, rebuilt whenever the store has changed
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, detail_type):
+        with self._lock:
+            index = self._indexes.get(detail_type)
+            version = self.store.version
+            if index is None or index.version != version:
+                index = DetailIndex(detail_type, self.store.records(detail_type), version)
+                self._indexes[detail_type] = index
+            return index
+
+    def current(self, detail_type):
+        """
+        Whether get() would return without rebuilding
+        """
+        index = self._indexes.get(detail_type)
+        return index is not None and index.version == self.store.version
+
+    def build_all(self):
+        for detail_type in SEARCH_KEYS:
+            self.get(detail_type)
@@ -0,0 +1,262 @@
+"""
+Fast-path DOCX rendering that patches word/document.xml inside the template zip.
+
+The template's document.xml is serialised once with markers around every run
+that holds placeholder text and split into static byte chunks. Rendering swaps
+in freshly built content for the runs that change, deflates the result, and
+copies every other zip entry (styles, media, headers...) through byte-for-byte
+without decompressing or recompressing it. The document.xml produced is the same
+as the python-docx engine's.
+"""
+
+import io
+import re
+import struct
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from lxml import etree
+
+from instrumentation import count, phase
+from photos import checked_photo_paths
+from template import apply_run_replacements
+
+MARKER_TARGET = "form12"
+MARKER_PATTERN = re.compile(rb"<\?" + MARKER_TARGET.encode() + rb" ?\?>")
+# Characters lxml refuses to serialise; python-docx raises on them too
+INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+END_OF_CENTRAL_DIR = struct.Struct('<IHHHHIIH')
+
+
+def run_content_xml(text):
+    """
+    Serialise text as run content, exactly as python-docx's Run.text setter does:
+    tabs become <w:tab/>, line breaks <w:br/>, and <w:t> keeps surrounding whitespace.
+    """
+    if INVALID_XML_CHARS.search(text):
+        raise ValueError("All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters")
+    parts = []
+    for piece in re.split(r"(\t|\r|\n)", text):
+        if piece == "\t":
+            parts.append("<w:tab/>")
+        elif piece in ("\r", "\n"):
+            parts.append("<w:br/>")
+        elif piece:
+            if len(piece.strip()) < len(piece):
+                parts.append(f'<w:t xml:space="preserve">{escape(piece)}</w:t>')
+            else:
+                parts.append(f"<w:t>{escape(piece)}</w:t>")
+    return "".join(parts).encode("utf-8")
+
+
+def run_xml(text):
+    """
+    Serialise text as a single <w:r>, as python-docx's Paragraph.text setter does
+    """
+    content = run_content_xml(text)
+    return b"<w:r>" + content + b"</w:r>" if content else b"<w:r/>"
+
+
+def _rebuilt_run(head, text):
+    """
+    Run bytes with the original opening tag and <w:rPr> (head) and new content
+    """
+    content = run_content_xml(text)
+    if not content and b"<w:rPr" not in head:
+        # lxml writes an empty element as <w:r/>
+        return head[:-1] + b"/>"
+    return head + content + b"</w:r>"
+
+
+def _dos_datetime(date_time):
+    year, month, day, hour, minute, second = date_time
+    dos_date = (year - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    return dos_time, dos_date
+
+
+class _ZipEntry:
+    """
+    A zip member copied from the template, kept in its compressed form
+    """
+
+    def __init__(self, info, raw):
+        self.name = info.filename.encode('utf-8')
+        # Bit 3 (data descriptor) is cleared because sizes are written up front
+        self.flag_bits = info.flag_bits & ~0x08 | (0x800 if not info.filename.isascii() else 0)
+        self.compress_type = info.compress_type
+        self.dos_time, self.dos_date = _dos_datetime(info.date_time)
+        self.crc = info.CRC
+        self.compress_size = info.compress_size
+        self.file_size = info.file_size
+        self.create_version = info.create_version | info.create_system << 8
+        self.external_attr = info.external_attr
+        self.raw = raw
+
+
+def _raw_member_data(data, info):
+    """
+    Slice the still-compressed bytes of a zip member out of the archive
+    """
+    name_len, extra_len = struct.unpack_from('<HH', data, info.header_offset + 26)
+    start = info.header_offset + LOCAL_HEADER.size + name_len + extra_len
+    return data[start:start + info.compress_size]
+
+
+class ZipTemplate:
+    """
+    A compiled template rendered by splicing document.xml bytes
+    """
+
+    engine = 'zip'
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.hash = compiled.hash
+        self.path = compiled.path
+        self.fields = compiled.fields
+        doc = compiled.document()
+        self.part_name = doc.part.partname.lstrip('/')
+
+        body = doc.element.body
+        self.slots = compiled.slots
+        # Each marker splits the XML; chunks[i + 1] is the text after marker i
+        self.texts = []       # paragraph-mode slots: original paragraph text
+        self.slot_chunks = []  # per slot: chunk index of the paragraph content, or of each run
+        markers = 0
+
+        def mark(parent, index=None):
+            nonlocal markers
+            marker = etree.ProcessingInstruction(MARKER_TARGET)
+            if index is None:
+                parent.append(marker)
+            else:
+                parent.insert(index, marker)
+            markers += 1
+            return markers
+
+        for slot in self.slots:
+            p = slot.resolve(body)
+            if slot.run_texts is not None:
+                # Run mode: [head, content] chunk indices per run, where head is
+                # "<w:r ...><w:rPr>...</w:rPr>" and content ends with "</w:r>"
+                runs = []
+                for r in p.r_lst:
+                    head = mark(p, p.index(r))
+                    r_pr = r.find(qn('w:rPr'))
+                    content = mark(r, 0 if r_pr is None else r.index(r_pr) + 1)
+                    runs.append((head, content))
+                    if r.getnext() is None:
+                        mark(p)
+                    else:
+                        mark(p, p.index(r) + 1)
+                self.texts.append(None)
+                self.slot_chunks.append(runs)
+            else:
+                # Paragraph mode: everything after <w:pPr> is replaced by one run
+                self.texts.append(Paragraph(p, None).text)
+                p_pr = p.find(qn('w:pPr'))
+                content = mark(p, 0 if p_pr is None else p.index(p_pr) + 1)
+                mark(p)
+                self.slot_chunks.append(content)
+
+        # Same serialisation python-docx uses when saving an XML part
+        xml = etree.tostring(doc.element, encoding="UTF-8", standalone=True)
+        self.chunks = MARKER_PATTERN.split(xml)
+        if len(self.chunks) != markers + 1:
+            raise ValueError(f"Could not index placeholder paragraphs in {self.path}")
+
+        self.entries = []
+        with zipfile.ZipFile(io.BytesIO(compiled.data)) as archive:
+            for info in archive.infolist():
+                if info.flag_bits & 0x1:
+                    raise ValueError(f"Encrypted template entries are not supported: {info.filename}")
+                raw = None if info.filename == self.part_name else _raw_member_data(compiled.data, info)
+                self.entries.append(_ZipEntry(info, raw))
+
+    def document_xml(self, form_data):
+        """
+        Build the filled document.xml bytes
+        """
+        chunks = list(self.chunks)
+        replaced = 0
+        for slot, text, slot_chunks in zip(self.slots, self.texts, self.slot_chunks):
+            edits = slot.run_edits(form_data)
+            if edits is None:
+                new_text = slot.replace_text(text, form_data)
+                if new_text != text:
+                    chunks[slot_chunks] = run_xml(new_text)
+                    replaced += len(slot.placeholders)
+                continue
+            if not edits:
+                continue
+            replaced += len(edits)
+            new_texts = apply_run_replacements(slot.run_texts, edits)
+            for (head, content), old_text, new_text in zip(slot_chunks, slot.run_texts, new_texts):
+                if new_text is None:
+                    chunks[head] = chunks[content] = b""
+                elif new_text != old_text:
+                    chunks[head] = _rebuilt_run(self.chunks[head], new_text)
+                    chunks[content] = b""
+        count("paragraphs_scanned", len(self.slots))
+        count("placeholders_replaced", replaced)
+        return b"".join(chunks)
+
+    def render_bytes(self, form_data):
+        """
+        Build the complete DOCX file in memory
+        """
+        with phase("fill"):
+            xml = self.document_xml(form_data)
+        with phase("compress"):
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            deflated = compressor.compress(xml) + compressor.flush()
+        with phase("assemble"):
+            return self._assemble(xml, deflated)
+
+    def _assemble(self, xml, deflated):
+        out = []
+        central = []
+        offset = 0
+        for entry in self.entries:
+            if entry.raw is None:
+                method, crc, raw, size = zipfile.ZIP_DEFLATED, zlib.crc32(xml), deflated, len(xml)
+            else:
+                method, crc, raw, size = entry.compress_type, entry.crc, entry.raw, entry.file_size
+            header = LOCAL_HEADER.pack(0x04034b50, 20, entry.flag_bits, method, entry.dos_time,
+                                       entry.dos_date, crc, len(raw), size, len(entry.name), 0)
+            central.append(CENTRAL_HEADER.pack(0x02014b50, entry.create_version, 20, entry.flag_bits,
+                                               method, entry.dos_time, entry.dos_date, crc, len(raw),
+                                               size, len(entry.name), 0, 0, 0, 0, entry.external_attr,
+                                               offset) + entry.name)
+            out.extend((header, entry.name, raw))
+            offset += len(header) + len(entry.name) + len(raw)
+
+        central_dir = b"".join(central)
+        out.append(central_dir)
+        out.append(END_OF_CENTRAL_DIR.pack(0x06054b50, 0, 0, len(central), len(central),
+                                           len(central_dir), offset, 0))
+        return b"".join(out)
+
+    def render(self, form_data, output_path):
+        """
+        Render form data to output_path (a file path or writable binary stream)
+        """
+        if checked_photo_paths(form_data):
+            # Pictures need new parts in the package; python-docx adds them
+            return self.compiled.render(form_data, output_path)
+        data = self.render_bytes(form_data)
+        with phase("save"):
+            if hasattr(output_path, 'write'):
+                output_path.write(data)
+            else:
+                with open(output_path, 'wb') as f:
+                    f.write(data)
+        count("bytes_written", len(data))
+        return output_path
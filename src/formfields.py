@@ -0,0 +1,131 @@
+"""
+The fields of Form 12, shared by the GUI and the headless tools.
+
+FORM_FIELD_CONFIGS lists the form in display order: (name, type) for input
+fields, where type is "text", "textarea", "file", "photos" or "disabled_text", and
+(key, "header", title) for section headings. Field names match the
+<<placeholders>> in template.docx. FIELD_RULES says what values each field accepts.
+"""
+
+# Define form fields based on the actual template.docx structure
+FORM_FIELD_CONFIGS = [
+    # Section 1
+    ("Aspect of building work (indicate the aspect)", "text"),
+
+    # Section 2
+    ("header2", "header", "2. Property description"),
+    ("Street address", "text"),
+    ("Suburb/locality", "text"),
+    ("State", "text"),
+    ("Postcode", "text"),
+    ("Lot and plan details", "text"),
+    ("Local government area the land is situated in", "text"),
+
+    # Section 3
+    ("header3", "header", "3. Building/structure description"),
+    ("Building/structure description", "text"),
+    ("Class of building/structure", "text"),
+
+    # Section 4
+    ("header4", "header", "4. Description of the extent of aspect/s certified"),
+    ("Description of the extent of aspect/s certified", "textarea"),
+
+    # Section 5
+    ("header5", "header", "5. Basis of certification"),
+    ("Basis of certification", "textarea"),
+
+    # Section 6
+    ("header6", "header", "6. Reference documentation"),
+    ("Inspection photos", "photos"),
+    ("Reference documentation", "textarea"),
+
+    # Section 7
+    ("header7", "header", "7. Building certifier reference number and building development approval number"),
+    ("Building certifier's name (in full)", "text"),
+    ("Building certifier reference number", "text"),
+    ("Building development approval number", "text"),
+
+    # Section 8
+    ("header8", "header", "8. Details of appointed competent person"),
+    ("Appointed competent person name (in full)", "text"),
+    ("Company name (if applicable)", "text"),
+    ("Contact person", "text"),
+    ("Business phone number", "text"),
+    ("Mobile", "text"),
+    ("Email address", "text"),
+    ("Postal address", "text"),
+    ("Suburb/locality (postal)", "text"),
+    ("State (postal)", "text"),
+    ("Postcode (postal)", "text"),
+    ("Licence class or registration type (if applicable)", "text"),
+    ("Licence class or registration number (if applicable)", "text"),
+    ("Date request to inspect received from building certifier", "text"),
+
+    # Section 9
+    ("header9", "header", "9. Signature of appointed competent person (Manual Signature Required)"),
+    ("Signature (Manual)", "disabled_text"),
+    ("Date (signature)", "text"),
+]
+
+# Checks on field values before anything is rendered, by field name; rule names
+# are defined in validation.RULES. Blank values only fail "required".
+FIELD_RULES = {
+    "State": ("state",),
+    "Postcode": ("postcode",),
+    "Building development approval number": ("required",),
+    "Business phone number": ("phone",),
+    "Mobile": ("mobile",),
+    "Email address": ("email",),
+    "State (postal)": ("state",),
+    "Postcode (postal)": ("postcode",),
+    "Date request to inspect received from building certifier": ("iso_date",),
+    "Date (signature)": ("iso_date",),
+}
+
+# Form fields copied into each kind of global.json record, keyed by record attribute
+CERTIFIER_FIELDS = {
+    "name": "Building certifier's name (in full)",
+    "contact": "Building certifier reference number",
+    "approval_number": "Building development approval number",
+}
+
+COMPETENT_PERSON_FIELDS = {
+    "name": "Appointed competent person name (in full)",
+    "company": "Company name (if applicable)",
+    "contact_person": "Contact person",
+    "business_phone": "Business phone number",
+    "mobile": "Mobile",
+    "email": "Email address",
+    "postal_address": "Postal address",
+    "postal_suburb": "Suburb/locality (postal)",
+    "postal_state": "State (postal)",
+    "postal_postcode": "Postcode (postal)",
+    "licence_type": "Licence class or registration type (if applicable)",
+    "licence_number": "Licence class or registration number (if applicable)",
+}
+
+GLOBAL_DETAIL_FIELDS = {
+    "building_certifier": CERTIFIER_FIELDS,
+    "appointed_competent_person": COMPETENT_PERSON_FIELDS,
+}
+
+
+def input_fields(field_configs=FORM_FIELD_CONFIGS):
+    """
+    Names of the input fields (everything but section headers), in form order
+    """
+    return [config[0] for config in field_configs if config[1] != "header"]
+
+
+def detail_from_form(detail_type, form_data):
+    """
+    Build a global.json record of detail_type from form data
+    """
+    return {key: form_data.get(field_name, "") for key, field_name in GLOBAL_DETAIL_FIELDS[detail_type].items()}
+
+
+def form_from_detail(detail_type, detail):
+    """
+    The form fields filled in by a global.json record, the inverse of detail_from_form
+    """
+    return {field_name: detail[key] for key, field_name in GLOBAL_DETAIL_FIELDS[detail_type].items() if key in detail}
@@ -0,0 +1,383 @@
+"""
+Search index over saved inspection form JSON files.
+
+Every form saved, generated or loaded is added to a local SQLite database
+with an FTS5 full-text table, so a previous inspection can be found by
+street address, lot and plan, approval number, certifier, people or dates
+in milliseconds instead of grepping through folders. Indexing is
+incremental: a rescan only stats files and re-reads those whose mtime or
+size changed.
+
+Queries are words matched as prefixes anywhere in the form. A word can be
+limited to one kind of field with a prefix:
+
+    12 smith st            address words
+    lot:3 plan:RP1234      lot and plan details
+    ba:BA7860              approval or certifier reference numbers
+    date:2024-03           inspection or signature dates
+
+Where SQLite was built without FTS5 the same queries fall back to a LIKE
+scan, which is slower but still avoids opening every file.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+INDEX_PATH = os.path.join('.form12_cache', 'forms.sqlite')
+SCHEMA_VERSION = 1
+# JSON files that sit next to forms but are not forms
+SKIP_NAMES = {'defaults.json', 'global.json'}
+
+# Indexed columns and the form fields that feed them
+COLUMNS = {
+    "address": ("Street address", "Suburb/locality", "Postcode"),
+    "lot_plan": ("Lot and plan details",),
+    "reference": ("Building development approval number", "Building certifier reference number"),
+    "people": ("Building certifier's name (in full)", "Appointed competent person name (in full)",
+               "Company name (if applicable)"),
+    "dates": ("Date request to inspect received from building certifier", "Date (signature)"),
+    "description": ("Aspect of building work (indicate the aspect)", "Building/structure description",
+                    "Description of the extent of aspect/s certified"),
+}
+# Query prefixes and the column each searches
+QUERY_PREFIXES = {
+    "address": "address", "street": "address", "suburb": "address",
+    "lot": "lot_plan", "plan": "lot_plan",
+    "ba": "reference", "approval": "reference", "ref": "reference",
+    "name": "people", "certifier": "people", "person": "people",
+    "date": "dates",
+    "aspect": "description",
+}
+QUERY_TERM = re.compile(r'(?:(\w+):)?("[^"]*"|\S+)')
+
+
+class SearchResult:
+    """
+    One matching form, with the fields shown in the results list
+    """
+
+    def __init__(self, path, address, lot_plan, reference, dates, modified):
+        self.path = path
+        self.address = address
+        self.lot_plan = lot_plan
+        self.reference = reference
+        self.dates = dates
+        self.modified = modified
+
+
+def looks_like_form(data):
+    """
+    Whether decoded JSON is a saved inspection form rather than some other JSON file
+    """
+    return isinstance(data, dict) and any(field in data for fields in COLUMNS.values() for field in fields)
+
+
+def _column_values(form_data):
+    values = {}
+    for column, fields in COLUMNS.items():
+        values[column] = " ".join(str(form_data.get(field) or "") for field in fields).strip()
+    # Everything else in the form, so free text finds words in any field
+    values["body"] = " ".join(str(value) for value in form_data.values() if value)
+    return values
+
+
+def parse_query(query):
+    """
+    Split a query into [(column or None, term)]
+    """
+    terms = []
+    for prefix, term in QUERY_TERM.findall(query):
+        term = term.strip('"')
+        column = QUERY_PREFIXES.get(prefix.lower()) if prefix else None
+        if prefix and column is None:
+            term = f"{prefix}:{term}"  # Not a known prefix, e.g. a time like 10:30
+        for word in re.findall(r"\w+", term):
+            terms.append((column, word))
+    return terms
+
+
+def fts_query(terms):
+    """
+    FTS5 MATCH expression: every word must match as a prefix, in its column if given
+    """
+    parts = []
+    for column, word in terms:
+        phrase = f'"{word}"*'
+        parts.append(f"{column} : {phrase}" if column else phrase)
+    return " AND ".join(parts)
+
+
+class FormIndex:
+    """
+    SQLite index of saved form JSON files. Safe to share between the GUI
+    thread and the background worker.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.fts = True
+        self._db = None
+        self._lock = threading.RLock()
+        # Searches use their own connection, so they aren't held up by a rescan
+        # on the worker thread (WAL lets readers run alongside a writer)
+        self._reader = None
+        self._read_lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is not None:
+            return self._db
+        # sqlite3 takes a few ms to import, so the GUI only loads it once the index is used
+        import sqlite3
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            db.executescript("DROP TABLE IF EXISTS forms; DROP TABLE IF EXISTS forms_text;")
+        db.execute("""CREATE TABLE IF NOT EXISTS forms (
+            id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, mtime_ns INTEGER, size INTEGER,
+            sha256 TEXT, address TEXT, lot_plan TEXT, reference TEXT, people TEXT, dates TEXT,
+            description TEXT, body TEXT)""")
+        db.execute("CREATE INDEX IF NOT EXISTS forms_by_mtime ON forms(mtime_ns)")
+        try:
+            db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS forms_text USING fts5(
+                address, lot_plan, reference, people, dates, description, body,
+                content='forms', content_rowid='id', prefix='2 3')""")
+        except sqlite3.OperationalError:
+            self.fts = False
+        db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        db.commit()
+        self._db = db
+        return db
+
+    def _read_connection(self):
+        if self._reader is None:
+            import sqlite3
+            with self._lock:
+                self._connect()  # Creates the schema on first use
+            self._reader = sqlite3.connect(self.path, check_same_thread=False)
+        return self._reader
+
+    def close(self):
+        with self._read_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self):
+        with self._read_lock:
+            return self._read_connection().execute("SELECT COUNT(*) FROM forms").fetchone()[0]
+
+    # Updating
+
+    def _delete_row(self, db, row):
+        """
+        Remove a forms row and its full-text entry (row is (id, *COLUMNS, body))
+        """
+        if self.fts:
+            db.execute("INSERT INTO forms_text(forms_text, rowid, address, lot_plan, reference, people, dates, "
+                       "description, body) VALUES ('delete', ?, ?, ?, ?, ?, ?, ?, ?)", row)
+        db.execute("DELETE FROM forms WHERE id = ?", (row[0],))
+
+    def _existing(self, db, path):
+        return db.execute("SELECT id, address, lot_plan, reference, people, dates, description, body "
+                          "FROM forms WHERE path = ?", (path,)).fetchone()
+
+    def _upsert(self, db, path, stat, digest, form_data):
+        existing = self._existing(db, path)
+        if existing is not None:
+            self._delete_row(db, existing)
+        values = _column_values(form_data)
+        cursor = db.execute(
+            "INSERT INTO forms (path, mtime_ns, size, sha256, address, lot_plan, reference, people, dates, "
+            "description, body) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, stat.st_mtime_ns, stat.st_size, digest, values["address"], values["lot_plan"],
+             values["reference"], values["people"], values["dates"], values["description"], values["body"]))
+        if self.fts:
+            db.execute("INSERT INTO forms_text(rowid, address, lot_plan, reference, people, dates, description, "
+                       "body) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                       (cursor.lastrowid, values["address"], values["lot_plan"], values["reference"],
+                        values["people"], values["dates"], values["description"], values["body"]))
+
+    def _index_file(self, db, path, stat, known_digest=None):
+        """
+        (Re)index one file; returns True if its contents were (re)indexed
+        """
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False
+        digest = hashlib.sha256(data).hexdigest()
+        if digest == known_digest:
+            db.execute("UPDATE forms SET mtime_ns = ?, size = ? WHERE path = ?",
+                       (stat.st_mtime_ns, stat.st_size, path))
+            return False
+        try:
+            form_data = json.loads(data.decode('utf-8-sig'))
+        except ValueError:
+            form_data = None
+        if not looks_like_form(form_data):
+            existing = self._existing(db, path)
+            if existing is not None:
+                self._delete_row(db, existing)
+            return False
+        self._upsert(db, path, stat, digest, form_data)
+        return True
+
+    def add(self, json_path):
+        """
+        Index (or re-index) one saved form; call after it has been written
+        """
+        path = os.path.abspath(json_path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return self.remove(path)
+        with self._lock:
+            db = self._connect()
+            self._index_file(db, path, stat)
+            db.commit()
+
+    def remove(self, json_path):
+        path = os.path.abspath(json_path)
+        with self._lock:
+            db = self._connect()
+            existing = self._existing(db, path)
+            if existing is not None:
+                self._delete_row(db, existing)
+                db.commit()
+
+    def roots(self):
+        """
+        Directories holding indexed forms, for refreshing what is already known
+        """
+        with self._read_lock:
+            paths = [row[0] for row in self._read_connection().execute("SELECT path FROM forms")]
+        return sorted({os.path.dirname(path) for path in paths})
+
+    def scan(self, directories, recursive=True):
+        """
+        Bring the index up to date with the form JSON files under directories.
+        Unchanged files (same mtime and size) are not opened. Returns
+        (indexed, removed) counts.
+        """
+        indexed = removed = 0
+        with self._lock:
+            db = self._connect()
+            for directory in directories:
+                directory = os.path.abspath(directory)
+                known = {path: (mtime_ns, size, digest) for path, mtime_ns, size, digest in db.execute(
+                    "SELECT path, mtime_ns, size, sha256 FROM forms WHERE path LIKE ? ESCAPE '\\'",
+                    (_like_prefix(directory + os.sep),))}
+                seen = set()
+                for path, stat in _walk_json(directory, recursive):
+                    seen.add(path)
+                    previous = known.get(path)
+                    if previous and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+                        continue
+                    if self._index_file(db, path, stat, previous[2] if previous else None):
+                        indexed += 1
+                for path in known:
+                    if path not in seen and (recursive or os.path.dirname(path) == directory):
+                        self._delete_row(db, self._existing(db, path))
+                        removed += 1
+            db.commit()
+        return indexed, removed
+
+    # Searching
+
+    def search(self, query, limit=50):
+        """
+        Forms matching every word of query, best matches first (most recently
+        modified first among equals); an empty query lists the most recent forms
+        """
+        terms = parse_query(query)
+        columns = "f.path, f.address, f.lot_plan, f.reference, f.dates, f.mtime_ns"
+        with self._read_lock:
+            db = self._read_connection()
+            if not terms:
+                rows = db.execute(f"SELECT {columns} FROM forms f ORDER BY f.mtime_ns DESC LIMIT ?", (limit,))
+            elif self.fts:
+                rows = db.execute(f"SELECT {columns} FROM forms_text JOIN forms f ON f.id = forms_text.rowid "
+                                  f"WHERE forms_text MATCH ? ORDER BY bm25(forms_text, 8.0, 8.0, 8.0, 4.0, 4.0, "
+                                  f"2.0, 1.0), f.mtime_ns DESC LIMIT ?", (fts_query(terms), limit))
+            else:
+                clauses, params = [], []
+                for column, word in terms:
+                    clauses.append(f"f.{column or 'body'} LIKE ? ESCAPE '\\'")
+                    params.append(f"%{_like_escape(word)}%")
+                rows = db.execute(f"SELECT {columns} FROM forms f WHERE {' AND '.join(clauses)} "
+                                  f"ORDER BY f.mtime_ns DESC LIMIT ?", params + [limit])
+            return [SearchResult(path, address, lot_plan, reference, dates, mtime_ns / 1e9)
+                    for path, address, lot_plan, reference, dates, mtime_ns in rows.fetchall()]
+
+
+def _like_escape(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _like_prefix(text):
+    return _like_escape(text) + '%'
+
+
+def _walk_json(directory, recursive):
+    """
+    (absolute path, stat) of every candidate form JSON file under directory
+    """
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and entry.name != '__pycache__':
+                            stack.append(entry.path)
+                    elif entry.name.lower().endswith('.json') and entry.name not in SKIP_NAMES:
+                        yield entry.path, entry.stat()
+                except OSError:
+                    continue
+
+
+def print_search_results(results):
+    for result in results:
+        modified = time.strftime("%Y-%m-%d", time.localtime(result.modified))
+        print(f"{modified}  {result.address or '-'} | {result.lot_plan or '-'} | {result.reference or '-'}\n"
+              f"            {result.path}")
+
+
+def run_index_command(args):
+    """
+    Entry point for `main.py index`; returns a process exit code
+    """
+    index = FormIndex(args.db)
+    try:
+        if args.directories:
+            start = time.perf_counter()
+            indexed, removed = index.scan(args.directories)
+            print(f"Indexed {indexed} forms, removed {removed}; {len(index)} in the index "
+                  f"({time.perf_counter() - start:.2f} s)")
+        if args.query is not None:
+            start = time.perf_counter()
+            results = index.search(args.query, args.limit)
+            print_search_results(results)
+            print(f"{len(results)} forms found in {(time.perf_counter() - start) * 1000:.1f} ms")
+    finally:
+        index.close()
+    return 0
@@ -0,0 +1,198 @@
+"""
+Compact in-memory form records for bulk processing.
+
+A form read from JSON is a dict keyed by long field labels, and every
+json.load() makes its own copy of each label, so 100k loaded forms carry
+100k copies of "Licence class or registration number (if applicable)" and
+a hash table each. A FormRecord instead holds one tuple of values in the
+field order of a FormSchema shared by every record; the labels are stored
+once, interned, in the schema.
+
+Records are read-only Mappings, so the renderers (which only use get(), in
+and []) accept them as they are. to_dict() and from_dict() convert to and
+from the existing JSON form; keys outside the schema are kept in a small
+side dict so a round trip loses nothing. A field missing from the JSON is
+held as None and left out again by to_dict().
+
+Repeated values (state, suburb, certifier, dates) can also be shared
+across records by passing a ValuePool to from_dict()/load().
+"""
+
+import json
+import sys
+from collections.abc import Mapping
+
+from formfields import FORM_FIELD_CONFIGS, input_fields
+
+# Values longer than this are rarely repeated, so aren't worth pooling
+POOLED_VALUE_LENGTH = 80
+
+
+class FormSchema:
+    """
+    The fixed field order of a kind of record, with interned field names
+    """
+
+    __slots__ = ('names', 'positions')
+
+    def __init__(self, names):
+        self.names = tuple(sys.intern(name) for name in names)
+        self.positions = {name: position for position, name in enumerate(self.names)}
+
+    @classmethod
+    def from_configs(cls, field_configs=FORM_FIELD_CONFIGS):
+        return cls(input_fields(field_configs))
+
+    def __len__(self):
+        return len(self.names)
+
+
+FORM_SCHEMA = FormSchema.from_configs()
+
+
+class ValuePool:
+    """
+    Shares one copy of each short repeated value between records
+    """
+
+    def __init__(self, max_length=POOLED_VALUE_LENGTH):
+        self.max_length = max_length
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def __call__(self, value):
+        if type(value) is not str or len(value) > self.max_length:
+            return value
+        return self._values.setdefault(value, value)
+
+
+class FormRecord(Mapping):
+    """
+    One form's values as a tuple in schema order, plus any fields outside the schema
+    """
+
+    __slots__ = ('schema', 'values', 'extra')
+
+    def __init__(self, values, schema=FORM_SCHEMA, extra=None):
+        if len(values) != len(schema.names):
+            raise ValueError(f"Expected {len(schema.names)} values, got {len(values)}")
+        self.schema = schema
+        self.values = tuple(values)
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data, schema=FORM_SCHEMA, pool=None):
+        """
+        Build a record from decoded form JSON; pool (a ValuePool) shares repeated values
+        """
+        get = data.get
+        values = [get(name) for name in schema.names]
+        if pool is not None:
+            values = [None if value is None else pool(value) for value in values]
+        extra = None
+        if len(data) != len(values) - values.count(None):
+            positions = schema.positions
+            extra = {key: value for key, value in data.items() if key not in positions}
+        record = cls.__new__(cls)
+        record.schema = schema
+        record.values = tuple(values)
+        record.extra = extra or None
+        return record
+
+    @classmethod
+    def from_json(cls, text, schema=FORM_SCHEMA, pool=None):
+        data = json.loads(text)
+        if not isinstance(data, dict):
+            raise ValueError("Form data must be a JSON object")
+        return cls.from_dict(data, schema, pool)
+
+    @classmethod
+    def load(cls, json_path, schema=FORM_SCHEMA, pool=None):
+        with open(json_path, 'r') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"Form data must be a JSON object: {json_path}")
+        return cls.from_dict(data, schema, pool)
+
+    def to_dict(self):
+        data = {name: value for name, value in zip(self.schema.names, self.values) if value is not None}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def to_json(self, indent=2):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def replace(self, changes):
+        """
+        A new record with the fields in changes set (records themselves are read-only)
+        """
+        values = list(self.values)
+        extra = dict(self.extra) if self.extra else {}
+        positions = self.schema.positions
+        for name, value in changes.items():
+            position = positions.get(name)
+            if position is None:
+                extra[name] = value
+            else:
+                values[position] = value
+        return FormRecord(values, self.schema, extra)
+
+    # Mapping
+
+    def __getitem__(self, name):
+        position = self.schema.positions.get(name)
+        if position is not None:
+            value = self.values[position]
+            if value is not None:
+                return value
+        elif self.extra and name in self.extra:
+            return self.extra[name]
+        raise KeyError(name)
+
+    def get(self, name, default=None):
+        position = self.schema.positions.get(name)
+        if position is not None:
+            value = self.values[position]
+            return default if value is None else value
+        if self.extra:
+            return self.extra.get(name, default)
+        return default
+
+    def __contains__(self, name):
+        position = self.schema.positions.get(name)
+        if position is not None:
+            return self.values[position] is not None
+        return bool(self.extra) and name in self.extra
+
+    def __iter__(self):
+        for name, value in zip(self.schema.names, self.values):
+            if value is not None:
+                yield name
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return len(self.values) - self.values.count(None) + (len(self.extra) if self.extra else 0)
+
+    def __eq__(self, other):
+        if isinstance(other, FormRecord) and other.schema is self.schema:
+            return self.values == other.values and self.extra == other.extra
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"FormRecord({self.to_dict()!r})"
+
+    def __reduce__(self):
+        # Records sent to worker processes don't carry a copy of the default schema
+        if self.schema is FORM_SCHEMA:
+            return (_form_record, (self.values, self.extra))
+        return (FormRecord, (self.values, self.schema, self.extra))
+
+
+def _form_record(values, extra):
+    return FormRecord(values, FORM_SCHEMA, extra)
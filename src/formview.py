@@ -0,0 +1,432 @@
+"""
+Virtualized form view for the GUI.
+
+Field values live in a FormModel, a plain dictionary keyed by field name, not in
+widgets. FormView draws the form on a canvas but only creates widgets for the
+rows currently in view (plus a small margin). When the user scrolls, rows that
+leave the view are unbound from their field and reused for rows coming in, so
+the number of widgets, and the cost of a scroll, stays the same however many
+fields the template has.
+
+Row positions come from RowLayout, which keeps cumulative row offsets so the
+rows in view are found by bisection rather than by walking the form.
+"""
+
+import bisect
+import tkinter as tk
+from tkinter import ttk
+
+# Estimated row heights in pixels; replaced by measured heights once a row of
+# each kind has been drawn
+ROW_HEIGHTS = {"header": 34, "text": 29, "textarea": 76, "file": 29, "photos": 29, "disabled_text": 29}
+# Rows built above and below the visible area, so short scrolls show finished rows
+OVERSCAN_ROWS = 4
+
+# Label colour of a field whose value fails validation
+INVALID_COLOUR = "red"
+
+SIGNATURE_NOTICE = "Manual signature required - please sign document after generation"
+
+
+class FormModel:
+    """
+    Values for every input field in form_field_configs, independent of any widgets
+    """
+
+    def __init__(self, field_configs):
+        self.field_configs = list(field_configs)
+        self.fields = {config[0]: config[1] for config in self.field_configs if config[1] != "header"}
+        self.values = dict.fromkeys(self.fields, "")
+        self._listeners = []
+
+    def __contains__(self, field_name):
+        return field_name in self.fields
+
+    def add_listener(self, callback):
+        """
+        Call callback(field_name, value, source) whenever a value changes
+        """
+        self._listeners.append(callback)
+
+    def get(self, field_name):
+        return self.values.get(field_name, "")
+
+    def set(self, field_name, value, source=None):
+        """
+        Set a field's value; source identifies who made the change, so a view
+        doesn't redraw a value it just reported itself. Values are kept as
+        strings (None becomes ""), as a Tk entry would hold them.
+        """
+        value = "" if value is None else value if isinstance(value, str) else str(value)
+        if field_name not in self.fields or self.values[field_name] == value:
+            return
+        self.values[field_name] = value
+        for listener in self._listeners:
+            listener(field_name, value, source)
+
+    def update(self, form_data):
+        """
+        Set every known field present in form_data; unknown keys are ignored
+        """
+        for field_name, value in form_data.items():
+            self.set(field_name, value)
+
+    def clear(self):
+        for field_name in self.fields:
+            self.set(field_name, "")
+
+    def data(self):
+        return dict(self.values)
+
+
+class RowLayout:
+    """
+    Vertical positions of the form's rows, from a height per row kind
+    """
+
+    def __init__(self, kinds, heights=None):
+        self.kinds = list(kinds)
+        self.heights = dict(ROW_HEIGHTS)
+        if heights:
+            self.heights.update(heights)
+        self._relayout()
+
+    def _relayout(self):
+        self.offsets = [0]
+        for kind in self.kinds:
+            self.offsets.append(self.offsets[-1] + self.heights[kind])
+
+    @property
+    def total_height(self):
+        return self.offsets[-1]
+
+    def set_height(self, kind, height):
+        """
+        Record a measured height for a row kind; returns True if the layout moved
+        """
+        if height <= 0 or self.heights.get(kind) == height:
+            return False
+        self.heights[kind] = height
+        self._relayout()
+        return True
+
+    def row_at(self, y):
+        """
+        Index of the row containing pixel offset y
+        """
+        return max(0, min(len(self.kinds) - 1, bisect.bisect_right(self.offsets, y) - 1))
+
+    def visible_range(self, top, height, overscan=OVERSCAN_ROWS):
+        """
+        range() of the rows intersecting [top, top + height), widened by overscan rows
+        """
+        if not self.kinds:
+            return range(0)
+        first = max(0, self.row_at(top) - overscan)
+        last = min(len(self.kinds), self.row_at(top + max(height - 1, 0)) + 1 + overscan)
+        return range(first, last)
+
+
+def row_kind(field_config):
+    return field_config[1] if field_config[1] in ROW_HEIGHTS else "text"
+
+
+class _Row:
+    """
+    A reusable set of widgets for one row kind, bound to one field at a time
+    """
+
+    def __init__(self, view, kind):
+        self.view = view
+        self.kind = kind
+        self.index = None
+        self.field_name = None
+        self.frame = ttk.Frame(view.canvas)
+        self.frame.columnconfigure(1, weight=1)
+        self.item = view.canvas.create_window(0, 0, window=self.frame, anchor="nw", state="hidden")
+        self.label = ttk.Label(self.frame)
+        self.input = None
+        self.button = None
+        self._loading = False
+
+        if kind == "header":
+            self.label.configure(font=("TkDefaultFont", 10, "bold"))
+            self.label.grid(row=0, column=0, columnspan=3, sticky="w", pady=(10, 5))
+            return
+
+        self.label.configure(width=view.label_width, anchor="w")
+        self.label.grid(row=0, column=0, sticky="w", padx=(0, 10), pady=2)
+        if kind == "textarea":
+            self.input = tk.Text(self.frame, width=60, height=4, wrap=tk.WORD)
+            scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.input.yview)
+            scrollbar.grid(row=0, column=2, sticky="ns", padx=(5, 0), pady=2)
+            self.input.config(yscrollcommand=scrollbar.set)
+            self.input.bind("<<Modified>>", self._text_modified)
+        else:
+            self.var = tk.StringVar()
+            self.input = ttk.Entry(self.frame, width=60, textvariable=self.var)
+            if kind == "disabled_text":
+                self.input.config(state="disabled")
+            else:
+                self.var.trace_add("write", self._entry_modified)
+        self.input.grid(row=0, column=1, sticky="ew", pady=2)
+        self.input.bind("<Tab>", lambda e: self.view.focus_next(self.index, 1))
+        self.input.bind("<Shift-Tab>", lambda e: self.view.focus_next(self.index, -1))
+        self.input.bind("<ISO_Left_Tab>", lambda e: self.view.focus_next(self.index, -1))
+
+        self.button = ttk.Button(self.frame, width=7, command=self._button_pressed)
+
+    def bind(self, index, field_config):
+        """
+        Show this row for form_field_configs[index]
+        """
+        self.index = index
+        if self.kind == "header":
+            self.field_name = None
+            self.label.configure(text=field_config[2])
+        else:
+            self.field_name = field_config[0]
+            self.label.configure(text=f"{self.field_name}:")
+            self.show_invalid(self.field_name in self.view.invalid)
+            button_text = self.view.button_text(self.field_name, self.kind)
+            if button_text:
+                self.button.configure(text=button_text, width=3 if button_text == "+" else 7)
+                self.button.grid(row=0, column=2, padx=(5, 0), pady=2)
+            elif self.kind != "textarea":
+                self.button.grid_remove()
+            self.show_value(self.view.model.get(self.field_name))
+        self.view.canvas.coords(self.item, 0, self.view.layout.offsets[index])
+        self.view.canvas.itemconfigure(self.item, state="normal", width=self.view.row_width)
+
+    def unbind(self):
+        self.index = None
+        self.field_name = None
+        # Older Tk versions ignore the hidden state for window items, so park it out of view too
+        self.view.canvas.coords(self.item, 0, -self.view.layout.total_height - 1000)
+        self.view.canvas.itemconfigure(self.item, state="hidden")
+
+    def show_invalid(self, invalid):
+        self.label.configure(foreground=INVALID_COLOUR if invalid else "")
+
+    def show_value(self, value):
+        """
+        Put a model value into the widget without reporting it back as an edit
+        """
+        self._loading = True
+        try:
+            if self.kind == "textarea":
+                self.input.delete("1.0", tk.END)
+                self.input.insert("1.0", value)
+                self.input.edit_modified(False)
+            elif self.kind == "disabled_text":
+                self.var.set(SIGNATURE_NOTICE)
+            else:
+                self.var.set(value)
+        finally:
+            self._loading = False
+
+    def _entry_modified(self, *args):
+        if not self._loading and self.field_name is not None:
+            self.view.model.set(self.field_name, self.var.get(), source=self)
+
+    def _text_modified(self, event):
+        if not self.input.edit_modified():
+            return
+        self.input.edit_modified(False)
+        if not self._loading and self.field_name is not None:
+            self.view.model.set(self.field_name, self.input.get("1.0", "end-1c"), source=self)
+
+    def _button_pressed(self):
+        if self.field_name is not None:
+            self.view.on_button(self.field_name, self.kind)
+
+
+class FormView:
+    """
+    Scrollable view of a FormModel that only builds widgets for the rows in view.
+
+    button_text(field_name, kind) returns the label of the button shown after a
+    field (or None), and on_button(field_name, kind) is called when it is pressed.
+    """
+
+    def __init__(self, parent, model, button_text=None, on_button=None):
+        self.model = model
+        self.button_text = button_text or (lambda field_name, kind: None)
+        self.on_button = on_button or (lambda field_name, kind: None)
+        self.layout = RowLayout(row_kind(config) for config in model.field_configs)
+        # Wide enough for the longest label, so columns line up across recycled rows
+        self.label_width = max((len(name) + 1 for name in model.fields), default=20)
+        self.row_width = 1
+        self._bound = {}  # row index -> _Row
+        self.invalid = {}  # field name -> why its value fails validation
+        self._free = {}  # row kind -> unbound _Row instances
+        self._measured = set()
+
+        self.frame = ttk.Frame(parent)
+        self.canvas = tk.Canvas(self.frame, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.yview)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.frame.columnconfigure(0, weight=1)
+        self.frame.rowconfigure(0, weight=1)
+        self._update_scrollregion()
+
+        self.canvas.bind("<Configure>", self._on_configure)
+        # Enable mouse wheel scrolling for different platforms while the pointer is over the form
+        self.canvas.bind("<Enter>", self._bind_mousewheel)
+        self.canvas.bind("<Leave>", self._unbind_mousewheel)
+        model.add_listener(self._model_changed)
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    # Scrolling
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.refresh()
+
+    def _on_mousewheel(self, event):
+        # On Windows, event.delta is available; on other platforms use event.num
+        if event.num == 4 or event.delta > 0:  # Scroll up
+            self.yview("scroll", -1, "units")
+        elif event.num == 5 or event.delta < 0:  # Scroll down
+            self.yview("scroll", 1, "units")
+
+    def _bind_mousewheel(self, event):
+        # Linux uses event.num, Windows/MacOS use event.delta
+        self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)  # Windows
+        self.canvas.bind_all("<Button-4>", self._on_mousewheel)    # Linux
+        self.canvas.bind_all("<Button-5>", self._on_mousewheel)    # Linux
+
+    def _unbind_mousewheel(self, event):
+        # Entering a row's widgets also counts as leaving the canvas; keep
+        # scrolling while the pointer is anywhere over the form
+        try:
+            widget = self.canvas.winfo_containing(*self.canvas.winfo_pointerxy())
+        except KeyError:  # Pointer is over a window Tkinter didn't create
+            widget = None
+        if widget is not None and str(widget).startswith(str(self.canvas)):
+            return
+        self.canvas.unbind_all("<MouseWheel>")
+        self.canvas.unbind_all("<Button-4>")
+        self.canvas.unbind_all("<Button-5>")
+
+    def _on_configure(self, event):
+        if event.width != self.row_width:
+            self.row_width = event.width
+            for row in self._bound.values():
+                self.canvas.itemconfigure(row.item, width=self.row_width)
+        self.refresh()
+
+    def _update_scrollregion(self):
+        self.canvas.configure(scrollregion=(0, 0, self.row_width, self.layout.total_height),
+                              yscrollincrement=ROW_HEIGHTS["text"])
+
+    # Row management
+
+    def refresh(self):
+        """
+        Bind rows to the fields now in view and release the rest for reuse
+        """
+        top = self.canvas.canvasy(0)
+        visible = self.layout.visible_range(top, self.canvas.winfo_height())
+        focused = self._focused_input()
+        for index in [index for index in self._bound if index not in visible]:
+            if focused is not None and self._bound[index].input is focused:
+                # Keep the row being typed into bound (off-screen, where the canvas
+                # clips it); recycled, its keystrokes would land in another field
+                continue
+            row = self._bound.pop(index)
+            row.unbind()
+            self._free.setdefault(row.kind, []).append(row)
+        for index in visible:
+            if index not in self._bound:
+                self._bind_row(index)
+
+    def _focused_input(self):
+        """
+        The widget with the keyboard focus, or that gets it back when the window is reactivated
+        """
+        try:
+            return self.canvas.focus_lastfor()
+        except KeyError:  # Focus is in a window Tkinter didn't create
+            return None
+
+    def _bind_row(self, index):
+        kind = self.layout.kinds[index]
+        free = self._free.get(kind)
+        row = free.pop() if free else _Row(self, kind)
+        row.bind(index, self.model.field_configs[index])
+        self._bound[index] = row
+        if kind not in self._measured:
+            self._measured.add(kind)
+            self.canvas.update_idletasks()
+            if self.layout.set_height(kind, row.frame.winfo_reqheight()):
+                self._update_scrollregion()
+                # Rows already placed moved with the new height
+                for bound_index, bound_row in self._bound.items():
+                    self.canvas.coords(bound_row.item, 0, self.layout.offsets[bound_index])
+
+    def _model_changed(self, field_name, value, source):
+        for row in self._bound.values():
+            if row.field_name == field_name and row is not source:
+                row.show_value(value)
+
+    def set_invalid(self, field_name, message=None):
+        """
+        Mark a field as failing validation (message says why), or clear it with no message
+        """
+        if message:
+            self.invalid[field_name] = message
+        elif self.invalid.pop(field_name, None) is None:
+            return
+        for row in self._bound.values():
+            if row.field_name == field_name:
+                row.show_invalid(bool(message))
+
+    @property
+    def widget_count(self):
+        """
+        Number of row widget sets in existence, bound or pooled
+        """
+        return len(self._bound) + sum(len(rows) for rows in self._free.values())
+
+    # Focus
+
+    def focus_field(self, field_name):
+        """
+        Scroll a field into view and give its input the keyboard focus
+        """
+        for index, config in enumerate(self.model.field_configs):
+            if config[0] == field_name and config[1] != "header":
+                return self._focus_index(index)
+
+    def _focus_index(self, index):
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        row_top, row_bottom = self.layout.offsets[index], self.layout.offsets[index + 1]
+        total = max(self.layout.total_height, 1)
+        if row_top < top:
+            self.yview("moveto", row_top / total)
+        elif row_bottom > bottom:
+            self.yview("moveto", (row_bottom - self.canvas.winfo_height()) / total)
+        else:
+            self.refresh()
+        row = self._bound.get(index)
+        if row is not None and row.input is not None:
+            row.input.focus_set()
+
+    def focus_next(self, index, step):
+        """
+        Move focus to the next editable field after (or before) row index;
+        Tab can't follow creation order when rows are recycled
+        """
+        configs = self.model.field_configs
+        next_index = index + step
+        while 0 <= next_index < len(configs) and configs[next_index][1] in ("header", "disabled_text"):
+            next_index += step
+        if 0 <= next_index < len(configs):
+            self._focus_index(next_index)
+        return "break"
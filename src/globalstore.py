@@ -0,0 +1,395 @@
+"""
+Record store for the building certifier / appointed competent person details
+kept in global.json.
+
+global.json stays the snapshot other tools read, but individual changes are
+appended to a journal next to it (global.json.log) instead of rewriting the
+whole file. The journal is folded back into global.json by an atomic rewrite
+once it grows past a threshold, and when the store is closed. Lookups go
+through an in-memory index, so adding a record doesn't scan the list.
+
+Adding a record that is already stored unchanged costs nothing. Real changes
+are held in memory and written together by a deferred flush on a background
+timer, so a burst of saves touches the (possibly network) disk once.
+"""
+
+import json
+import os
+import threading
+import time
+
+DETAIL_TYPES = ("building_certifier", "appointed_competent_person")
+
+# Journal entries replayed before global.json is rewritten
+COMPACT_THRESHOLD = 200
+# A lock file older than this is assumed to be left over from a crash
+LOCK_STALE_SECONDS = 30
+# Seconds to wait after a change before writing, so bursts share one write
+FLUSH_DELAY = 2.0
+
+
+def empty_details():
+    return {detail_type: [] for detail_type in DETAIL_TYPES}
+
+
+def record_key(detail_type, detail):
+    """
+    The identity of a record: appointed competent persons are unique by name,
+    building certifiers by name plus approval number
+    """
+    if detail_type == "appointed_competent_person":
+        return detail.get("name", "")
+    return (detail.get("name", ""), detail.get("approval_number", ""))
+
+
+def atomic_write_json(path, data, indent=2):
+    """
+    Write JSON to a temporary file, fsync it and rename it over path, so
+    readers see either the old file or the new one but never a partial write
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class FileLock:
+    """
+    Cross-process lock based on exclusively creating a lock file; works on
+    network shares where fcntl/msvcrt locks are unreliable
+    """
+
+    def __init__(self, path, timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return self
+            except FileExistsError:
+                if self._break_if_stale():
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for lock {self.path}")
+                time.sleep(0.05)
+
+    def _break_if_stale(self):
+        """
+        Remove the lock file if a crash left it behind; True if it is gone. The
+        file is renamed away and checked to be the one judged stale before it is
+        removed, so when two processes break the same lock neither removes the
+        fresh lock the other has just taken.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return True  # Released in the meantime
+        if time.time() - stat.st_mtime <= LOCK_STALE_SECONDS:
+            return False
+        stale_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.stale"
+        try:
+            os.rename(self.path, stale_path)
+        except OSError:
+            return True  # Another process broke it first
+        try:
+            moved = os.stat(stale_path)
+            if (moved.st_ino, moved.st_mtime_ns) != (stat.st_ino, stat.st_mtime_ns):
+                # Someone else broke the stale lock and took a new one; put theirs back
+                os.link(stale_path, self.path)
+            os.remove(stale_path)
+        except OSError:
+            # Theirs couldn't go back (a third process holds the lock now), so
+            # leave it where it is rather than delete a lock someone believes they hold
+            pass
+        return True
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class GlobalDetailsStore:
+    """
+    Indexed, journalled store behind InspectionFormApp.global_details
+    """
+
+    def __init__(self, path='global.json', compact_threshold=COMPACT_THRESHOLD, flush_delay=FLUSH_DELAY):
+        self.path = path
+        self.log_path = path + ".log"
+        self.lock_path = path + ".lock"
+        self.compact_threshold = compact_threshold
+        self.flush_delay = flush_delay
+        self.stats = {"changed": 0, "skipped": 0, "writes": 0, "compactions": 0}
+        self._pending = []
+        self._timer = None
+        # Guards data and the journal state; flushes run on a timer thread
+        self._lock = threading.RLock()
+        self.data = empty_details()
+        self._index = {detail_type: {} for detail_type in DETAIL_TYPES}
+        self._log_offset = 0
+        self._log_entries = 0
+        self._snapshot_stat = None
+        # Set when global.json couldn't be read or moved aside, so it is never overwritten
+        self.read_only = False
+        # Bumped on every change to data, so views built from it (search
+        # indexes) can tell when they are out of date
+        self.version = 0
+
+    # Loading
+
+    def load(self, read_only=False):
+        """
+        Read global.json and replay any journal entries written since it was compacted
+
+        With read_only, nothing on disk is touched: a missing global.json isn't
+        created, an unreadable one isn't moved aside, and the store refuses writes.
+        """
+        with self._lock:
+            if read_only:
+                self.read_only = True
+            if self._read_snapshot():
+                self._replay_log()
+            elif not self.read_only:
+                # Create default global.json if it doesn't exist
+                self.compact()
+            return self.data
+
+    def _read_snapshot(self):
+        """
+        Reset to the contents of global.json; returns False if it doesn't exist
+        """
+        self.data = empty_details()
+        self._log_offset = 0
+        self._log_entries = 0
+        exists = os.path.exists(self.path)
+        if exists:
+            try:
+                with open(self.path, 'r') as f:
+                    loaded = json.load(f)
+                for detail_type in DETAIL_TYPES:
+                    self.data[detail_type] = list(loaded.get(detail_type, []))
+                # Keep any extra sections other tools may have stored
+                for key, value in loaded.items():
+                    self.data.setdefault(key, value)
+            except Exception as e:
+                print(f"Error loading global details: {e}")
+                self.data = empty_details()
+                # Writing the store back would replace every record with nothing
+                exists = self.read_only or not self._set_aside()
+        self._snapshot_stat = self._stat(self.path)
+        self._rebuild_index()
+        self.version += 1
+        return exists
+
+    def _set_aside(self):
+        """
+        Move an unreadable global.json to global.json.corrupt (or .corrupt2, ...)
+        so it is kept for repair; returns False (and refuses writes from then on)
+        if it can't be moved
+        """
+        corrupt_path, n = f"{self.path}.corrupt", 1
+        while os.path.exists(corrupt_path):
+            n += 1
+            corrupt_path = f"{self.path}.corrupt{n}"
+        try:
+            os.rename(self.path, corrupt_path)
+        except FileNotFoundError:
+            return True  # Another process set it aside first
+        except OSError as e:
+            print(f"Could not move unreadable {self.path} aside; global details will not be saved: {e}")
+            self.read_only = True
+            return False
+        print(f"Moved unreadable {self.path} to {corrupt_path}; starting a new one")
+        return True
+
+    def _stat(self, path):
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _rebuild_index(self):
+        self._index = {detail_type: {} for detail_type in DETAIL_TYPES}
+        for detail_type in DETAIL_TYPES:
+            index = self._index[detail_type]
+            for position, detail in enumerate(self.data[detail_type]):
+                index.setdefault(record_key(detail_type, detail), position)
+
+    def _replay_log(self):
+        """
+        Apply journal entries appended since the last read (by us or another machine)
+        """
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partially written entry; pick it up next time
+                self._log_offset += len(line)
+                try:
+                    entry = json.loads(line)
+                    self._apply(entry["type"], entry["record"])
+                    self._log_entries += 1
+                except Exception as e:
+                    print(f"Skipping unreadable global details journal entry: {e}")
+
+    def refresh(self):
+        """
+        Pick up changes made by other processes sharing the same files
+        """
+        if self._stat(self.path) != self._snapshot_stat or self._log_size() < self._log_offset:
+            # Someone compacted global.json since we loaded it
+            self._read_snapshot()
+        self._replay_log()
+
+    def _log_size(self):
+        try:
+            return os.path.getsize(self.log_path)
+        except OSError:
+            return 0
+
+    # Queries
+
+    def records(self, detail_type):
+        return self.data[detail_type]
+
+    def find(self, detail_type, detail):
+        """
+        Return the stored record with the same identity as detail, or None
+        """
+        position = self._index[detail_type].get(record_key(detail_type, detail))
+        return None if position is None else self.data[detail_type][position]
+
+    # Updates
+
+    def _apply(self, detail_type, detail):
+        """
+        Add or replace a record in memory; returns True if anything changed
+        """
+        if detail_type == "appointed_competent_person" and not detail.get("name", ""):
+            return False
+        key = record_key(detail_type, detail)
+        index = self._index[detail_type]
+        position = index.get(key)
+        if position is None:
+            index[key] = len(self.data[detail_type])
+            self.data[detail_type].append(detail)
+            self.version += 1
+            return True
+        if detail_type == "appointed_competent_person" and self.data[detail_type][position] != detail:
+            # Competent persons are overridden with the latest details
+            self.data[detail_type][position] = detail
+            self.version += 1
+            return True
+        return False
+
+    def add(self, detail_type, detail):
+        """
+        Add a record. Records that are already stored unchanged are skipped;
+        changes are applied in memory at once and written by the next flush.
+        Returns True if the record was new or different.
+        """
+        with self._lock:
+            if not self._apply(detail_type, detail):
+                self.stats["skipped"] += 1
+                return False
+            self._pending.append({"type": detail_type, "record": detail})
+            self.stats["changed"] += 1
+            if self.flush_delay <= 0:
+                self.flush()
+            elif self._timer is None:
+                # Coalesce a burst of changes into one deferred write
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return True
+
+    @property
+    def dirty(self):
+        return bool(self._pending)
+
+    def flush(self):
+        """
+        Write all pending changes to the journal in a single append
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending or self.read_only:
+                return
+            pending, self._pending = self._pending, []
+            try:
+                with FileLock(self.lock_path):
+                    self.refresh()
+                    # Re-apply on top of whatever other machines wrote in the meantime,
+                    # so our latest details win
+                    for entry in pending:
+                        self._apply(entry["type"], entry["record"])
+                    self._append_log(pending)
+                    self.stats["writes"] += 1
+                    if self._log_entries >= self.compact_threshold:
+                        self._compact_locked()
+            except Exception as e:
+                # Keep the changes so the next flush (or close) retries them
+                self._pending = pending + self._pending
+                print(f"Error saving global details: {e}")
+
+    def _append_log(self, entries):
+        lines = "".join(json.dumps(entry) + "\n" for entry in entries).encode('utf-8')
+        with open(self.log_path, 'ab') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_offset += len(lines)
+        self._log_entries += len(entries)
+
+    # Compaction
+
+    def compact(self):
+        """
+        Flush pending changes and fold the journal into global.json with an atomic rewrite
+        """
+        with self._lock:
+            self.flush()
+            if self.read_only:
+                return
+            with FileLock(self.lock_path):
+                self.refresh()
+                self._compact_locked()
+                self.stats["compactions"] += 1
+
+    def _compact_locked(self):
+        atomic_write_json(self.path, self.data)
+        self._snapshot_stat = self._stat(self.path)
+        # The snapshot now holds every entry, so the journal can go. If we crash
+        # before this, replaying it again is harmless because adds are idempotent.
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self._log_offset = 0
+        self._log_entries = 0
+
+    def close(self):
+        """
+        Write any pending changes and compact the journal; safe to call more than once
+        """
+        with self._lock:
+            self.flush()
+            if self._log_entries:
+                self.compact()
+
+    def stats_summary(self):
+        return ("Global details: {changed} changed, {skipped} unchanged (not written), "
+                "{writes} journal writes, {compactions} compactions").format(**self.stats)
@@ -0,0 +1,319 @@
+"""
+Per-phase timing for rendering, saving and loading forms.
+
+Code on the render path marks its phases and counts:
+
+    with phase("save"):
+        ...
+    count("bytes_written", size)
+
+and the operation as a whole is wrapped in measure("render", output_path).
+Instrumentation is off unless configure() is called (main.py --timings);
+while it is off, phase() and count() do nothing and cost next to nothing.
+
+When on, every measured operation is written as one JSON line to the
+timings file (if one was given) and added to in-memory histograms that
+summary() reports at the end of a run. configure(profile=...) also wraps
+each measured render in cProfile or tracemalloc and writes the report next
+to the output file (job.docx -> job.docx.cprofile.txt).
+
+Phases are tracked per thread, so concurrent renders in the HTTP server
+don't mix. Worker processes get the same settings through
+render._init_worker and append to the same timings file.
+"""
+
+import contextlib
+import json
+import math
+import sys
+import threading
+import time
+
+PROFILERS = ('cprofile', 'tracemalloc')
+# Histogram buckets per doubling of duration (about 19% wide)
+BUCKETS_PER_OCTAVE = 4
+# Lines of the profile report to keep
+PROFILE_LINES = 40
+
+_recorder = None
+_profile = None
+_settings = {"timings_path": None, "profile": None}
+_local = threading.local()
+
+
+class Timings:
+    """
+    Phase durations (seconds) and counts for one measured operation
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.phases = {}
+        self.counts = {}
+        self.total = 0.0
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def to_dict(self):
+        return {
+            "op": self.operation,
+            "total_ms": round(self.total * 1000, 3),
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()},
+            "counts": dict(self.counts),
+        }
+
+
+class Histogram:
+    """
+    Log-bucketed duration histogram: constant memory however many samples are added
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.samples = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        bucket = math.floor(math.log2(max(seconds, 1e-7)) * BUCKETS_PER_OCTAVE)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.samples += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """
+        Upper bound of the bucket holding the nearest-rank percentile
+        """
+        if not self.samples:
+            return None
+        rank = max(1, math.ceil(fraction * self.samples))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE), self.max)
+        return self.max
+
+
+class Recorder:
+    """
+    Collects measured operations: JSON lines to a stream, plus histograms by operation and phase
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.histograms = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, timings, info=None):
+        line = dict(timings.to_dict(), ts=round(time.time(), 3), **(info or {}))
+        with self._lock:
+            self._add(f"{timings.operation}", timings.total)
+            for name, seconds in timings.phases.items():
+                self._add(f"{timings.operation}.{name}", seconds)
+            totals = self.counts.setdefault(timings.operation, {})
+            for name, amount in timings.counts.items():
+                totals[name] = totals.get(name, 0) + amount
+            if self.stream is not None:
+                self.stream.write(json.dumps(line) + "\n")
+                self.stream.flush()
+
+    def _add(self, key, seconds):
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.add(seconds)
+
+    def snapshot(self):
+        """
+        Histogram percentiles (ms) and count totals, e.g. for the server's /metrics
+        """
+        def millis(value):
+            return None if value is None else round(value * 1000, 3)
+
+        with self._lock:
+            return {
+                "phases_ms": {key: {"samples": h.samples, "mean": millis(h.total / h.samples),
+                                    "p50": millis(h.percentile(0.5)), "p90": millis(h.percentile(0.9)),
+                                    "p99": millis(h.percentile(0.99)), "max": millis(h.max)}
+                              for key, h in sorted(self.histograms.items())},
+                "counts": {operation: dict(totals) for operation, totals in sorted(self.counts.items())},
+            }
+
+    def summary(self):
+        """
+        A table of phase timings for the end of a run
+        """
+        snapshot = self.snapshot()
+        if not snapshot["phases_ms"]:
+            return "Timings: nothing measured in this process (worker processes only write to the timings file)"
+        lines = [f"{'phase':<28} {'n':>6} {'mean ms':>9} {'p50':>9} {'p90':>9} {'max':>9}"]
+        for key, stats in snapshot["phases_ms"].items():
+            lines.append(f"{key:<28} {stats['samples']:>6} {stats['mean']:>9.2f} {stats['p50']:>9.2f} "
+                         f"{stats['p90']:>9.2f} {stats['max']:>9.2f}")
+        for operation, totals in snapshot["counts"].items():
+            if totals:
+                lines.append(f"{operation} counts: " + ", ".join(f"{name} {amount}" for name, amount in totals.items()))
+        return "\n".join(lines)
+
+
+def configure(timings_path=None, profile=None):
+    """
+    Turn instrumentation on. timings_path gets JSON lines ('-' for stderr);
+    profile is None, 'cprofile' or 'tracemalloc'.
+    """
+    global _recorder, _profile
+    if profile not in (None,) + PROFILERS:
+        raise ValueError(f"Unknown profiler: {profile}")
+    stream = None
+    if timings_path == '-':
+        stream = sys.stderr
+    elif timings_path:
+        stream = open(timings_path, 'a', encoding='utf-8')
+    _recorder = Recorder(stream)
+    _profile = profile
+    _settings.update(timings_path=timings_path, profile=profile)
+
+
+def disable():
+    global _recorder, _profile
+    if _recorder is not None and _recorder.stream not in (None, sys.stderr):
+        _recorder.stream.close()
+    _recorder = None
+    _profile = None
+    _settings.update(timings_path=None, profile=None)
+
+
+def settings():
+    """
+    The current configuration, for passing to worker processes; None when off
+    """
+    if _recorder is None:
+        return None
+    return dict(_settings)
+
+
+def recorder():
+    return _recorder
+
+
+def enabled():
+    return _recorder is not None
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def phase(name):
+    """
+    Time a phase of the operation being measured on this thread (no-op otherwise)
+    """
+    timings = getattr(_local, 'timings', None)
+    if timings is None:
+        return _NULL_PHASE
+    return timings.phase(name)
+
+
+def count(name, amount=1):
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings.count(name, amount)
+
+
+@contextlib.contextmanager
+def measure(operation, output_path=None, **info):
+    """
+    Measure one operation. Nested inside another measured operation it becomes
+    one of that operation's phases. With profiling on and a file output_path,
+    the profile report is written next to the output.
+    """
+    if _recorder is None:
+        yield None
+        return
+    outer = getattr(_local, 'timings', None)
+    if outer is not None:
+        with outer.phase(operation):
+            yield outer
+        return
+
+    timings = Timings(operation)
+    _local.timings = timings
+    profiler = _start_profile() if isinstance(output_path, str) else None
+    start = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings.total = time.perf_counter() - start
+        _local.timings = None
+        if profiler is not None:
+            _write_profile(profiler, output_path, timings)
+        if isinstance(output_path, str):
+            info = dict(info, output=output_path)
+        _recorder.record(timings, info)
+
+
+def _start_profile():
+    if _profile == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return None  # Another profiler is already running on this thread
+        return profiler
+    if _profile == 'tracemalloc':
+        import tracemalloc
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(10)
+        tracemalloc.reset_peak()
+        return ('tracemalloc', started, tracemalloc.take_snapshot())
+    return None
+
+
+def _write_profile(profiler, output_path, timings):
+    header = json.dumps(timings.to_dict())
+    try:
+        if isinstance(profiler, tuple):
+            import tracemalloc
+            _, started, before = profiler
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if started:
+                tracemalloc.stop()
+            report_path = f"{output_path}.tracemalloc.txt"
+            lines = [header, f"Peak traced memory: {peak / 1024:.1f} KiB", "",
+                     "Largest allocations still held after the render, by line:"]
+            lines.extend(str(stat) for stat in after.compare_to(before, 'lineno')[:PROFILE_LINES])
+            text = "\n".join(lines) + "\n"
+        else:
+            import io
+            import pstats
+            profiler.disable()
+            report_path = f"{output_path}.cprofile.txt"
+            buffer = io.StringIO()
+            pstats.Stats(profiler, stream=buffer).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            text = header + "\n" + buffer.getvalue()
+        with open(report_path, 'w') as f:
+            f.write(text)
+    except OSError as e:
+        print(f"Could not write profile for {output_path}: {e}", file=sys.stderr)
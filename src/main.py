@@ -1,13 +1,42 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
+import atexit
 import json
 import os
+import time
 from datetime import datetime
-import docx
-from docx import Document
-from docx.shared import Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_TABLE_ALIGNMENT
+
+# python-docx is only needed once something is rendered; render imports it lazily
+# and the template is warmed up on the worker thread after the window is shown
+import instrumentation
+from autosave import AutosaveJournal, read_journal
+from globalstore import GlobalDetailsStore
+from instrumentation import PROFILERS, measure, phase
+from render import ENGINES, DEFAULT_ENGINE, load_engine, load_form_data, write_form_json, run_render_command
+from detailsearch import DetailIndexes, DetailUsage, describe
+from formfields import detail_from_form, form_from_detail
+from formindex import INDEX_PATH, FormIndex, run_index_command
+from formview import FormModel, FormView
+from merge import CHECKPOINT_EVERY, FORMATS as MERGE_FORMATS, run_merge_command
+from photos import (JPEG_QUALITY as PHOTO_QUALITY, MAX_DIMENSION as MAX_PHOTO_DIMENSION, PHOTO_SEPARATOR,
+                    allow_photos, checked_photo_paths, photo_paths, prepare_photos, run_photos_command,
+                    shared_photo_cache)
+from rendercache import RenderCache, run_cache_command
+from templateregistry import configure as configure_templates, default_registry
+from templateschema import field_configs_for_template, run_schema_command
+from validation import PRINT_LIMIT, default_validator, run_validate_command
+from worker import BackgroundWorker
+from watch import POLL_INTERVAL, SETTLE_SECONDS, run_watch_command
+
+# Delay before the template is loaded in the background
+WARMUP_DELAY_MS = 200
+# Pause in typing before the find dialog searches, and the most results it lists
+SEARCH_DELAY_MS = 150
+SEARCH_LIMIT = 200
+# Pause in typing before the "+" picker filters its list
+PICKER_DELAY_MS = 50
+# Where inspection forms are usually kept; scanned when the find dialog opens
+FORMS_FOLDER = 'Form12 Inspections'
 
 class InspectionFormApp:
     """
@@ -25,16 +54,49 @@ class InspectionFormApp:
         # Variables to track file paths
         self.current_json_path = None
         self.current_docx_path = None
+        # Bumped whenever a different form is loaded or the form is reset, so
+        # background jobs for an earlier form don't overwrite the current paths
+        self.form_generation = 0
         
         # Create the UI
         self.create_widgets()
+
+        # Saving, loading and generation run on a worker thread so the window stays responsive
+        self.worker = BackgroundWorker(self.root, on_status=self.status_var.set)
         
+        # Unchanged forms are copied from the render cache instead of being regenerated
+        self.render_cache = RenderCache()
+        # Downscaled inspection photos, so regenerating a form doesn't process its photos again
+        self.photo_cache = shared_photo_cache()
+
+        # Saved, generated and loaded forms are indexed so earlier inspections can be found quickly
+        self.form_index = FormIndex()
+
         # Global details for building certifier and appointed competent person
-        self.global_details = {"building_certifier": [], "appointed_competent_person": []}
+        self.global_store = GlobalDetailsStore('global.json')
         self.load_global_details()
+        # Type-ahead indexes over the records for the "+" picker, and when each record was last used
+        self.detail_indexes = DetailIndexes(self.global_store)
+        self.detail_usage = DetailUsage()
+
+        # Make sure deferred global detail writes reach disk however we exit
+        atexit.register(self.global_store.close)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Load defaults
         self.load_defaults()
+
+        # Edits are journalled as they are made, so a crash or power cut doesn't lose the form
+        self.autosave = AutosaveJournal()
+        self.restore_autosave()
+        self.form.add_listener(self.journal_edit)
+        self.validate_form()
+
+        # Load the template and index the global details once the window is up
+        self.root.after(WARMUP_DELAY_MS, self.warm_up_template)
+        self.root.after(WARMUP_DELAY_MS, lambda: self.worker.submit(
+            lambda progress: self.detail_indexes.build_all(),
+            on_error=lambda e: print(f"Could not index global details: {e}")))
         
     def create_widgets(self):
         """
@@ -50,181 +112,28 @@ class InspectionFormApp:
         main_frame.columnconfigure(1, weight=1)
         
         # Create frame for the form that will go in the main window
-        form_container = ttk.Frame(main_frame)
-        form_container.grid(row=0, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
+        self.form_container = ttk.Frame(main_frame)
+        self.form_container.grid(row=0, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         main_frame.rowconfigure(0, weight=1)
-        
-        # Create scrollable form frame inside the container
-        canvas = tk.Canvas(form_container)
-        scrollbar = ttk.Scrollbar(form_container, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        # Grid the canvas and scrollbar in the form_container
-        canvas.grid(row=0, column=0, sticky="nsew")
-        scrollbar.grid(row=0, column=1, sticky="ns")
+        self.build_form()
 
         # Configure the container to expand properly
-        form_container.columnconfigure(0, weight=1)
-        form_container.rowconfigure(0, weight=1)
-
-        # Enable mouse wheel scrolling for different platforms
-        def _on_mousewheel(event):
-            # On Windows, event.delta is available; on other platforms use event.num
-            if event.num == 4 or event.delta > 0:  # Scroll up
-                canvas.yview_scroll(-1, "units")
-            elif event.num == 5 or event.delta < 0:  # Scroll down
-                canvas.yview_scroll(1, "units")
-
-        def _bind_to_mousewheel(event):
-            # Linux uses event.num, Windows/MacOS use event.delta
-            canvas.bind_all("<MouseWheel>", _on_mousewheel)  # Windows
-            canvas.bind_all("<Button-4>", _on_mousewheel)    # Linux
-            canvas.bind_all("<Button-5>", _on_mousewheel)    # Linux
-
-        def _unbind_from_mousewheel(event):
-            canvas.unbind_all("<MouseWheel>")
-            canvas.unbind_all("<Button-4>")
-            canvas.unbind_all("<Button-5>")
-
-        canvas.bind('<Enter>', _bind_to_mousewheel)
-        canvas.bind('<Leave>', _unbind_from_mousewheel)
-
-        # Define form fields based on the actual template.docx structure
-        self.form_field_configs = [
-            # Section 1
-            ("Aspect of building work (indicate the aspect)", "text"),
-            
-            # Section 2
-            ("header2", "header", "2. Property description"),
-            ("Street address", "text"),
-            ("Suburb/locality", "text"),
-            ("State", "text"),
-            ("Postcode", "text"),
-            ("Lot and plan details", "text"),
-            ("Local government area the land is situated in", "text"),
-            
-            # Section 3
-            ("header3", "header", "3. Building/structure description"),
-            ("Building/structure description", "text"),
-            ("Class of building/structure", "text"),
-            
-            # Section 4
-            ("header4", "header", "4. Description of the extent of aspect/s certified"),
-            ("Description of the extent of aspect/s certified", "textarea"),
-
-            # Section 5
-            ("header5", "header", "5. Basis of certification"),
-            ("Basis of certification", "textarea"),
-
-            # Section 6
-            ("header6", "header", "6. Reference documentation"),
-            ("Reference documentation", "textarea"),
-            
-            # Section 7
-            ("header7", "header", "7. Building certifier reference number and building development approval number"),
-            ("Building certifier's name (in full)", "text"),
-            ("Building certifier reference number", "text"),
-            ("Building development approval number", "text"),
-            
-            # Section 8
-            ("header8", "header", "8. Details of appointed competent person"),
-            ("Appointed competent person name (in full)", "text"),
-            ("Company name (if applicable)", "text"),
-            ("Contact person", "text"),
-            ("Business phone number", "text"),
-            ("Mobile", "text"),
-            ("Email address", "text"),
-            ("Postal address", "text"),
-            ("Suburb/locality (postal)", "text"),
-            ("State (postal)", "text"),
-            ("Postcode (postal)", "text"),
-            ("Licence class or registration type (if applicable)", "text"),
-            ("Licence class or registration number (if applicable)", "text"),
-            ("Date request to inspect received from building certifier", "text"),
-            
-            # Section 9
-            ("header9", "header", "9. Signature of appointed competent person (Manual Signature Required)"),
-            ("Signature (Manual)", "disabled_text"),
-            ("Date (signature)", "text"),
-        ]
-
-        # Create form fields based on configuration
-        self.form_fields = {}
-        current_row = 0  # Track the current row for grid placement
-        for field_config in self.form_field_configs:
-            if field_config[1] == "header":
-                # Create a header label for section (field_config[2] contains the header text)
-                header_label = ttk.Label(scrollable_frame, text=field_config[2], font=("TkDefaultFont", 10, "bold"))
-                header_label.grid(row=current_row, column=0, columnspan=3, sticky="w", pady=(10, 5))
-                current_row += 1
-            else:
-                # Create label and entry field
-                label, field_type = field_config[0], field_config[1]
-                label_widget = ttk.Label(scrollable_frame, text=f"{label}:")
-                label_widget.grid(row=current_row, column=0, sticky="w", padx=(0, 10), pady=2)
-
-                # Create entry field
-                if field_type == "text":
-                    entry = ttk.Entry(scrollable_frame, width=60)
-                    entry.grid(row=current_row, column=1, sticky="ew", pady=2)
-                    self.form_fields[label] = entry
-
-                    # Add button to select from global details if applicable
-                    if "Building certifier" in label or "competent person" in label.lower():
-                        btn = ttk.Button(scrollable_frame, text="+", width=3,
-                                       command=lambda l=label: self.select_global_detail(l))
-                        btn.grid(row=current_row, column=2, padx=(5, 0), pady=2)
-
-                elif field_type == "textarea":
-                    # Create text widget for multiline input
-                    text_widget = tk.Text(scrollable_frame, width=60, height=4, wrap=tk.WORD)
-                    text_widget.grid(row=current_row, column=1, sticky="ew", pady=2)
-                    self.form_fields[label] = text_widget
-
-                    # Add scrollbar for the text widget
-                    text_scrollbar = ttk.Scrollbar(scrollable_frame, orient="vertical", command=text_widget.yview)
-                    text_scrollbar.grid(row=current_row, column=2, sticky="ns", padx=(5, 0), pady=2)
-                    text_widget.config(yscrollcommand=text_scrollbar.set)
-
-                elif field_type == "file":
-                    # Create entry field for file path
-                    entry = ttk.Entry(scrollable_frame, width=60)
-                    entry.grid(row=current_row, column=1, sticky="ew", pady=2)
-                    self.form_fields[label] = entry
-
-                    # Create browse button
-                    btn = ttk.Button(scrollable_frame, text="Browse", width=7,
-                                   command=lambda l=label, e=entry: self.browse_file(l, e))
-                    btn.grid(row=current_row, column=2, padx=(5, 0), pady=2)
-
-                elif field_type == "disabled_text":
-                    # Create a disabled text entry field
-                    entry = ttk.Entry(scrollable_frame, width=60)
-                    entry.grid(row=current_row, column=1, sticky="ew", pady=2)
-                    entry.insert(0, "Manual signature required - please sign document after generation")
-                    entry.config(state="disabled")
-                    self.form_fields[label] = entry
-
-                    # Add an informational button
-                    info_btn = ttk.Button(scrollable_frame, text="Info", width=7,
-                                        command=lambda: self.show_signature_info())
-                    info_btn.grid(row=current_row, column=2, padx=(5, 0), pady=2)
-
-                current_row += 1
-                
-        scrollable_frame.columnconfigure(1, weight=1)
+        self.form_container.columnconfigure(0, weight=1)
+        self.form_container.rowconfigure(0, weight=1)
         
         # Buttons frame
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=1, column=0, columnspan=3, pady=10)
+
+        # With a template directory (--templates), the template can be switched without restarting
+        template_names = default_registry().names()
+        if template_names:
+            ttk.Label(button_frame, text="Template:").pack(side=tk.LEFT, padx=(0, 5))
+            self.template_var = tk.StringVar(value=os.path.splitext(os.path.basename(self.template_path))[0])
+            template_combo = ttk.Combobox(button_frame, textvariable=self.template_var, values=template_names,
+                                          state="readonly", width=24)
+            template_combo.pack(side=tk.LEFT, padx=(0, 20))
+            template_combo.bind("<<ComboboxSelected>>", lambda event: self.switch_template(self.template_var.get()))
         
         # Create buttons
         self.save_button = ttk.Button(button_frame, text="Save", command=self.save_form)
@@ -232,10 +141,16 @@ class InspectionFormApp:
         
         self.generate_button = ttk.Button(button_frame, text="Generate DOCX", command=self.generate_docx)
         self.generate_button.pack(side=tk.LEFT, padx=(0, 10))
+
+        self.bundle_button = ttk.Button(button_frame, text="Bundle...", command=self.generate_bundle)
+        self.bundle_button.pack(side=tk.LEFT, padx=(0, 10))
         
         self.load_button = ttk.Button(button_frame, text="Load", command=self.load_form)
         self.load_button.pack(side=tk.LEFT, padx=(0, 10))
         
+        self.find_button = ttk.Button(button_frame, text="Find...", command=self.find_previous_inspection)
+        self.find_button.pack(side=tk.LEFT, padx=(0, 10))
+
         self.reset_button = ttk.Button(button_frame, text="Reset", command=self.reset_form)
         self.reset_button.pack(side=tk.LEFT)
         
@@ -245,28 +160,128 @@ class InspectionFormApp:
         status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         status_bar.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E))
 
+    def build_form(self):
+        """
+        Create the form model and view for the current template's fields
+        """
+        # Form fields come from the template's placeholders (cached per template hash)
+        self.form_field_configs = field_configs_for_template(self.template_path)
+
+        # Field values live in a data model; the view only creates widgets for the
+        # rows in sight and reuses them while scrolling, so large templates stay fast
+        self.form = FormModel(self.form_field_configs)
+        self.form_view = FormView(self.form_container, self.form,
+                                  button_text=self.field_button_text, on_button=self.field_button_pressed)
+        self.form_view.grid(row=0, column=0, sticky="nsew")
+        # Fields are checked against formfields.FIELD_RULES as they change
+        self.form.add_listener(self.validate_field)
+
+    def switch_template(self, name):
+        """
+        Use another template from the template directory, keeping the values
+        of every field the two templates share
+        """
+        template_path = default_registry().resolve(name)
+        if os.path.abspath(template_path) == os.path.abspath(self.template_path):
+            return
+        values = self.form.data()
+        self.template_path = template_path
+        self.form_view.frame.destroy()
+        self.build_form()
+        self.form.update(values)
+        self.form.add_listener(self.journal_edit)
+        self.validate_form()
+        # The journal's snapshot must have the new template's fields
+        self.autosave.start(self.form.data(), self.current_json_path, dirty=True)
+
+        dropped = [field for field, value in values.items() if value and field not in self.form]
+        if dropped:
+            self.status_var.set(f"Template {name}: {len(dropped)} filled fields are not on this form")
+        else:
+            self.status_var.set(f"Template {name}")
+        self.warm_up_template()
+
+    def journal_edit(self, field_name, value, source):
+        self.autosave.record(field_name, value)
+
+    def validate_field(self, field_name, value, source):
+        messages = default_validator().check(field_name, value)
+        self.form_view.set_invalid(field_name, messages[0] if messages else None)
+        if messages and source is not None:  # Typed by the user rather than loaded
+            self.status_var.set(f"{field_name} {messages[0]}")
+
+    def validate_form(self):
+        """
+        Check every field at once (blank required fields never report a change);
+        returns {field: message} for those that fail
+        """
+        problems = default_validator().check_form(self.form.data(), self.form.fields)
+        for field_name in default_validator().checks:
+            if field_name in self.form:
+                self.form_view.set_invalid(field_name, problems.get(field_name))
+        return problems
+
+    def field_button_text(self, field_name, field_type):
+        """
+        Label of the button shown after a field, if it has one
+        """
+        if field_type == "file":
+            return "Browse"
+        if field_type == "photos":
+            return "Add..."
+        if field_type == "disabled_text":
+            return "Info"
+        # Add button to select from global details if applicable
+        if field_type == "text" and ("Building certifier" in field_name or "competent person" in field_name.lower()):
+            return "+"
+        return None
+
+    def field_button_pressed(self, field_name, field_type):
+        if field_type == "file":
+            self.browse_file(field_name)
+        elif field_type == "photos":
+            self.add_photos(field_name)
+        elif field_type == "disabled_text":
+            self.show_signature_info()
+        else:
+            self.select_global_detail(field_name)
+
+    def warm_up_template(self):
+        """
+        Import python-docx and compile the template on the worker thread, so the
+        first Generate DOCX doesn't pay for it
+        """
+        template_path = self.template_path
+
+        def warm_up(progress):
+            load_engine(template_path)
+            # Then the rest of the template directory, if there is one, so switching is instant
+            default_registry().preload()
+
+        def failed(e):
+            # Not fatal; generating a DOCX will report the problem properly
+            print(f"Could not preload template {template_path}: {e}")
+
+        self.worker.submit(warm_up, on_error=failed)
+
+    @property
+    def global_details(self):
+        """
+        Building certifier and appointed competent person records, by detail type
+        """
+        return self.global_store.data
+
     def load_global_details(self):
         """
         Load global details for building certifier and appointed competent person from global.json
         """
-        global_file = 'global.json'
-        if os.path.exists(global_file):
-            try:
-                with open(global_file, 'r') as f:
-                    self.global_details = json.load(f)
-            except Exception as e:
-                print(f"Error loading global details: {e}")
-                self.global_details = {"building_certifier": [], "appointed_competent_person": []}
-        else:
-            # Create default global.json if it doesn't exist
-            self.save_global_details()
+        self.global_store.load()
 
     def save_global_details(self):
         """
         Save global details for building certifier and appointed competent person to global.json
         """
-        with open('global.json', 'w') as f:
-            json.dump(self.global_details, f, indent=2)
+        self.global_store.compact()
     
     def load_defaults(self):
         """
@@ -280,20 +295,8 @@ class InspectionFormApp:
                 
                 # Apply defaults to form fields
                 for field_name, default_value in defaults.items():
-                    if field_name in self.form_fields:
-                        widget = self.form_fields[field_name]
-                        if isinstance(widget, tk.Text):
-                            # For text widgets (text areas), we need to insert differently
-                            widget.delete("1.0", tk.END)
-                            widget.insert("1.0", default_value)
-                        elif isinstance(widget, tk.Entry):
-                            widget.delete(0, tk.END)
-                            widget.insert(0, default_value)
-                        else:
-                            if hasattr(widget, 'delete') and hasattr(widget, 'insert'):
-                                widget.delete(0, tk.END)
-                                widget.insert(0, default_value)
-                        
+                    self.form.set(field_name, default_value)
+
             except Exception as e:
                 print(f"Error loading defaults: {e}")
         else:
@@ -343,69 +346,52 @@ class InspectionFormApp:
         """
         Add a new detail to global details with unique name enforcement for appointed competent persons
         """
-        if detail_type == "appointed_competent_person":
-            # For appointed competent person, enforce unique name and override on save
-            name = detail.get("name", "")
-            if name:
-                # Find if there's an existing record with the same name to replace
-                existing_index = None
-                for i, existing_detail in enumerate(self.global_details[detail_type]):
-                    if existing_detail.get("name", "") == name:
-                        existing_index = i
-                        break
-
-                if existing_index is not None:
-                    # Replace the existing entry with new data
-                    self.global_details[detail_type][existing_index] = detail
-                else:
-                    # Add new entry
-                    self.global_details[detail_type].append(detail)
-        else:
-            # For building certifier, use original duplicate checking
-            is_duplicate = False
-            for existing_detail in self.global_details[detail_type]:
-                if (existing_detail.get("name", "") == detail.get("name", "") and
-                    existing_detail.get("approval_number", "") == detail.get("approval_number", "")):
-                    is_duplicate = True
-                    break
-
-            if not is_duplicate:
-                self.global_details[detail_type].append(detail)
-
-        self.save_global_details()
-    
+        # The store indexes records by name (plus approval number for certifiers)
+        # and only writes when the record is new or changed
+        self.global_store.add(detail_type, detail)
+
+    def restore_autosave(self):
+        """
+        Offer to restore a form that had unsaved changes when the application last stopped
+        """
+        state = read_journal(self.autosave.path)
+        if state is not None and state.dirty:
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(state.modified)) if state.modified else "earlier"
+            name = os.path.basename(state.json_path) if state.json_path else "an unsaved form"
+            if messagebox.askyesno("Restore Unsaved Work",
+                                   f"Changes to {name} from {when} were never saved.\n\nRestore them?"):
+                self.form.update(state.fields)
+                self.current_json_path = state.json_path
+                self.autosave.start(self.form.data(), state.json_path, dirty=True)
+                self.status_var.set(f"Restored unsaved changes from {when}")
+                return
+        self.autosave.start(self.form.data())
+
+    def record_detail_use(self, detail_type, detail):
+        """
+        Note that a record was just used, so the "+" picker lists it first
+        """
+        self.detail_usage.touch(detail_type, detail)
+        self.worker.submit(lambda progress: self.detail_usage.save(),
+                           on_error=lambda e: print(f"Could not save detail usage: {e}"))
+
     def check_and_add_to_global_details(self, form_data):
         """
         Check for new building certifier or appointed competent person details and add to global.json
         """
         # Check if there's new building certifier data
-        certifier_data = {
-            "name": form_data.get("Building certifier's name (in full)", ""),
-            "contact": form_data.get("Building certifier reference number", ""),
-            "approval_number": form_data.get("Building development approval number", "")
-        }
+        certifier_data = detail_from_form("building_certifier", form_data)
 
         if certifier_data["name"] or certifier_data["contact"] or certifier_data["approval_number"]:
             self.add_to_global_details("building_certifier", certifier_data)
+            self.record_detail_use("building_certifier", certifier_data)
 
         # Check if there's new appointed competent person data
-        person_data = {
-            "name": form_data.get("Appointed competent person name (in full)", ""),
-            "company": form_data.get("Company name (if applicable)", ""),
-            "contact_person": form_data.get("Contact person", ""),
-            "business_phone": form_data.get("Business phone number", ""),
-            "mobile": form_data.get("Mobile", ""),
-            "email": form_data.get("Email address", ""),
-            "postal_address": form_data.get("Postal address", ""),
-            "postal_suburb": form_data.get("Suburb/locality (postal)", ""),
-            "postal_state": form_data.get("State (postal)", ""),
-            "postal_postcode": form_data.get("Postcode (postal)", ""),
-            "licence_type": form_data.get("Licence class or registration type (if applicable)", ""),
-            "licence_number": form_data.get("Licence class or registration number (if applicable)", "")
-        }
+        person_data = detail_from_form("appointed_competent_person", form_data)
 
         if person_data["name"]:
             self.add_to_global_details("appointed_competent_person", person_data)
+            self.record_detail_use("appointed_competent_person", person_data)
 
     def save_form(self):
         """
@@ -435,23 +421,32 @@ class InspectionFormApp:
         if not file_path:
             return  # User cancelled
         
-        try:
+        generation = self.form_generation
+        sequence = self.autosave.sequence
+
+        def write_form(progress):
             # Save form data to JSON file
-            with open(file_path, 'w') as f:
-                json.dump(form_data, f, indent=2)
-            
-            # Update current path
-            self.current_json_path = file_path
-            
-            # Add to global details if new building certifier or competent person data
-            self.check_and_add_to_global_details(form_data)
-            
-            self.status_var.set(f"Form saved successfully: {file_path}")
-            messagebox.showinfo("Success", f"Form saved successfully:\n{file_path}")
-            
-        except Exception as e:
+            with measure("save", source=file_path), phase("write_json"):
+                with open(file_path, 'w') as f:
+                    json.dump(form_data, f, indent=2)
+            self.index_form(file_path)
+            return file_path
+
+        def saved(path):
+            if generation == self.form_generation:
+                # Only once written, so a failed save keeps the previous path
+                self.current_json_path = path
+                self.autosave.mark_saved(path, sequence)
+            self.status_var.set(f"Form saved successfully: {path}")
+
+        def failed(e):
             self.status_var.set(f"Error saving form: {str(e)}")
             messagebox.showerror("Error", f"Error saving form:\n{str(e)}")
+
+        # Add to global details if new building certifier or competent person data
+        self.check_and_add_to_global_details(form_data)
+
+        self.worker.submit(write_form, saved, failed, f"Saving form: {file_path}")
     
     def generate_docx(self):
         """
@@ -460,6 +455,13 @@ class InspectionFormApp:
         # Get form data
         form_data = self.get_form_data()
 
+        problems = self.validate_form()
+        if problems:
+            listed = "\n".join(f"{field_name} {message}" for field_name, message in problems.items())
+            if not messagebox.askyesno("Check Form", f"Some fields look wrong:\n\n{listed}\n\nGenerate anyway?"):
+                self.form_view.focus_field(next(iter(problems)))
+                return
+
         # Determine output file path
         if self.current_json_path:
             # Suggest DOCX name based on JSON file name
@@ -483,68 +485,113 @@ class InspectionFormApp:
         if not output_path:
             return  # User cancelled
 
-        try:
-            # Create a new document based on the template
-            doc = Document(self.template_path)
-
-            # Extract the signature file path
-            signature_path = form_data.get("Signature Image Path", "").strip()
-
-            # Replace placeholders in the document with form data
-            # Process all paragraphs in the document
-            for paragraph in doc.paragraphs:
-                for field_name, value in form_data.items():
-                    if value.strip():
-                        # Check if the placeholder exists in the paragraph text
-                        placeholder = f"<<{field_name}>>"
-                        if placeholder in paragraph.text:
-                            # Replace the placeholder with the actual value
-                            paragraph.text = paragraph.text.replace(placeholder, value)
-
-            # Also check in table cells (this is where most placeholders are based on our analysis)
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        for paragraph in cell.paragraphs:
-                            for field_name, value in form_data.items():
-                                if value.strip():
-                                    # Check if the placeholder exists in the paragraph text
-                                    placeholder = f"<<{field_name}>>"
-                                    if placeholder in paragraph.text:
-                                        # Replace the placeholder with the actual value
-                                        paragraph.text = paragraph.text.replace(placeholder, value)
-
-            # Handle signature section - since it's manual now, we just update the date
-            # Find the date placeholder in Table 9 (signature table)
-            for table_idx, table in enumerate(doc.tables):
-                if table_idx == 8:  # Table 9 (0-indexed as 8) is the signature table
-                    for row in table.rows:
-                        for cell_idx, cell in enumerate(row.cells):
-                            for paragraph in cell.paragraphs:
-                                if "<<Date (signature)>>" in paragraph.text:
-                                    # Replace with actual date from form data
-                                    date_value = form_data.get("Date (signature)", "")
-                                    paragraph.text = date_value
-
-            # Save the document
-            doc.save(output_path)
-
-            # Create corresponding JSON file
-            json_output_path = os.path.splitext(output_path)[0] + ".json"
-            with open(json_output_path, 'w') as f:
-                json.dump(form_data, f, indent=2)
-
-            # Update current paths
-            self.current_docx_path = output_path
-            self.current_json_path = json_output_path
-
-            self.status_var.set(f"DOCX generated successfully: {output_path}")
-            messagebox.showinfo("Success", f"DOCX generated successfully:\n{output_path}")
+        generation = self.form_generation
+        sequence = self.autosave.sequence
+        template_path = self.template_path
+
+        def generate(progress):
+            with measure("generate", output_path):
+                # Create a new document based on the template and fill in the placeholders
+                progress(f"Loading template: {template_path}")
+                with phase("load_engine"):
+                    engine = load_engine(template_path)
+                photos = checked_photo_paths(form_data)
+                if photos:
+                    # Processed (or fetched from the photo cache) in parallel; rendering then reuses them
+                    progress(f"Processing {len(photos)} photos")
+                    with phase("photos"):
+                        photo_results = prepare_photos(photos, self.photo_cache)
+                    reused = sum(1 for photo in photo_results if photo.cached)
+                    progress(f"Processed {len(photo_results)} photos ({reused} from the photo cache)")
+                progress(f"Writing DOCX: {output_path}")
+                cached = self.render_cache.render(engine, form_data, output_path)
+
+                # Create corresponding JSON file
+                progress(f"Writing JSON alongside: {output_path}")
+                with phase("write_json"):
+                    json_output_path = write_form_json(form_data, output_path)
+                self.index_form(json_output_path)
+                return json_output_path, cached, photo_results if photos else []
+
+        def generated(result):
+            json_output_path, cached, photo_results = result
+            # Update current paths, unless the user has already moved on to another form
+            if generation == self.form_generation:
+                self.current_docx_path = output_path
+                self.current_json_path = json_output_path
+                self.autosave.mark_saved(json_output_path, sequence)
+            photos = ""
+            if photo_results:
+                saved = sum(photo.bytes_saved for photo in photo_results)
+                photos = f", {len(photo_results)} photos ({saved / 2 ** 20:.1f} MB saved by downscaling)"
+            if cached:
+                self.status_var.set(f"DOCX generated successfully (form unchanged, reused cached copy{photos}): "
+                                    f"{output_path}")
+            else:
+                self.status_var.set(f"DOCX generated successfully{photos}: {output_path}")
 
-        except Exception as e:
+        def failed(e):
             self.status_var.set(f"Error generating DOCX: {str(e)}")
             messagebox.showerror("Error", f"Error generating DOCX:\n{str(e)}")
 
+        self.worker.submit(generate, generated, failed, f"Generating DOCX: {output_path}")
+
+    def generate_bundle(self):
+        """
+        Render several saved forms into one ZIP for a submission, streamed
+        straight into the archive without writing each DOCX to disk
+        """
+        json_paths = filedialog.askopenfilenames(
+            title="Forms to Bundle",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            initialdir=FORMS_FOLDER if os.path.isdir(FORMS_FOLDER) else None
+        )
+        if not json_paths:
+            return  # User cancelled
+
+        output_path = filedialog.asksaveasfilename(
+            defaultextension=".zip",
+            filetypes=[("ZIP archives", "*.zip"), ("All files", "*.*")],
+            initialfile="submission.zip",
+            initialdir=os.path.dirname(json_paths[0]) or None
+        )
+        if not output_path:
+            return  # User cancelled
+
+        template_path = self.template_path
+
+        def bundle(progress):
+            from bundle import write_bundle
+
+            engine = load_engine(template_path)
+
+            def report(index, total, result):
+                progress(f"Bundling form {index} of {total}: {os.path.basename(result.source)}")
+
+            try:
+                with open(output_path, 'wb') as output:
+                    return write_bundle(list(json_paths), output, engine, progress=report)
+            except Exception:
+                # Don't leave half an archive behind
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                raise
+
+        def bundled(results):
+            failed = [r for r in results if not r.ok]
+            if failed:
+                self.status_var.set(f"Bundle written with {len(failed)} failed forms: {output_path}")
+                messagebox.showwarning("Bundle", "These forms could not be rendered and were left out:\n"
+                                       + "\n".join(f"{r.source}: {r.error}" for r in failed))
+            else:
+                self.status_var.set(f"Bundle of {len(results)} forms written: {output_path}")
+
+        def failed(e):
+            self.status_var.set(f"Error writing bundle: {str(e)}")
+            messagebox.showerror("Error", f"Error writing bundle:\n{str(e)}")
+
+        self.worker.submit(bundle, bundled, failed, f"Writing bundle: {output_path}")
+
     def load_form(self):
         """
         Load form data from a JSON file
@@ -556,30 +603,50 @@ class InspectionFormApp:
         
         if not file_path:
             return  # User cancelled
-        
-        try:
+
+        self.load_form_from_path(file_path)
+
+    def load_form_from_path(self, file_path):
+        """
+        Read a saved form on the worker thread and fill the form with it
+        """
+        def read_form(progress):
             # Load form data from JSON file
-            with open(file_path, 'r') as f:
-                form_data = json.load(f)
-            
+            with measure("load", source=file_path), phase("read_json"):
+                # Numbers, booleans and nulls become strings, as in the batch tools
+                form_data = load_form_data(file_path)
+            self.index_form(file_path)
+            return form_data
+
+        def failed(e):
+            self.status_var.set(f"Error loading form: {str(e)}")
+            messagebox.showerror("Error", f"Error loading form:\n{str(e)}")
+
+        self.worker.submit(read_form, lambda form_data: self.populate_form(form_data, file_path), failed,
+                           f"Loading form: {file_path}")
+
+    def index_form(self, json_path):
+        """
+        Add a saved form to the search index; called on the worker thread.
+        A failure here shouldn't fail the save or load it follows.
+        """
+        try:
+            self.form_index.add(json_path)
+        except Exception as e:
+            print(f"Could not index {json_path}: {e}")
+
+    def populate_form(self, form_data, file_path):
+        """
+        Fill the form fields with data loaded from file_path
+        """
+        try:
             # Populate form fields with loaded data
-            for field_name, value in form_data.items():
-                if field_name in self.form_fields:
-                    widget = self.form_fields[field_name]
-                    if isinstance(widget, tk.Text):
-                        # For text widgets (text areas), we need to insert differently
-                        widget.delete("1.0", tk.END)
-                        widget.insert("1.0", value)
-                    elif isinstance(widget, tk.Entry):
-                        widget.delete(0, tk.END)
-                        widget.insert(0, value)
-                    else:
-                        if hasattr(widget, 'delete') and hasattr(widget, 'insert'):
-                            widget.delete(0, tk.END)
-                            widget.insert(0, value)
+            self.form.update(form_data)
             
             # Update current path
             self.current_json_path = file_path
+            self.form_generation += 1
+            self.autosave.start(self.form.data(), file_path)
             
             self.status_var.set(f"Form loaded successfully: {file_path}")
             messagebox.showinfo("Success", f"Form loaded successfully:\n{file_path}")
@@ -596,16 +663,12 @@ class InspectionFormApp:
         Get current form data as a dictionary
         """
         form_data = {}
-        for field_name, widget in self.form_fields.items():
+        for field_name, field_type in self.form.fields.items():
             if field_name == "Signature (Manual)":  # Skip the manual signature field
                 continue
-            if isinstance(widget, tk.Text):
-                # For text widgets (text areas), we need to get content differently
-                value = widget.get("1.0", tk.END).strip()  # Get from start to end, then strip trailing newline
-            elif isinstance(widget, tk.Entry):
-                value = widget.get()
-            else:
-                value = widget.get() if hasattr(widget, 'get') else str(widget)
+            value = self.form.get(field_name)
+            if field_type == "textarea":
+                value = value.strip()
             form_data[field_name] = value
         return form_data
 
@@ -613,22 +676,18 @@ class InspectionFormApp:
         """
         Reset all form fields to empty or default values
         """
-        for field_name, widget in self.form_fields.items():
-            if isinstance(widget, tk.Text):
-                # For text widgets (text areas), we need to delete differently
-                widget.delete("1.0", tk.END)
-            elif isinstance(widget, tk.Entry):
-                widget.delete(0, tk.END)
-            else:
-                if hasattr(widget, 'delete'):
-                    widget.delete(0, tk.END)
+        self.form.clear()
+
+        self.form_generation += 1
 
         # Reload defaults
         self.load_defaults()
+        self.validate_form()
+        self.autosave.start(self.form.data(), self.current_json_path)
 
         self.status_var.set("Form reset to defaults")
     
-    def browse_file(self, field_name, entry_widget):
+    def browse_file(self, field_name):
         """
         Open a file dialog to browse for a signature image
         """
@@ -643,12 +702,32 @@ class InspectionFormApp:
         )
 
         if file_path:
-            entry_widget.delete(0, tk.END)
-            entry_widget.insert(0, file_path)
+            self.form.set(field_name, file_path)
+
+    def add_photos(self, field_name):
+        """
+        Pick inspection photos to embed at the end of the generated DOCX
+        """
+        file_paths = filedialog.askopenfilenames(
+            title="Select Inspection Photos",
+            filetypes=[
+                ("Image files", "*.jpg *.jpeg *.png *.heic *.tif *.tiff *.bmp"),
+                ("JPEG files", "*.jpg *.jpeg"),
+                ("All files", "*.*")
+            ]
+        )
+        if not file_paths:
+            return  # User cancelled
+
+        # Photos already listed stay; new ones are added after them
+        current = photo_paths({field_name: self.form.get(field_name)})
+        paths = current + [path for path in file_paths if path not in current]
+        self.form.set(field_name, f"{PHOTO_SEPARATOR} ".join(paths))
 
     def select_global_detail(self, field_name):
         """
-        Open a dialog to select from global details
+        Open a type-ahead picker over global details; choosing a record fills
+        in all of its fields on the form
         """
         # Determine which type of detail to select based on field name
         if "Building certifier" in field_name:
@@ -661,51 +740,234 @@ class InspectionFormApp:
         # Create selection dialog
         dialog = tk.Toplevel(self.root)
         dialog.title(f"Select {detail_type.replace('_', ' ').title()}")
-        dialog.geometry("500x300")
+        dialog.geometry("600x350")
         dialog.transient(self.root)
         dialog.grab_set()
 
-        # Create listbox with available details
-        listbox = tk.Listbox(dialog)
-        listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        query_var = tk.StringVar()
+        entry = ttk.Entry(dialog, textvariable=query_var)
+        entry.pack(fill=tk.X, padx=10, pady=(10, 0))
+
+        # Create listbox for the matching details
+        list_frame = ttk.Frame(dialog)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        listbox = tk.Listbox(list_frame, activestyle="dotbox")
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=listbox.yview)
+        listbox.configure(yscrollcommand=scrollbar.set)
+        listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        status_var = tk.StringVar()
+        ttk.Label(dialog, textvariable=status_var, anchor=tk.W).pack(fill=tk.X, padx=10)
+
+        shown = []
+        pending = [None]
+
+        def filter_details():
+            pending[0] = None
+            if not dialog.winfo_exists():
+                return
+            if not self.detail_indexes.current(detail_type):
+                # The store changed since the index was built; rebuild it off the UI thread
+                status_var.set("Indexing...")
+                self.worker.submit(lambda progress: self.detail_indexes.get(detail_type),
+                                   lambda index: filter_details() if dialog.winfo_exists() else None,
+                                   lambda e: status_var.set(f"Error indexing details: {str(e)}"))
+                return
+            index = self.detail_indexes.get(detail_type)
+            shown[:], total = index.search(query_var.get(), self.detail_usage.used(detail_type))
+            # Only the best matches are put in the listbox, however many records there are
+            listbox.delete(0, tk.END)
+            listbox.insert(tk.END, *(describe(detail_type, detail) for detail in shown))
+            if shown:
+                listbox.selection_set(0)
+                listbox.activate(0)
+            more = f", showing the first {len(shown)}" if total > len(shown) else ""
+            status_var.set(f"{total} of {len(index)} match{more}")
+
+        def query_changed(*_):
+            if pending[0] is not None:
+                dialog.after_cancel(pending[0])
+            pending[0] = dialog.after(PICKER_DELAY_MS, filter_details)
+
+        query_var.trace_add("write", query_changed)
+
+        def move_selection(step):
+            if not shown:
+                return "break"
+            selection = listbox.curselection()
+            position = min(max((selection[0] if selection else -1) + step, 0), len(shown) - 1)
+            listbox.selection_clear(0, tk.END)
+            listbox.selection_set(position)
+            listbox.activate(position)
+            listbox.see(position)
+            return "break"
+
+        def select_detail(event=None):
+            selection = listbox.curselection()
+            if selection:
+                selected_detail = shown[selection[0]]
+                # Fill every field the record covers, not just the one clicked
+                self.form.update(form_from_detail(detail_type, selected_detail))
+                self.record_detail_use(detail_type, selected_detail)
+                dialog.destroy()
 
-        # Add available details to listbox
-        for detail in self.global_details[detail_type]:
-            listbox.insert(tk.END, detail.get("name", "") + " - " + detail.get("contact", ""))
+        entry.bind("<Down>", lambda event: move_selection(1))
+        entry.bind("<Up>", lambda event: move_selection(-1))
+        entry.bind("<Return>", select_detail)
+        listbox.bind("<Double-1>", select_detail)
+        listbox.bind("<Return>", select_detail)
+        dialog.bind("<Escape>", lambda event: dialog.destroy())
 
         # Add buttons
         button_frame = ttk.Frame(dialog)
         button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
 
-        def select_detail():
-            selection = listbox.curselection()
+        ttk.Button(button_frame, text="Select", command=select_detail).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT)
+
+        filter_details()
+        entry.focus_set()
+
+        # Center the dialog
+        dialog.update_idletasks()
+        x = self.root.winfo_x() + (self.root.winfo_width() // 2) - (dialog.winfo_width() // 2)
+        y = self.root.winfo_y() + (self.root.winfo_height() // 2) - (dialog.winfo_height() // 2)
+        dialog.geometry(f"+{x}+{y}")
+
+    def find_previous_inspection(self):
+        """
+        Open a dialog to search previously saved forms and load one
+        """
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Find Previous Inspection")
+        dialog.geometry("850x450")
+        dialog.transient(self.root)
+        dialog.grab_set()
+
+        query_var = tk.StringVar()
+        entry = ttk.Entry(dialog, textvariable=query_var)
+        entry.pack(fill=tk.X, padx=10, pady=(10, 0))
+        ttk.Label(dialog, text="Search by address, lot:3 plan:RP1234, ba:BA7860, date:2024-03 or any other words",
+                  foreground="gray").pack(anchor=tk.W, padx=10, pady=(2, 5))
+
+        # Results list
+        list_frame = ttk.Frame(dialog)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        columns = {"address": ("Address", 260), "lot_plan": ("Lot and plan", 140),
+                   "reference": ("Approval number", 120), "dates": ("Dates", 150), "modified": ("Saved", 90)}
+        tree = ttk.Treeview(list_frame, columns=list(columns), show="headings", selectmode="browse")
+        for column, (heading, width) in columns.items():
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, stretch=column == "address")
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        status_var = tk.StringVar()
+        ttk.Label(dialog, textvariable=status_var, anchor=tk.W).pack(fill=tk.X, padx=10, pady=(5, 0))
+
+        results = []
+        pending = [None]
+
+        def run_search():
+            pending[0] = None
+            if not dialog.winfo_exists():
+                return
+            start = time.perf_counter()
+            results[:] = self.form_index.search(query_var.get(), limit=SEARCH_LIMIT)
+            elapsed = (time.perf_counter() - start) * 1000
+            tree.delete(*tree.get_children())
+            for number, result in enumerate(results):
+                modified = time.strftime("%Y-%m-%d", time.localtime(result.modified))
+                tree.insert("", tk.END, iid=str(number),
+                            values=(result.address, result.lot_plan, result.reference, result.dates, modified))
+            if results:
+                tree.selection_set("0")
+            status_var.set(f"{len(results)} forms found ({elapsed:.0f} ms); {len(self.form_index)} indexed")
+
+        def query_changed(*_):
+            # Search once typing pauses rather than on every keystroke
+            if pending[0] is not None:
+                dialog.after_cancel(pending[0])
+            pending[0] = dialog.after(SEARCH_DELAY_MS, run_search)
+
+        query_var.trace_add("write", query_changed)
+
+        def scanned(counts):
+            if dialog.winfo_exists():
+                run_search()
+                status_var.set(f"{status_var.get()} (rescan: {counts[0]} updated, {counts[1]} removed)")
+
+        def scan_failed(e):
+            if dialog.winfo_exists():
+                status_var.set(f"Error scanning for forms: {str(e)}")
+
+        def rescan(directories, recursive):
+            self.worker.submit(lambda progress: self.form_index.scan(directories, recursive=recursive),
+                               scanned, scan_failed, "Scanning for saved forms...")
+
+        def scan_folder():
+            directory = filedialog.askdirectory(parent=dialog, title="Add Forms From Folder")
+            if directory:
+                rescan([directory], True)
+
+        def load_selected(event=None):
+            selection = tree.selection()
             if selection:
-                selected_detail = self.global_details[detail_type][selection[0]]
-                # Fill related fields based on field_name
-                if "name" in field_name.lower():
-                    self.form_fields[field_name].delete(0, tk.END)
-                    self.form_fields[field_name].insert(0, selected_detail.get("name", ""))
-                elif "reference number" in field_name.lower() or "approval number" in field_name.lower():
-                    self.form_fields[field_name].delete(0, tk.END)
-                    self.form_fields[field_name].insert(0, selected_detail.get("contact", ""))
-                elif "contact" in field_name.lower() or "email" in field_name.lower():
-                    self.form_fields[field_name].delete(0, tk.END)
-                    self.form_fields[field_name].insert(0, selected_detail.get("contact", ""))
+                file_path = results[int(selection[0])].path
                 dialog.destroy()
+                self.load_form_from_path(file_path)
 
-        def add_new():
-            # For now, just close the dialog to allow manual entry
-            dialog.destroy()
+        tree.bind("<Double-1>", load_selected)
+        tree.bind("<Return>", load_selected)
+        entry.bind("<Return>", load_selected)
+        entry.bind("<Down>", lambda event: (tree.focus_set(), tree.focus(tree.selection()[0])
+                                            if tree.selection() else None))
+        dialog.bind("<Escape>", lambda event: dialog.destroy())
 
-        ttk.Button(button_frame, text="Select", command=select_detail).pack(side=tk.LEFT, padx=(0, 5))
+        # Add buttons
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text="Load", command=load_selected).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="Scan Folder...", command=scan_folder).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT)
 
+        # Show what is indexed straight away, then pick up forms changed in
+        # the known folders (and the default save folder) since the last look
+        run_search()
+        directories = self.form_index.roots()
+        if os.path.isdir(FORMS_FOLDER) and os.path.abspath(FORMS_FOLDER) not in directories:
+            rescan([FORMS_FOLDER], True)
+        if directories:
+            rescan(directories, False)
+        entry.focus_set()
+
         # Center the dialog
         dialog.update_idletasks()
         x = self.root.winfo_x() + (self.root.winfo_width() // 2) - (dialog.winfo_width() // 2)
         y = self.root.winfo_y() + (self.root.winfo_height() // 2) - (dialog.winfo_height() // 2)
         dialog.geometry(f"+{x}+{y}")
 
+    def on_close(self):
+        """
+        Finish background jobs and flush pending global details before the window closes
+        """
+        if self.worker.pending:
+            self.status_var.set("Waiting for background jobs to finish...")
+            self.root.update_idletasks()
+        self.worker.shutdown(wait=True)
+        self.global_store.close()
+        self.form_index.close()
+        self.autosave.close()
+        if instrumentation.enabled():
+            # Alongside the --timings summary
+            for summary in (self.global_store.stats_summary(), self.autosave.stats_summary(),
+                            self.render_cache.report()):
+                print(summary, file=sys.stderr)
+        self.root.destroy()
+
     def show_signature_info(self):
         """
         Show information about manual signature requirement
@@ -727,11 +989,193 @@ def main():
     # Set up argument parser
     parser = argparse.ArgumentParser(description='QLD Building Forms Application')
     parser.add_argument('--template', type=str, help='Path to alternate template.docx file')
+    parser.add_argument('--templates', metavar='DIR',
+                        help='Directory of templates to choose from; --template then takes a name from it')
+    parser.add_argument('--photo-dir', action='append', metavar='DIR',
+                        help='Let forms read by the batch commands embed inspection photos from DIR (repeatable); '
+                             'the GUI accepts photos from anywhere and serve never does')
+    parser.add_argument('--timings', metavar='FILE',
+                        help="Time each phase of rendering, saving and loading; append JSON lines to FILE ('-' for stderr)")
+    parser.add_argument('--profile', choices=PROFILERS,
+                        help='Profile each render and write the report next to its output file')
+
+    subparsers = parser.add_subparsers(dest='command')
+    render_parser = subparsers.add_parser('render', help='Render saved form JSON files to DOCX without opening the GUI')
+    render_parser.add_argument('--template', type=str, default=argparse.SUPPRESS,
+                               help='Path to alternate template.docx file')
+    render_parser.add_argument('--batch', nargs='+', required=True,
+                               help='Form JSON files or glob patterns (e.g. jobs/*.json)')
+    render_parser.add_argument('--out', required=True, help='Directory to write DOCX files to')
+    render_parser.add_argument('--no-json', action='store_true',
+                               help='Do not write a JSON file alongside each DOCX')
+    render_parser.add_argument('--workers', type=int, default=1,
+                               help='Number of worker processes (0 = one per CPU core)')
+    render_parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE,
+                               help='docx renders through python-docx; zip patches document.xml directly (faster)')
+    render_parser.add_argument('--cache', action='store_true',
+                               help='Reuse previously rendered DOCX files for unchanged forms (hardlinked from the cache)')
+    render_parser.add_argument('--no-validate', action='store_true',
+                               help='Render without checking the forms first')
+    render_parser.add_argument('--validation-report', metavar='FILE',
+                               help='Write the problems found in the forms to FILE as JSON')
+
+    merge_parser = subparsers.add_parser('merge', help='Render one form per row of a CSV or JSON Lines file')
+    merge_parser.add_argument('source', help='CSV (with a header row) or JSON Lines file of inspections')
+    merge_parser.add_argument('--template', type=str, default=argparse.SUPPRESS,
+                              help='Path to alternate template.docx file')
+    merge_parser.add_argument('--out', required=True, help='Directory to write DOCX files to')
+    merge_parser.add_argument('--format', choices=MERGE_FORMATS, default=None,
+                              help='Source format (default: from the file extension)')
+    merge_parser.add_argument('--map', help='JSON file mapping source column names to form field names')
+    merge_parser.add_argument('--defaults', default='defaults.json',
+                              help='Default values the rows are layered over')
+    merge_parser.add_argument('--global', dest='global_details', default='global.json',
+                              help='Certifier and competent person records to fill in from')
+    merge_parser.add_argument('--name-column', help='Column used to name the output files')
+    merge_parser.add_argument('--template-column',
+                              help='Column naming the template (from --templates) for each row; blank uses --template')
+    merge_parser.add_argument('--no-validate', action='store_true',
+                              help='Render without checking the rows first')
+    merge_parser.add_argument('--validation-report', metavar='FILE',
+                              help='Write the problems found in the rows to FILE as JSON')
+    merge_parser.add_argument('--no-json', action='store_true',
+                              help='Do not write a JSON file alongside each DOCX')
+    merge_parser.add_argument('--workers', type=int, default=1,
+                              help='Number of worker processes (0 = one per CPU core)')
+    merge_parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE,
+                              help='docx renders through python-docx; zip patches document.xml directly (faster)')
+    merge_parser.add_argument('--cache', action='store_true',
+                              help='Reuse previously rendered DOCX files for unchanged rows (hardlinked from the cache)')
+    merge_parser.add_argument('--restart', action='store_true',
+                              help='Ignore any checkpoint and start from the first row')
+    merge_parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY,
+                              help='Rows rendered between checkpoint writes')
+
+    serve_parser = subparsers.add_parser('serve', help='Render forms posted over HTTP by other local systems')
+    serve_parser.add_argument('--template', type=str, default=argparse.SUPPRESS,
+                              help='Path to alternate template.docx file')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    serve_parser.add_argument('--port', type=int, default=None, help='Port to listen on (default 8012)')
+    serve_parser.add_argument('--workers', type=int, default=2, help='Forms rendered at the same time')
+    serve_parser.add_argument('--queue-size', type=int, default=None,
+                              help='Requests allowed to wait before new ones get 429 Too Many Requests (default 16)')
+    serve_parser.add_argument('--processes', action='store_true',
+                              help='Render in worker processes instead of threads')
+    serve_parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE,
+                              help='docx renders through python-docx; zip patches document.xml directly (faster)')
+
+    watch_parser = subparsers.add_parser('watch', help='Render form JSON files as they are dropped into a folder')
+    watch_parser.add_argument('source', help='Directory tree to watch for form JSON files')
+    watch_parser.add_argument('--template', type=str, default=argparse.SUPPRESS,
+                              help='Path to alternate template.docx file')
+    watch_parser.add_argument('--out', required=True, help='Directory to write DOCX files to')
+    watch_parser.add_argument('--no-json', action='store_true',
+                              help='Do not write a JSON file alongside each DOCX')
+    watch_parser.add_argument('--workers', type=int, default=1,
+                              help='Worker processes for large batches of changes (0 = one per CPU core)')
+    watch_parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE,
+                              help='docx renders through python-docx; zip patches document.xml directly (faster)')
+    watch_parser.add_argument('--cache', action='store_true',
+                              help='Reuse identical renders from the render cache, hardlinked into --out')
+    watch_parser.add_argument('--settle', type=float, default=SETTLE_SECONDS,
+                              help='Seconds a file must be left unchanged before it is rendered')
+    watch_parser.add_argument('--interval', type=float, default=POLL_INTERVAL,
+                              help='Seconds between rescans when polling')
+    watch_parser.add_argument('--poll', action='store_true', help='Poll for changes even where inotify is available')
+    watch_parser.add_argument('--once', action='store_true',
+                              help='Render what has changed since the last run, then exit')
+
+    bundle_parser = subparsers.add_parser('bundle', help='Render saved forms into one ZIP, streamed with no temporary files')
+    bundle_parser.add_argument('--template', type=str, default=argparse.SUPPRESS,
+                               help='Path to alternate template.docx file')
+    bundle_parser.add_argument('--batch', nargs='+', required=True,
+                               help='Form JSON files or glob patterns (e.g. jobs/*.json)')
+    bundle_output = bundle_parser.add_mutually_exclusive_group(required=True)
+    bundle_output.add_argument('--out', help="ZIP file to write ('-' for stdout)")
+    bundle_output.add_argument('--connect', metavar='HOST:PORT', help='Stream the ZIP to a TCP socket')
+    bundle_parser.add_argument('--no-json', action='store_true',
+                               help='Do not add a JSON file alongside each DOCX')
+    bundle_parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE,
+                               help='docx renders through python-docx; zip patches document.xml directly (faster)')
+    bundle_parser.add_argument('--no-validate', action='store_true',
+                               help='Bundle without checking the forms first')
+    bundle_parser.add_argument('--validation-report', metavar='FILE',
+                               help='Write the problems found in the forms to FILE as JSON')
+
+    validate_parser = subparsers.add_parser('validate', help='Check saved form JSON files without rendering them')
+    validate_parser.add_argument('--template', type=str, default=argparse.SUPPRESS,
+                                 help='Path to alternate template.docx file')
+    validate_parser.add_argument('forms', nargs='+', help='Form JSON files or glob patterns (e.g. jobs/*.json)')
+    validate_parser.add_argument('--report', metavar='FILE', help='Write the problems found to FILE as JSON')
+    validate_parser.add_argument('--limit', type=int, default=PRINT_LIMIT, help='Most problems to print')
+
+    index_parser = subparsers.add_parser('index', help='Index saved form JSON files and search them')
+    index_parser.add_argument('directories', nargs='*', help='Directory trees to (re)index')
+    index_parser.add_argument('--search', dest='query', metavar='QUERY',
+                              help='Search the index, e.g. "smith st", "lot:3 plan:RP1234", "ba:BA7860"')
+    index_parser.add_argument('--limit', type=int, default=50, help='Most results to show')
+    index_parser.add_argument('--db', default=INDEX_PATH, help='Index database file')
+
+    schema_parser = subparsers.add_parser('schema', help="List the form fields found in a template's placeholders")
+    schema_parser.add_argument('--template', type=str, default=argparse.SUPPRESS,
+                               help='Path to alternate template.docx file')
+
+    photos_parser = subparsers.add_parser('photos', help='Downscale inspection photos into the photo cache and report the savings')
+    photos_parser.add_argument('photos', nargs='+', help='Photo files')
+    photos_parser.add_argument('--workers', type=int, default=0, help='Photos processed at once (0 = one per CPU core)')
+    photos_parser.add_argument('--max-dimension', type=int, default=MAX_PHOTO_DIMENSION,
+                               help='Longest side of a processed photo in pixels')
+    photos_parser.add_argument('--quality', type=int, default=PHOTO_QUALITY, help='JPEG quality of processed photos')
+
+    cache_parser = subparsers.add_parser('cache', help='Show or trim the render cache')
+    cache_parser.add_argument('--evict', action='store_true',
+                              help='Remove entries past the age limit, then the oldest until under the size limit')
+    cache_parser.add_argument('--clear', action='store_true', help='Remove every cached render')
 
     args = parser.parse_args()
 
     # Use provided template or default
     template_path = args.template if args.template else 'template.docx'
+    if args.templates:
+        if not os.path.isdir(args.templates):
+            parser.error(f"--templates: {args.templates} is not a directory")
+        template_path = configure_templates(args.templates).resolve(template_path)
+
+    if args.photo_dir:
+        allow_photos(args.photo_dir)
+    elif args.command is None:
+        # The GUI: photos are picked by the person at the keyboard
+        allow_photos(None)
+
+    if args.timings or args.profile:
+        instrumentation.configure(args.timings, args.profile)
+        # To stderr, since stdout may be carrying a bundle
+        atexit.register(lambda: print(instrumentation.recorder().summary(), file=sys.stderr))
+
+    if args.command == 'render':
+        sys.exit(run_render_command(args, template_path))
+    if args.command == 'merge':
+        sys.exit(run_merge_command(args, template_path))
+    if args.command == 'serve':
+        # asyncio is slow to import, so only load the server when it is asked for
+        from server import run_server_command
+        sys.exit(run_server_command(args, template_path))
+    if args.command == 'watch':
+        sys.exit(run_watch_command(args, template_path))
+    if args.command == 'bundle':
+        # zipfile and python-docx are slow to import; only load them when bundling
+        from bundle import run_bundle_command
+        sys.exit(run_bundle_command(args, template_path))
+    if args.command == 'validate':
+        sys.exit(run_validate_command(args, template_path))
+    if args.command == 'index':
+        sys.exit(run_index_command(args))
+    if args.command == 'schema':
+        sys.exit(run_schema_command(args, template_path))
+    if args.command == 'photos':
+        sys.exit(run_photos_command(args))
+    if args.command == 'cache':
+        sys.exit(run_cache_command(args))
 
     # Add the template path to the application instance
     root = tk.Tk()
@@ -0,0 +1,528 @@
+"""
+Streaming mail-merge: one Form 12 per row of a CSV or JSON Lines file.
+
+Rows are read one at a time and each is layered over defaults.json and the
+global.json records it refers to before being rendered, so memory use does
+not depend on the length of the file:
+
+    defaults.json  <  certifier / competent person record  <  the row itself
+
+Blank cells don't override anything. Columns are matched to form field names
+ignoring case, spacing and punctuation, or through an explicit mapping file.
+
+With a template directory (main.py --templates DIR), --template-column
+names the column that picks each row's template; a blank cell means the
+default template. Each template is compiled once per process, however the
+rows mix them.
+
+Progress is checkpointed (source byte offset plus row count) so an
+interrupted merge resumes after the last row that was finished.
+
+Before anything is rendered the whole file is read once and checked against
+formfields.FIELD_RULES (see validation.py); the merge stops if any row fails,
+unless --no-validate is given.
+"""
+
+import collections
+import json
+import os
+import re
+import time
+
+import instrumentation
+from formfields import CERTIFIER_FIELDS, COMPETENT_PERSON_FIELDS, form_from_detail, input_fields
+from globalstore import GlobalDetailsStore, atomic_write_json, empty_details
+from photos import allowed_photo_dirs
+from render import DEFAULT_ENGINE, JobResult, cache_from_args, default_worker_count, load_engine, render_form
+from templateregistry import default_registry
+from templateschema import field_configs_for_template
+
+FORMATS = ('csv', 'jsonl')
+CHECKPOINT_NAME = '.merge-checkpoint.json'
+# Rows finished between checkpoint writes
+CHECKPOINT_EVERY = 100
+# Rows checked together by validate_merge
+VALIDATE_CHUNK = 1000
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f"Can't tell the format of {path}; pass --format csv or --format jsonl")
+
+
+class SourceRow:
+    """
+    One record read from the source file; offset is where the next record starts
+    """
+
+    def __init__(self, number, offset, data=None, error=None):
+        self.number = number
+        self.offset = offset
+        self.data = data
+        self.error = error
+
+
+class _OffsetLines:
+    """
+    Decoded lines of a binary file that keeps track of how many bytes were consumed,
+    so the offset after each CSV record is known even when fields span lines
+    """
+
+    def __init__(self, f, offset):
+        self.f = f
+        self.offset = offset
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        raw = self.f.readline()
+        if not raw:
+            raise StopIteration
+        if self.offset == 0 and raw.startswith(b'\xef\xbb\xbf'):
+            raw_text = raw[3:]  # Excel writes a byte order mark
+        else:
+            raw_text = raw
+        self.offset += len(raw)
+        return raw_text.decode('utf-8')
+
+
+def _cell(value):
+    return "" if value is None else str(value)
+
+
+def iter_rows(path, fmt, offset=0, number=0, header=None):
+    """
+    Lazily yield SourceRows from offset onwards. The first item yielded is the
+    CSV header (None for JSON Lines), read from the start of the file or passed
+    in when resuming part way through.
+    """
+    import csv
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        lines = _OffsetLines(f, offset)
+        if fmt == 'csv':
+            reader = csv.reader(lines)
+            if header is None:
+                header = next(reader, None)
+                if header is None:
+                    return
+            yield header
+            for record in reader:
+                number += 1
+                if not any(cell.strip() for cell in record):
+                    continue
+                if len(record) > len(header):
+                    yield SourceRow(number, lines.offset, error=f"{len(record)} cells but {len(header)} columns")
+                else:
+                    yield SourceRow(number, lines.offset, dict(zip(header, record)))
+        else:
+            yield None
+            for line in lines:
+                if not line.strip():
+                    continue
+                number += 1
+                try:
+                    data = json.loads(line)
+                    if not isinstance(data, dict):
+                        raise ValueError("row must be a JSON object")
+                except ValueError as e:
+                    yield SourceRow(number, lines.offset, error=str(e))
+                    continue
+                yield SourceRow(number, lines.offset, {str(k): _cell(v) for k, v in data.items()})
+
+
+def normalise_name(name):
+    return re.sub(r'[^a-z0-9]+', '', name.lower())
+
+
+class ColumnMapper:
+    """
+    Maps source columns onto form field names: explicit mappings first, then an
+    exact name, then a case/spacing/punctuation-insensitive match
+    """
+
+    def __init__(self, field_names, mapping=None):
+        self.field_names = list(field_names)
+        self.mapping = dict(mapping or {})
+        unknown = sorted(set(self.mapping.values()) - set(self.field_names))
+        if unknown:
+            raise ValueError(f"Column mapping refers to unknown fields: {', '.join(unknown)}")
+        self._names = set(self.field_names)
+        self._by_normal_name = {normalise_name(name): name for name in self.field_names}
+        # Column -> field name (or None); bounded by the number of distinct columns, not rows
+        self._resolved = {}
+        self.unmapped = set()
+
+    def field_for(self, column):
+        if column not in self._resolved:
+            field = self.mapping.get(column)
+            if field is None:
+                field = column if column in self._names else self._by_normal_name.get(normalise_name(column))
+            self._resolved[column] = field
+            if field is None:
+                self.unmapped.add(column)
+        return self._resolved[column]
+
+    def map_row(self, data):
+        """
+        Form fields set by a row; blank cells are left out so they don't hide defaults
+        """
+        fields = {}
+        for column, value in data.items():
+            field = self.field_for(column)
+            if field is not None and value.strip():
+                fields[field] = value
+        return fields
+
+
+class RecordLayers:
+    """
+    Merges a row over defaults.json and the global.json records it names
+    """
+
+    def __init__(self, defaults=None, global_details=None):
+        self.defaults = {k: _cell(v) for k, v in (defaults or {}).items()}
+        global_details = global_details or empty_details()
+        self.people = {}
+        self.certifiers = {}
+        for detail in global_details.get("appointed_competent_person", []):
+            if detail.get("name"):
+                self.people[detail["name"]] = detail
+        for detail in global_details.get("building_certifier", []):
+            if detail.get("name"):
+                self.certifiers[(detail["name"], detail.get("approval_number", ""))] = detail
+                self.certifiers[detail["name"]] = detail  # Latest record wins for name-only lookups
+
+    def merge(self, row_fields):
+        form_data = dict(self.defaults)
+        current = {**self.defaults, **row_fields}
+
+        certifier_name = current.get(CERTIFIER_FIELDS["name"], "")
+        approval_number = current.get(CERTIFIER_FIELDS["approval_number"], "")
+        certifier = self.certifiers.get((certifier_name, approval_number))
+        if certifier is not None:
+            form_data.update(form_from_detail("building_certifier", certifier))
+        elif certifier_name in self.certifiers:
+            # Matched by name only: the approval number belongs to another job, so leave it out
+            certifier = dict(self.certifiers[certifier_name])
+            certifier.pop("approval_number", None)
+            form_data.update(form_from_detail("building_certifier", certifier))
+
+        person = self.people.get(current.get(COMPETENT_PERSON_FIELDS["name"], ""))
+        if person is not None:
+            form_data.update(form_from_detail("appointed_competent_person", person))
+
+        form_data.update(row_fields)
+        return {k: _cell(v) for k, v in form_data.items()}
+
+
+def output_name(row, stem, name_column=None):
+    """
+    File name for a row's DOCX: numbered so names are unique and sort in source order
+    """
+    label = row.data.get(name_column, "") if name_column and row.data else ""
+    label = re.sub(r'[^A-Za-z0-9]+', '-', label).strip('-')[:60]
+    return f"{row.number:06d}-{label}.docx" if label else f"{stem}-{row.number:06d}.docx"
+
+
+# Checkpoints
+
+def read_checkpoint(path, source):
+    """
+    Saved progress for source, or None if there is none (or it is for another file)
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("source") != os.path.abspath(source):
+        return None
+    if os.path.getsize(source) < checkpoint.get("offset", 0):
+        print(f"{source} is shorter than when the checkpoint was written; starting again")
+        return None
+    return checkpoint
+
+
+class MergeStats:
+    """
+    Running totals, so a long merge doesn't keep a result per row. Counts carry
+    over from a checkpoint; timings cover this run only.
+    """
+
+    def __init__(self, rendered=0, failed=0):
+        self.rendered = rendered
+        self.failed = failed
+        self.unmapped = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.timed = 0
+        self.total_time = 0.0
+        self.min_time = None
+        self.max_time = 0.0
+
+    def add(self, result):
+        if not result.ok:
+            self.failed += 1
+            return
+        self.rendered += 1
+        if result.cached is not None:
+            if result.cached:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+        self.timed += 1
+        self.total_time += result.elapsed
+        self.min_time = result.elapsed if self.min_time is None else min(self.min_time, result.elapsed)
+        self.max_time = max(self.max_time, result.elapsed)
+
+    def summary(self, wall_time):
+        lines = [f"Merged {self.rendered} of {self.rendered + self.failed} rows "
+                 f"({self.failed} failed) in {wall_time:.2f} s"]
+        if self.timed:
+            throughput = self.timed / wall_time if wall_time > 0 else float('inf')
+            lines.append(f"Per form: mean {self.total_time / self.timed * 1000:.1f} ms, "
+                         f"min {self.min_time * 1000:.1f} ms, max {self.max_time * 1000:.1f} ms")
+            lines.append(f"Throughput: {throughput:.1f} forms/s")
+        if self.cache_hits or self.cache_misses:
+            lines.append(f"Render cache: {self.cache_hits} hits, {self.cache_misses} misses")
+        return "\n".join(lines)
+
+
+def print_merge_result(row, result):
+    if result.ok:
+        cached = " (cached)" if result.cached else ""
+        print(f"[row {row.number}] -> {result.output}{cached} ({result.elapsed * 1000:.1f} ms)")
+    else:
+        print(f"[row {row.number}] FAILED: {result.error}")
+
+
+def validate_merge(source, defaults=None, global_details=None, mapping=None, fmt=None, field_names=None,
+                   template_column=None, validator=None, chunk_size=VALIDATE_CHUNK, checkpoint=None):
+    """
+    Check every row of source, layered as it would be rendered, before any is
+    rendered; returns a ValidationReport. Rows are read in chunks of
+    chunk_size and each chunk is checked column by column, so memory use
+    doesn't depend on the length of the file. Rows that can't be parsed are
+    left for the merge to report. With a checkpoint (from read_checkpoint)
+    only the rows a resumed merge has still to render are checked.
+    """
+    from validation import ValidationReport, default_validator
+
+    fmt = fmt or detect_format(source)
+    validator = validator or default_validator()
+    mapper = ColumnMapper(field_names or input_fields(), mapping)
+    layers = RecordLayers(defaults, global_details)
+    fields = set(mapper.field_names)
+    if checkpoint:
+        rows = iter_rows(source, fmt, checkpoint["offset"], checkpoint["row"], checkpoint.get("header"))
+    else:
+        rows = iter_rows(source, fmt)
+    next(rows, None)  # Header
+    report = ValidationReport()
+    records, sources = [], []
+    for row in rows:
+        if row.error:
+            continue
+        if template_column:
+            row.data.pop(template_column, None)
+        records.append(layers.merge(mapper.map_row(row.data)))
+        sources.append(f"{source}:{row.number}")
+        if len(records) >= chunk_size:
+            validator.validate(records, sources, report, fields)
+            records, sources = [], []
+    if records:
+        validator.validate(records, sources, report, fields)
+    return report
+
+
+def run_merge(source, out_dir, template_path='template.docx', defaults=None, global_details=None,
+              mapping=None, fmt=None, write_json=True, workers=1, engine=DEFAULT_ENGINE,
+              name_column=None, checkpoint_path=None, resume=True, checkpoint_every=CHECKPOINT_EVERY,
+              progress=None, field_names=None, cache=None, template_column=None, registry=None):
+    """
+    Render one form per source row into out_dir and return a MergeStats.
+    progress, if given, is called with (row, result) as rows finish, in source order.
+    template_column names the column holding each row's template, looked up
+    by name in registry (the default registry if not given).
+    """
+    fmt = fmt or detect_format(source)
+    checkpoint_path = checkpoint_path or os.path.join(out_dir, CHECKPOINT_NAME)
+    os.makedirs(out_dir, exist_ok=True)
+
+    checkpoint = read_checkpoint(checkpoint_path, source) if resume else None
+    if checkpoint:
+        offset, number, header = checkpoint["offset"], checkpoint["row"], checkpoint.get("header")
+        stats = MergeStats(checkpoint.get("rendered", 0), checkpoint.get("failed", 0))
+        print(f"Resuming {source} after row {number}")
+    else:
+        offset, number, header = 0, 0, None
+        stats = MergeStats()
+
+    mapper = ColumnMapper(field_names or input_fields(), mapping)
+    layers = RecordLayers(defaults, global_details)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    rows = iter_rows(source, fmt, offset, number, header)
+    header = next(rows, None)
+    state = {"offset": offset, "row": number, "since_checkpoint": 0}
+    if registry is None:
+        registry = default_registry()
+
+    def row_template(row):
+        # Absolute path of the row's template, or None for the default one
+        name = _cell(row.data.pop(template_column, "")).strip() if template_column else ""
+        if not name:
+            return None
+        if not registry.has(name):
+            row.error = f"Unknown template: {name}"
+            return None
+        return os.path.abspath(registry.resolve(name))
+
+    def jobs():
+        for row in rows:
+            if not row.error:
+                output_path = os.path.join(out_dir, output_name(row, stem, name_column))
+                row_template_path = row_template(row)
+            if row.error:
+                yield row, None, None, None
+            else:
+                yield row, layers.merge(mapper.map_row(row.data)), output_path, row_template_path
+
+    def save_checkpoint():
+        atomic_write_json(checkpoint_path, {
+            "source": os.path.abspath(source), "format": fmt, "header": header,
+            "offset": state["offset"], "row": state["row"],
+            "rendered": stats.rendered, "failed": stats.failed,
+        })
+        state["since_checkpoint"] = 0
+
+    def finished(row, result):
+        stats.add(result)
+        state["offset"], state["row"] = row.offset, row.number
+        state["since_checkpoint"] += 1
+        if progress:
+            progress(row, result)
+        if state["since_checkpoint"] >= checkpoint_every:
+            save_checkpoint()
+
+    template = load_engine(template_path, engine)
+    completed = False
+    try:
+        if workers <= 1:
+            for row, form_data, output_path, row_template_path in jobs():
+                if form_data is None:
+                    result = JobResult(f"{source}:{row.number}", error=row.error)
+                else:
+                    row_engine = template if row_template_path is None else registry.get(row_template_path, engine)
+                    result = render_form(form_data, output_path, row_engine, write_json, f"{source}:{row.number}",
+                                         cache)
+                finished(row, result)
+        else:
+            _merge_parallel(jobs(), template, write_json, workers, source, finished, cache)
+        completed = True
+    finally:
+        if completed:
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+        elif state["since_checkpoint"]:
+            # Interrupted: remember how far we got
+            save_checkpoint()
+
+    stats.unmapped = sorted(mapper.unmapped)
+    return stats
+
+
+def _merge_parallel(jobs, template, write_json, workers, source, finished, cache=None):
+    """
+    Render jobs on a process pool with a bounded number in flight, so memory
+    stays flat; results are handed to finished() in source order
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from render import _init_worker, _render_form_in_worker
+
+    in_flight = collections.deque()
+    window = workers * 4
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(template, cache, instrumentation.settings(),
+                                       allowed_photo_dirs())) as executor:
+        for row, form_data, output_path, template_path in jobs:
+            if form_data is None:
+                future = None
+            else:
+                future = executor.submit(_render_form_in_worker, form_data, output_path, write_json,
+                                         f"{source}:{row.number}", template_path)
+            in_flight.append((row, future))
+            while len(in_flight) >= window:
+                _finish_next(in_flight, source, finished)
+        while in_flight:
+            _finish_next(in_flight, source, finished)
+
+
+def _finish_next(in_flight, source, finished):
+    row, future = in_flight.popleft()
+    if future is None:
+        result = JobResult(f"{source}:{row.number}", error=row.error)
+    else:
+        try:
+            result = future.result()
+        except Exception as e:
+            result = JobResult(f"{source}:{row.number}", error=f"worker pool failed: {e}")
+    finished(row, result)
+
+
+def load_json_file(path, default=None):
+    if not path or not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def run_merge_command(args, template_path):
+    """
+    Entry point for `main.py merge`; returns a process exit code
+    """
+    field_names = input_fields(field_configs_for_template(template_path))
+    if args.template_column:
+        registry = default_registry()
+        if not registry.names():
+            print("--template-column needs a directory of templates; pass --templates DIR")
+            return 1
+        # Columns may fill fields of any of the templates
+        for name in registry.names():
+            field_names += input_fields(field_configs_for_template(registry.resolve(name)))
+        field_names = list(dict.fromkeys(field_names))
+
+    global_details = None
+    if os.path.exists(args.global_details):
+        # Only read here: the GUI owns global.json and its repairs
+        global_details = GlobalDetailsStore(args.global_details).load(read_only=True)
+    defaults = load_json_file(args.defaults, {})
+    mapping = load_json_file(args.map)
+
+    if not args.no_validate:
+        from validation import finish_validation
+        # Rows before the checkpoint were checked (and rendered) by the earlier run
+        checkpoint = None if args.restart else read_checkpoint(os.path.join(args.out, CHECKPOINT_NAME), args.source)
+        report = validate_merge(args.source, defaults, global_details, mapping, args.format, field_names,
+                                args.template_column, checkpoint=checkpoint)
+        if not finish_validation(report, args.validation_report):
+            return 1
+
+    start = time.perf_counter()
+    workers = args.workers if args.workers > 0 else default_worker_count()
+    stats = run_merge(args.source, args.out, template_path,
+                      defaults=defaults, global_details=global_details,
+                      mapping=mapping, fmt=args.format, write_json=not args.no_json,
+                      workers=workers, engine=args.engine, name_column=args.name_column,
+                      resume=not args.restart, checkpoint_every=args.checkpoint_every,
+                      progress=print_merge_result, cache=cache_from_args(args),
+                      field_names=field_names, template_column=args.template_column)
+    if stats.unmapped:
+        print(f"Ignored columns that match no form field: {', '.join(stats.unmapped)}")
+    print(stats.summary(time.perf_counter() - start))
+    return 0 if not stats.failed else 1
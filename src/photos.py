@@ -0,0 +1,302 @@
+"""
+Inspection photos embedded in the generated DOCX.
+
+The "Inspection photos" field holds one or more image paths separated by
+semicolons. Phone photos are 12 MP and several MB each, so before they go
+into a document every photo is decoded, turned upright according to its
+EXIF orientation, scaled down to fit MAX_DIMENSION pixels and re-saved as a
+JPEG at JPEG_QUALITY. Photos are processed in a thread pool (Pillow releases
+the GIL while decoding, resizing and encoding), and each one is cached in
+.form12_cache/photos/ keyed by the SHA-256 of the original file and the
+processing settings, so re-rendering a form or a batch that shares photos
+only hashes them.
+
+The photos are added at the end of the document under an "Inspection
+photos" heading, each with its file name as a caption. Forms with photos
+always render through python-docx (the zip engine hands them over), since
+the pictures need new parts in the package.
+
+A form's photo paths are files the renderer will read and put into the
+document, so they are only followed from trusted places: the GUI (whose
+user picks them) allows any path, the batch commands only paths inside a
+directory given with --photo-dir, and the HTTP server none at all. Until
+allow_photos() is called no photos are allowed.
+
+Pillow is only needed when a form has photos.
+"""
+
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+
+from instrumentation import count, phase
+from rendercache import RenderCache
+
+PHOTOS_FIELD = "Inspection photos"
+PHOTO_SEPARATOR = ";"
+CACHE_DIR = os.path.join('.form12_cache', 'photos')
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Longest side of an embedded photo in pixels (about 250 dpi at the 16 cm it is shown across the page)
+MAX_DIMENSION = 1600
+JPEG_QUALITY = 82
+# Bump when processing changes so cached photos are redone
+PROCESS_VERSION = 1
+# Largest size a photo is shown at on the page, in EMU (English Metric Units)
+PAGE_WIDTH_EMU = 5760720  # 16 cm
+PAGE_HEIGHT_EMU = 7920990  # 22 cm
+# A pixel at its natural size (96 dpi); small photos are never shown larger than this
+EMU_PER_PIXEL = 9525
+
+
+def photo_paths(form_data):
+    """
+    The photo paths listed in a form's Inspection photos field
+    """
+    value = form_data.get(PHOTOS_FIELD) or ""
+    return [path.strip() for path in value.replace("\n", PHOTO_SEPARATOR).split(PHOTO_SEPARATOR) if path.strip()]
+
+
+# Real paths of the directories photos may come from; None allows any path
+_allowed_dirs = ()
+
+
+def allow_photos(directories):
+    """
+    Let forms embed photos from inside directories (None: from anywhere)
+    """
+    global _allowed_dirs
+    _allowed_dirs = None if directories is None else tuple(os.path.realpath(d) for d in directories)
+
+
+def allowed_photo_dirs():
+    """
+    The current allow_photos() setting, to hand to worker processes
+    """
+    return _allowed_dirs
+
+
+def checked_photo_paths(form_data):
+    """
+    photo_paths, raising ValueError if any is outside the allowed directories;
+    call this before a path from a form is opened
+    """
+    paths = photo_paths(form_data)
+    if paths and _allowed_dirs is not None:
+        if not _allowed_dirs:
+            raise ValueError(f"{PHOTOS_FIELD} are not accepted here; allow a photo directory with --photo-dir")
+        for path in paths:
+            real = os.path.realpath(path)
+            if not any(real == d or real.startswith(d.rstrip(os.sep) + os.sep) for d in _allowed_dirs):
+                raise ValueError(f"Inspection photo {path} is outside the allowed photo directories")
+    return paths
+
+
+def photo_key(data, max_dimension=MAX_DIMENSION, quality=JPEG_QUALITY):
+    digest = hashlib.sha256(f"{PROCESS_VERSION}\0{max_dimension}\0{quality}\0".encode('utf-8'))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class PhotoCache(RenderCache):
+    """
+    Processed photos on disk, keyed by photo_key; evicted like the render cache
+    """
+
+    extension = '.jpg'
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, **kwargs):
+        super().__init__(cache_dir, max_bytes, **kwargs)
+        # Photos are looked up and stored from several pool threads at once
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        path = self.path_for(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            self.stats["hits"] += 1
+        return data
+
+    def put(self, key, data):
+        path = self.path_for(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # The cache is only an optimisation; never fail a render over it
+            print(f"Could not add a photo to the photo cache: {e}", file=sys.stderr)
+            return
+        with self._lock:
+            if self._size is None or self._size + len(data) > self.max_bytes:
+                self.evict()
+            else:
+                self._size += len(data)
+
+    def report(self):
+        entries = self.entries()
+        return (f"Photo cache: {self.stats['hits']} hits, {self.stats['misses']} misses, "
+                f"{self.stats['evictions']} evicted; {len(entries)} photos, "
+                f"{sum(entry[1] for entry in entries) / 2 ** 20:.1f} MiB in {self.cache_dir}")
+
+
+_shared_cache = None
+
+
+def shared_photo_cache():
+    """
+    The PhotoCache every render in this process uses, so its lookups and
+    size accounting carry over from one render to the next
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = PhotoCache()
+    return _shared_cache
+
+
+class PhotoResult:
+    """
+    One photo ready to embed, and what processing it cost and saved
+    """
+
+    def __init__(self, source, data=None, original_size=0, size=None, elapsed=0.0, cached=False, error=None):
+        self.source = source
+        self.data = data
+        self.original_size = original_size
+        # (width, height) in pixels after processing
+        self.size = size
+        self.elapsed = elapsed
+        self.cached = cached
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def bytes_saved(self):
+        # A small photo can grow a little when re-encoded; that isn't a saving
+        return max(0, self.original_size - len(self.data)) if self.data is not None else 0
+
+    def describe(self):
+        if not self.ok:
+            return f"{self.source}: FAILED: {self.error}"
+        how = "from cache" if self.cached else f"{self.size[0]}x{self.size[1]}"
+        return (f"{self.source}: {self.original_size / 1024:.0f} KB -> {len(self.data) / 1024:.0f} KB "
+                f"(saved {self.bytes_saved / 1024:.0f} KB, {how}) in {self.elapsed * 1000:.1f} ms")
+
+
+def process_photo(data, max_dimension=MAX_DIMENSION, quality=JPEG_QUALITY):
+    """
+    Upright, scaled-down JPEG bytes and their (width, height) for an image file's bytes
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG decoders can scale by 1/2, 1/4 or 1/8 while decoding, far cheaper than resizing afterwards
+        image.draft('RGB', (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=quality, optimize=True)
+        return output.getvalue(), image.size
+
+
+def image_size(data):
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        return image.size
+
+
+def prepare_photo(path, cache=None, max_dimension=MAX_DIMENSION, quality=JPEG_QUALITY):
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            original = f.read()
+        key = photo_key(original, max_dimension, quality)
+        data = cache.get(key) if cache is not None else None
+        if data is not None:
+            return PhotoResult(path, data, len(original), image_size(data), time.perf_counter() - start, True)
+        data, size = process_photo(original, max_dimension, quality)
+        if cache is not None:
+            cache.put(key, data)
+        return PhotoResult(path, data, len(original), size, time.perf_counter() - start)
+    except Exception as e:
+        return PhotoResult(path, elapsed=time.perf_counter() - start, error=str(e))
+
+
+def prepare_photos(paths, cache=None, workers=None, max_dimension=MAX_DIMENSION, quality=JPEG_QUALITY):
+    """
+    Process photos in a thread pool; PhotoResults come back in the order of paths
+    """
+    if not paths:
+        return []
+    workers = min(len(paths), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [prepare_photo(path, cache, max_dimension, quality) for path in paths]
+    from concurrent.futures import ThreadPoolExecutor  # Slow to import; not needed to start the GUI
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='photo') as executor:
+        return list(executor.map(lambda path: prepare_photo(path, cache, max_dimension, quality), paths))
+
+
+def add_photos(doc, paths, cache=None):
+    """
+    Append the photos to a python-docx Document; a photo that can't be read
+    fails the render, so a certificate never goes out missing one
+    """
+    from docx.shared import Emu
+
+    with phase("photos"):
+        results = prepare_photos(paths, cache if cache is not None else shared_photo_cache())
+    failed = [result for result in results if not result.ok]
+    if failed:
+        raise ValueError("Could not embed inspection photos: " + "; ".join(r.describe() for r in failed))
+    count("photos", len(results))
+    count("photo_bytes_saved", sum(result.bytes_saved for result in results))
+
+    with phase("embed_photos"):
+        heading = doc.add_paragraph()
+        heading.paragraph_format.page_break_before = True
+        heading.add_run(PHOTOS_FIELD).bold = True
+        for result in results:
+            width, height = result.size
+            scale = min(EMU_PER_PIXEL, PAGE_WIDTH_EMU / width, PAGE_HEIGHT_EMU / height)
+            doc.add_paragraph().add_run().add_picture(io.BytesIO(result.data), width=Emu(int(width * scale)),
+                                                      height=Emu(int(height * scale)))
+            doc.add_paragraph(os.path.basename(result.source))
+    return results
+
+
+def run_photos_command(args):
+    """
+    Entry point for `main.py photos`: process photos into the cache and
+    report each one; returns a process exit code
+    """
+    cache = PhotoCache()
+    start = time.perf_counter()
+    results = prepare_photos(args.photos, cache, args.workers or None, args.max_dimension, args.quality)
+    for result in results:
+        print(result.describe())
+    processed = [result for result in results if result.ok]
+    original = sum(result.original_size for result in processed)
+    saved = sum(result.bytes_saved for result in processed)
+    print(f"{len(processed)} of {len(results)} photos in {time.perf_counter() - start:.2f} s: "
+          f"{original / 2 ** 20:.1f} MiB -> {(original - saved) / 2 ** 20:.1f} MiB "
+          f"(saved {saved / 2 ** 20:.1f} MiB)")
+    print(cache.report())
+    return 0 if len(processed) == len(results) else 1
@@ -0,0 +1,349 @@
+"""
+Headless DOCX rendering for inspection forms.
+
+Fills the <<field>> placeholders of a template without touching tkinter so
+saved form JSON files can be rendered in bulk from the command line.
+
+python-docx (via the template module) is only imported when something is
+actually rendered, so importing this module keeps the GUI's startup fast.
+"""
+
+import glob
+import json
+import os
+import time
+
+import instrumentation
+from instrumentation import measure, phase
+
+# "docx" renders through python-docx; "zip" patches document.xml inside the template zip
+ENGINES = ('docx', 'zip')
+DEFAULT_ENGINE = 'docx'
+
+
+def fill_document(doc, form_data):
+    """
+    Replace placeholders in a python-docx Document with form data.
+    Blank values leave their placeholder in place, except the signature date
+    which is always replaced. Each paragraph is resolved in a single pass and
+    only the runs holding a placeholder are rewritten, so formatting is kept.
+    CompiledTemplate.fill does the same using a precomputed placeholder index.
+    """
+    from template import fill_paragraph, iter_form_paragraphs, slot_for_paragraph
+
+    for paragraph, location, signature in iter_form_paragraphs(doc):
+        slot = slot_for_paragraph(paragraph, signature=signature)
+        if slot:
+            fill_paragraph(paragraph._p, slot, form_data)
+    return doc
+
+
+def load_form_data(json_path):
+    """
+    Load a saved form JSON file, normalising values to strings
+    """
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+    return normalise_form_data(data, json_path)
+
+
+def normalise_form_data(data, source):
+    """
+    Check decoded form JSON is an object and make every value a string
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"Form data must be a JSON object: {source}")
+    return {str(k): "" if v is None else str(v) for k, v in data.items()}
+
+
+def write_form_json(form_data, docx_path):
+    """
+    Write the JSON file that accompanies a generated DOCX (same name, .json)
+    """
+    json_output_path = os.path.splitext(docx_path)[0] + ".json"
+    if not isinstance(form_data, dict):
+        form_data = dict(form_data)  # e.g. a FormRecord
+    text = json.dumps(form_data, indent=2)
+    try:
+        with open(json_output_path, 'r') as f:
+            if f.read() == text:
+                return json_output_path  # Already up to date; don't touch the file
+    except (OSError, UnicodeDecodeError):
+        pass
+    with open(json_output_path, 'w') as f:
+        f.write(text)
+    return json_output_path
+
+
+def load_engine(template_path='template.docx', engine=DEFAULT_ENGINE):
+    """
+    Return a ready-to-render template for the chosen engine; both expose render(form_data, output)
+    """
+    from templateregistry import default_registry
+    return default_registry().get(template_path, engine)
+
+
+def render_docx(form_data, output_path, template_path='template.docx', engine=DEFAULT_ENGINE):
+    """
+    Render form data into a new DOCX based on the template
+    """
+    return load_engine(template_path, engine).render(form_data, output_path)
+
+
+def expand_batch_paths(patterns):
+    """
+    Expand glob patterns (for shells that don't) into a sorted, de-duplicated list
+    """
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+class JobResult:
+    """
+    Outcome of rendering a single form JSON file
+    """
+
+    def __init__(self, source, output=None, elapsed=0.0, error=None, cached=None):
+        self.source = source
+        self.output = output
+        self.elapsed = elapsed
+        self.error = error
+        # True if the DOCX came from the render cache, False if rendered, None without a cache
+        self.cached = cached
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def output_paths_for(json_paths, out_dir):
+    """
+    Name each DOCX after its source JSON file inside out_dir, numbering repeats (12.docx, 12-2.docx) so forms
+    with the same name from different directories don't overwrite each other
+    """
+    paths = []
+    taken = set()
+    for json_path in json_paths:
+        stem = os.path.splitext(os.path.basename(json_path))[0]
+        name, n = stem, 1
+        # Compared ignoring case, since Windows and macOS file names do
+        while name.lower() in taken:
+            n += 1
+            name = f"{stem}-{n}"
+        taken.add(name.lower())
+        paths.append(os.path.join(out_dir, f"{name}.docx"))
+    return paths
+
+
+def render_with_cache(template, form_data, output_path, cache=None):
+    """
+    Render through the render cache if one is given; returns the JobResult.cached value
+    """
+    if cache is None:
+        template.render(form_data, output_path)
+        return None
+    return cache.render(template, form_data, output_path)
+
+
+def render_job(json_path, output_path, template, write_json=True, cache=None):
+    """
+    Render one saved form JSON file to output_path with a loaded engine,
+    capturing timing and any error
+    """
+    start = time.perf_counter()
+    try:
+        with measure("render", output_path, source=json_path, engine=template.engine):
+            with phase("read_json"):
+                form_data = load_form_data(json_path)
+            cached = render_with_cache(template, form_data, output_path, cache)
+            if write_json:
+                with phase("write_json"):
+                    write_form_json(form_data, output_path)
+    except Exception as e:
+        return JobResult(json_path, elapsed=time.perf_counter() - start, error=str(e))
+    return JobResult(json_path, output_path, time.perf_counter() - start, cached=cached)
+
+
+def render_form(form_data, output_path, template, write_json=True, source=None, cache=None):
+    """
+    Render form data that is already in memory (e.g. a mail-merge row) with a loaded engine
+    """
+    start = time.perf_counter()
+    try:
+        with measure("render", output_path, source=source, engine=template.engine):
+            cached = render_with_cache(template, form_data, output_path, cache)
+            if write_json:
+                with phase("write_json"):
+                    write_form_json(form_data, output_path)
+    except Exception as e:
+        return JobResult(source, elapsed=time.perf_counter() - start, error=str(e))
+    return JobResult(source, output_path, time.perf_counter() - start, cached=cached)
+
+
+def render_batch(json_paths, out_dir, template_path='template.docx', write_json=True, progress=None,
+                 engine=DEFAULT_ENGINE, cache=None):
+    """
+    Render many saved form JSON files into out_dir.
+    progress, if given, is called with (index, total, result) after each job.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    template = load_engine(template_path, engine)
+    results = []
+    total = len(json_paths)
+    output_paths = output_paths_for(json_paths, out_dir)
+    for index, (json_path, output_path) in enumerate(zip(json_paths, output_paths), 1):
+        result = render_job(json_path, output_path, template, write_json, cache)
+        results.append(result)
+        if progress:
+            progress(index, total, result)
+    return results
+
+
+# Compiled template (and render cache) installed in each pool worker by _init_worker
+_worker_template = None
+_worker_cache = None
+
+
+def _init_worker(template, cache=None, timings=None, photo_dirs=()):
+    global _worker_template, _worker_cache
+    _worker_template = template
+    _worker_cache = cache
+    if timings is not None:
+        instrumentation.configure(**timings)
+    from photos import allow_photos
+    allow_photos(photo_dirs)
+
+
+def _render_in_worker(json_path, output_path, write_json):
+    return render_job(json_path, output_path, _worker_template, write_json, _worker_cache)
+
+
+def _render_form_in_worker(form_data, output_path, write_json, source, template_path=None):
+    template = _worker_template
+    if template_path is not None:
+        # Another template: compiled once per worker process by its own registry
+        from templateregistry import default_registry
+        template = default_registry().get(template_path, template.engine)
+    return render_form(form_data, output_path, template, write_json, source, _worker_cache)
+
+
+def default_worker_count():
+    return os.cpu_count() or 1
+
+
+def render_batch_parallel(json_paths, out_dir, template_path='template.docx', write_json=True,
+                          progress=None, workers=None, chunksize=None, engine=DEFAULT_ENGINE, cache=None):
+    """
+    Render many saved form JSON files across a pool of worker processes.
+    The compiled template is sent to each worker once when the pool starts.
+    Results come back in the same order as json_paths, and a failing job only
+    marks that job as failed.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or default_worker_count()
+    if workers <= 1 or len(json_paths) <= 1:
+        return render_batch(json_paths, out_dir, template_path, write_json, progress, engine, cache)
+
+    os.makedirs(out_dir, exist_ok=True)
+    template = load_engine(template_path, engine)
+    total = len(json_paths)
+    if chunksize is None:
+        # A few chunks per worker keeps the pool busy without per-job IPC overhead
+        chunksize = max(1, min(32, total // (workers * 4)))
+
+    results = []
+    from photos import allowed_photo_dirs
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(template, cache, instrumentation.settings(),
+                                       allowed_photo_dirs())) as executor:
+        outcomes = executor.map(_render_in_worker, json_paths, output_paths_for(json_paths, out_dir),
+                                [write_json] * total, chunksize=chunksize)
+        try:
+            for result in outcomes:
+                results.append(result)
+                if progress:
+                    progress(len(results), total, result)
+        except Exception as e:
+            # The pool itself broke (e.g. a worker was killed); report the rest as failed
+            for json_path in json_paths[len(results):]:
+                result = JobResult(json_path, error=f"worker pool failed: {e}")
+                results.append(result)
+                if progress:
+                    progress(len(results), total, result)
+    return results
+
+
+def print_job_result(index, total, result):
+    """
+    Print a one-line report for a finished job
+    """
+    width = len(str(total))
+    prefix = f"[{index:>{width}}/{total}]"
+    if result.ok:
+        cached = " (cached)" if result.cached else ""
+        print(f"{prefix} {result.source} -> {result.output}{cached} ({result.elapsed * 1000:.1f} ms)")
+    else:
+        print(f"{prefix} {result.source} FAILED: {result.error}")
+
+
+def format_summary(results, wall_time):
+    """
+    Build the throughput summary printed at the end of a batch
+    """
+    succeeded = [r for r in results if r.ok]
+    failed = len(results) - len(succeeded)
+    lines = [f"Rendered {len(succeeded)} of {len(results)} forms ({failed} failed) in {wall_time:.2f} s"]
+    if succeeded:
+        times = [r.elapsed for r in succeeded]
+        throughput = len(succeeded) / wall_time if wall_time > 0 else float('inf')
+        lines.append(
+            f"Per form: mean {sum(times) / len(times) * 1000:.1f} ms, "
+            f"min {min(times) * 1000:.1f} ms, max {max(times) * 1000:.1f} ms"
+        )
+        lines.append(f"Throughput: {throughput:.1f} forms/s")
+    looked_up = [r for r in succeeded if r.cached is not None]
+    if looked_up:
+        hits = sum(1 for r in looked_up if r.cached)
+        lines.append(f"Render cache: {hits} hits, {len(looked_up) - hits} misses")
+    return "\n".join(lines)
+
+
+def cache_from_args(args):
+    """
+    The render cache for --cache: hits are hardlinked into the output directory
+    """
+    if not getattr(args, 'cache', False):
+        return None
+    from rendercache import RenderCache
+    return RenderCache(link=True)
+
+
+def run_render_command(args, template_path):
+    """
+    Entry point for `main.py render`; returns a process exit code
+    """
+    json_paths = expand_batch_paths(args.batch)
+    if not json_paths:
+        print("No form JSON files matched --batch")
+        return 1
+    if not args.no_validate:
+        from validation import finish_validation, template_fields, validate_files
+        report = validate_files(json_paths, template_fields(template_path))
+        if not finish_validation(report, args.validation_report):
+            return 1
+
+    start = time.perf_counter()
+    workers = args.workers if args.workers > 0 else default_worker_count()
+    results = render_batch_parallel(json_paths, args.out, template_path, write_json=not args.no_json,
+                                    progress=print_job_result, workers=workers, engine=args.engine,
+                                    cache=cache_from_args(args))
+    print(format_summary(results, time.perf_counter() - start))
+    return 0 if all(r.ok for r in results) else 1
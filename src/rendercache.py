@@ -0,0 +1,222 @@
+"""
+Content-addressed cache of rendered DOCX files.
+
+A rendered document is fully determined by the template's content hash, the
+engine and the values of the template's fields, so that is the cache key:
+
+    sha256(template hash, engine, canonical JSON of the template's fields)
+
+Rendering is deterministic (fixed zip timestamps and member order), so a cache
+hit is byte-for-byte the document a fresh render would produce and can simply
+be hardlinked or copied into place. Entries are evicted once they are older
+than max_age or the cache grows past max_bytes, least recently used first.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from instrumentation import phase
+
+CACHE_DIR = os.path.join('.form12_cache', 'renders')
+MAX_BYTES = 512 * 1024 * 1024
+MAX_AGE = 30 * 24 * 3600
+
+
+def form_key(template, form_data):
+    """
+    Cache key for rendering form_data with a loaded engine. Fields the template
+    doesn't use can't change the output, so they are left out of the key.
+    Inspection photos count by their contents, not their paths.
+    """
+    from photos import checked_photo_paths, photo_key
+
+    fields = {name: form_data[name] for name in template.fields if name in form_data}
+    canonical = json.dumps(fields, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    digest = hashlib.sha256()
+    digest.update(f"{template.hash}\0{template.engine}\0".encode('utf-8'))
+    digest.update(canonical.encode('utf-8'))
+    for path in checked_photo_paths(form_data):
+        with open(path, 'rb') as f:
+            digest.update(f"\0{os.path.basename(path)}\0{photo_key(f.read())}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    Rendered DOCX files on disk, keyed by form_key. With link=True hits are
+    hardlinked into place (falling back to a copy across filesystems), so the
+    output shares storage with the cache and shouldn't be edited in place.
+    """
+
+    extension = '.docx'
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES, max_age=MAX_AGE, link=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.link = link
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes_reused": 0}
+        self._size = None  # Total bytes in the cache, scanned on first store
+
+    def __getstate__(self):
+        # Sent to worker processes: configuration only, each process keeps its own counts
+        state = dict(self.__dict__)
+        state["_size"] = None
+        return state
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}{self.extension}")
+
+    def _place(self, source, destination):
+        """
+        Put a copy of source at destination, replacing whatever is there
+        """
+        directory = os.path.dirname(os.path.abspath(destination))
+        tmp_path = os.path.join(directory, f".{os.path.basename(destination)}.{os.getpid()}.tmp")
+        if self.link:
+            try:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                os.link(source, tmp_path)
+                os.replace(tmp_path, destination)
+                return
+            except OSError:
+                pass  # Different filesystem, or links not supported: copy instead
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, destination)
+
+    def fetch(self, key, output_path):
+        """
+        Materialise a cached render at output_path; returns False on a miss
+        """
+        path = self.path_for(key)
+        try:
+            if os.path.abspath(path) != os.path.abspath(output_path):
+                self._place(path, output_path)
+            # Mark as recently used for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        self.stats["hits"] += 1
+        self.stats["bytes_reused"] += os.path.getsize(output_path)
+        return True
+
+    def store(self, key, rendered_path):
+        """
+        Add a freshly rendered file to the cache
+        """
+        path = self.path_for(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._place(rendered_path, path)
+        except OSError as e:
+            # The cache is only an optimisation; never fail a render over it
+            print(f"Could not add {rendered_path} to the render cache: {e}")
+            return
+        if self._size is None:
+            self.evict()
+        else:
+            self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def render(self, template, form_data, output_path):
+        """
+        Render with a loaded engine unless an identical document is cached.
+        Returns True on a cache hit. Streams are always rendered.
+        """
+        if hasattr(output_path, 'write'):
+            template.render(form_data, output_path)
+            return False
+        with phase("cache_lookup"):
+            key = form_key(template, form_data)
+            if self.fetch(key, output_path):
+                return True
+        self.stats["misses"] += 1
+        # Render to a new file rather than over output_path, which may be a
+        # hardlink to another cache entry from an earlier hit
+        directory = os.path.dirname(os.path.abspath(output_path))
+        tmp_path = os.path.join(directory, f".{os.path.basename(output_path)}.{os.getpid()}.render.tmp")
+        try:
+            template.render(form_data, tmp_path)
+            with phase("cache_store"):
+                self.store(key, tmp_path)
+                os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return False
+
+    def entries(self):
+        """
+        (mtime, size, path) of every cached file
+        """
+        found = []
+        if not os.path.isdir(self.cache_dir):
+            return found
+        for directory, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith(self.extension):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, stat.st_size, path))
+        return found
+
+    def evict(self, now=None):
+        """
+        Remove entries older than max_age, then the least recently used until
+        the cache fits in max_bytes; returns the number removed
+        """
+        now = time.time() if now is None else now
+        entries = sorted(self.entries())
+        size = sum(entry[1] for entry in entries)
+        removed = 0
+        for mtime, entry_size, path in entries:
+            if now - mtime <= self.max_age and size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+            removed += 1
+        self._size = size
+        self.stats["evictions"] += removed
+        return removed
+
+    def clear(self):
+        removed = len(self.entries())
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self._size = 0
+        return removed
+
+    def report(self):
+        """
+        One-line hit/miss summary for this process plus the cache's current size
+        """
+        lookups = self.stats["hits"] + self.stats["misses"]
+        rate = self.stats["hits"] / lookups * 100 if lookups else 0.0
+        entries = self.entries()
+        return (f"Render cache: {self.stats['hits']} hits, {self.stats['misses']} misses ({rate:.0f}% hit rate), "
+                f"{self.stats['evictions']} evicted; {len(entries)} entries, "
+                f"{sum(entry[1] for entry in entries) / 2 ** 20:.1f} MiB in {self.cache_dir}")
+
+
+def run_cache_command(args):
+    """
+    Entry point for `main.py cache`; returns a process exit code
+    """
+    cache = RenderCache()
+    if args.clear:
+        print(f"Removed {cache.clear()} cached renders")
+    elif args.evict:
+        print(f"Evicted {cache.evict()} cached renders")
+    print(cache.report())
+    return 0
@@ -0,0 +1,387 @@
+"""
+Local HTTP render service.
+
+Other systems POST form JSON to /render and get the DOCX back, rendered from a
+template that is loaded once when the server starts and kept in memory.
+Requests wait in a bounded queue served by a fixed number of workers; when
+the queue is full the server answers 429 straight away instead of letting work
+pile up. GET /metrics reports latency percentiles, queue depth and request
+counts, and GET /health is a liveness check.
+
+Started with --templates DIR, a request can pick one of the directory's
+templates with ?template=NAME (GET /templates lists them); each is compiled
+once, when first used or at startup, and kept by the template registry.
+Only names from the directory are accepted, never paths.
+
+Only the standard library is used: asyncio for connections, and a thread or
+process pool for the rendering itself.
+
+    POST /render[?name=file.docx][&template=NAME]   body: form JSON object   -> DOCX
+    GET  /templates                                          -> JSON
+    GET  /metrics                                            -> JSON
+    GET  /health                                             -> "ok"
+"""
+
+import asyncio
+import collections
+import io
+import json
+import math
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import instrumentation
+from photos import PHOTOS_FIELD, photo_paths
+from render import _init_worker, load_engine, normalise_form_data
+from templateregistry import default_registry
+
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+DEFAULT_PORT = 8012
+DEFAULT_QUEUE_SIZE = 16
+MAX_BODY_BYTES = 1024 * 1024
+MAX_HEADER_BYTES = 64 * 1024
+# Latencies kept for the percentiles in /metrics
+LATENCY_WINDOW = 1024
+# Bytes written per chunk when streaming a document back
+WRITE_CHUNK = 64 * 1024
+DEFAULT_ATTACHMENT_NAME = 'form12.docx'
+# What ?name= may contain; it goes into a response header
+SAFE_NAME = re.compile(r'[\w.-]+', re.ASCII)
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 429: 'Too Many Requests', 500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def attachment_name(name):
+    """
+    File name for Content-Disposition: a plain basename of safe characters, or the default
+    """
+    name = name.replace('\\', '/').rsplit('/', 1)[-1]
+    if not SAFE_NAME.fullmatch(name) or name.strip('.') == '':
+        return DEFAULT_ATTACHMENT_NAME
+    return name
+
+
+def render_to_bytes(template, form_data):
+    buffer = io.BytesIO()
+    with instrumentation.measure("render", engine=getattr(template, 'engine', None)):
+        template.render(form_data, buffer)
+    return buffer.getvalue()
+
+
+def _render_in_process(form_data, template_path=None):
+    # Runs in a pool process set up by render._init_worker; other templates
+    # are compiled once per process by that process's own registry
+    import render
+    template = render._worker_template
+    if template_path is not None:
+        from templateregistry import default_registry
+        template = default_registry().get(template_path, template.engine)
+    return render_to_bytes(template, form_data)
+
+
+def _render_in_thread(registry, template_path, engine, form_data):
+    return render_to_bytes(registry.get(template_path, engine), form_data)
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), math.ceil(fraction * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+class ServerMetrics:
+    """
+    Request counters and a sliding window of render latencies
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.by_status = collections.Counter()
+        self.rejected = 0
+        self.in_flight = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.queue_waits = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self, queue_depth, queue_size, workers):
+        latencies = sorted(self.latencies)
+        waits = sorted(self.queue_waits)
+
+        def millis(values):
+            return {name: None if value is None else round(value * 1000, 2)
+                    for name, value in (("p50", percentile(values, 0.50)), ("p90", percentile(values, 0.90)),
+                                        ("p99", percentile(values, 0.99)), ("max", values[-1] if values else None))}
+
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "responses": {str(status): count for status, count in sorted(self.by_status.items())},
+            "rejected": self.rejected,
+            "queue_depth": queue_depth,
+            "queue_size": queue_size,
+            "in_flight": self.in_flight,
+            "workers": workers,
+            "render_latency_ms": millis(latencies),
+            "queue_wait_ms": millis(waits),
+            "latency_samples": len(latencies),
+        }
+
+
+class RenderServer:
+    """
+    asyncio HTTP server rendering forms from one warm template, or any of a
+    template registry's directory when one is given
+    """
+
+    def __init__(self, template, host='127.0.0.1', port=DEFAULT_PORT, workers=2,
+                 queue_size=DEFAULT_QUEUE_SIZE, processes=False, max_body=MAX_BODY_BYTES, registry=None):
+        self.template = template
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.processes = processes
+        self.max_body = max_body
+        self.metrics = ServerMetrics()
+        self._queue = None
+        self._executor = None
+        self._worker_tasks = []
+        self._server = None
+
+    async def start(self):
+        """
+        Start listening; returns the bound port (useful with port 0)
+        """
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.processes:
+            # Each process gets the compiled template once, when it starts
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(self.template, None, instrumentation.settings()))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='render')
+        self._worker_tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    # Rendering
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            form_data, template_path, future, queued_at = await self._queue.get()
+            try:
+                self.metrics.queue_waits.append(time.perf_counter() - queued_at)
+                self.metrics.in_flight += 1
+                try:
+                    if self.processes:
+                        data = await loop.run_in_executor(self._executor, _render_in_process,
+                                                          form_data, template_path)
+                    elif template_path is not None:
+                        data = await loop.run_in_executor(self._executor, _render_in_thread, self.registry,
+                                                          template_path, self.template.engine, form_data)
+                    else:
+                        data = await loop.run_in_executor(self._executor, render_to_bytes,
+                                                          self.template, form_data)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(data)
+                finally:
+                    self.metrics.in_flight -= 1
+            finally:
+                self._queue.task_done()
+
+    async def render(self, form_data, template_name=None):
+        """
+        Queue a render and wait for the DOCX bytes; raises HttpError(429) when
+        the queue is full and HttpError(404) for a template the registry doesn't have
+        """
+        template_path = None
+        if template_name is not None:
+            if self.registry is None or not self.registry.has(template_name):
+                raise HttpError(404, f"No such template: {template_name}")
+            template_path = os.path.abspath(self.registry.resolve(template_name))
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((form_data, template_path, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.metrics.rejected += 1
+            raise HttpError(429, f"Render queue is full ({self.queue_size} waiting); try again shortly")
+        return await future
+
+    # HTTP
+
+    async def _handle(self, reader, writer):
+        status = 500
+        try:
+            try:
+                method, target, headers = await self._read_head(reader)
+                self.metrics.requests += 1
+                status = await self._dispatch(method, target, headers, reader, writer)
+            except HttpError as e:
+                status = e.status
+                await self._respond(writer, e.status, json.dumps({"error": str(e)}).encode('utf-8'),
+                                    'application/json', {'Retry-After': '1'} if e.status == 429 else None)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            except Exception as e:
+                status = 500
+                await self._respond(writer, 500, json.dumps({"error": f"Render failed: {e}"}).encode('utf-8'),
+                                    'application/json')
+            self.metrics.by_status[status] += 1
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_head(self, reader):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "Request headers too large")
+        if len(head) > MAX_HEADER_BYTES:
+            raise HttpError(413, "Request headers too large")
+        lines = head.decode('iso-8859-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        return method.upper(), target, headers
+
+    async def _dispatch(self, method, target, headers, reader, writer):
+        url = urlsplit(target)
+        if url.path == '/render':
+            if method != 'POST':
+                raise HttpError(405, "Use POST to render a form")
+            query = parse_qs(url.query)
+            form_data = await self._read_form(reader, headers)
+            start = time.perf_counter()
+            data = await self.render(form_data, query.get('template', [None])[0])
+            self.metrics.latencies.append(time.perf_counter() - start)
+            name = attachment_name(query.get('name', [''])[0])
+            await self._respond(writer, 200, data, DOCX_CONTENT_TYPE,
+                                {'Content-Disposition': f'attachment; filename="{name}"'})
+            return 200
+        if url.path == '/metrics' and method == 'GET':
+            snapshot = self.metrics.snapshot(self._queue.qsize(), self.queue_size, self.workers)
+            recorder = instrumentation.recorder()
+            if recorder is not None:
+                # Per-phase histograms (renders in worker processes only reach the timings file)
+                snapshot["timings"] = recorder.snapshot()
+            if self.registry is not None and not self.processes:
+                snapshot["templates"] = dict(self.registry.stats, loaded=len(self.registry))
+            await self._respond(writer, 200, json.dumps(snapshot, indent=2).encode('utf-8'), 'application/json')
+            return 200
+        if url.path == '/templates' and method == 'GET':
+            names = self.registry.names() if self.registry is not None else []
+            await self._respond(writer, 200, json.dumps({"templates": names}).encode('utf-8'), 'application/json')
+            return 200
+        if url.path == '/health' and method == 'GET':
+            await self._respond(writer, 200, b'ok\n', 'text/plain')
+            return 200
+        raise HttpError(404, f"No such endpoint: {url.path}")
+
+    async def _read_form(self, reader, headers):
+        try:
+            length = int(headers.get('content-length', ''))
+        except ValueError:
+            raise HttpError(400, "Content-Length is required")
+        if length > self.max_body:
+            raise HttpError(413, f"Form JSON is larger than {self.max_body} bytes")
+        body = await reader.readexactly(length)
+        try:
+            form_data = normalise_form_data(json.loads(body), "request body")
+        except ValueError as e:
+            raise HttpError(400, f"Invalid form JSON: {e}")
+        if photo_paths(form_data):
+            # They would be paths on this machine, read and sent back to whoever asked
+            raise HttpError(400, f"{PHOTOS_FIELD} can't be sent to the render server")
+        return form_data
+
+    async def _respond(self, writer, status, body, content_type, extra_headers=None):
+        headers = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                   f"Content-Type: {content_type}",
+                   f"Content-Length: {len(body)}",
+                   "Connection: close"]
+        headers.extend(f"{name}: {value}" for name, value in (extra_headers or {}).items())
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode('iso-8859-1'))
+        # Stream the body in chunks so a large document doesn't sit in the socket buffer at once
+        for start in range(0, len(body), WRITE_CHUNK):
+            writer.write(body[start:start + WRITE_CHUNK])
+            await writer.drain()
+        await writer.drain()
+
+
+async def serve(template, host, port, workers, queue_size, processes, registry=None):
+    server = RenderServer(template, host, port, workers, queue_size, processes, registry=registry)
+    await server.start()
+    mode = "processes" if processes else "threads"
+    print(f"Serving {template.path} on http://{server.host}:{server.port} "
+          f"({server.workers} {mode}, queue of {server.queue_size})")
+    if registry is not None:
+        print(f"Templates from {registry.directory}: {', '.join(registry.names()) or 'none'}")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def run_server_command(args, template_path):
+    """
+    Entry point for `main.py serve`; returns a process exit code
+    """
+    template = load_engine(template_path, args.engine)
+    registry = default_registry()
+    if registry.directory:
+        # Compile the directory up front so the first request for each template isn't slow
+        registry.preload((args.engine,))
+    else:
+        registry = None
+    port = DEFAULT_PORT if args.port is None else args.port
+    queue_size = DEFAULT_QUEUE_SIZE if args.queue_size is None else args.queue_size
+    try:
+        asyncio.run(serve(template, args.host, port, args.workers, queue_size, args.processes, registry))
+    except KeyboardInterrupt:
+        print("Server stopped")
+    return 0
@@ -0,0 +1,436 @@
+"""
+Compiled DOCX templates.
+
+A template is scanned once for <<field>> placeholders and the location of every
+paragraph holding one is recorded, down to the runs each placeholder spans.
+Rendering then jumps straight to those paragraphs and rewrites only the affected
+runs, so the template's formatting survives. Compiled indexes are cached on
+disk keyed by the template's hash; compiled templates are held in memory by
+templateregistry.
+
+Rendered documents are saved with fixed zip timestamps, so the same template
+and form data always produce the same bytes.
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import zipfile
+
+from docx import Document
+from docx.opc.pkgwriter import PackageWriter
+from docx.text.paragraph import Paragraph
+from docx.text.run import Run
+
+from instrumentation import count, phase
+from photos import add_photos, checked_photo_paths
+
+PLACEHOLDER_PATTERN = re.compile(r"<<(.+?)>>")
+SIGNATURE_DATE_PLACEHOLDER = "<<Date (signature)>>"
+# Table 9 (0-indexed as 8) is the signature table
+SIGNATURE_TABLE_INDEX = 8
+
+CACHE_DIR = os.path.join('.form12_cache', 'templates')
+# Bump when the on-disk index layout changes so stale caches are ignored
+INDEX_VERSION = 2
+
+# Modification time written on every member of a rendered DOCX (the zip epoch)
+ZIP_TIMESTAMP = (1980, 1, 1, 0, 0, 0)
+
+
+def file_hash(path):
+    """
+    SHA-256 of a file's contents
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _element_path(element, root):
+    """
+    Child indices leading from root down to element
+    """
+    path = []
+    while element is not root:
+        parent = element.getparent()
+        path.append(parent.index(element))
+        element = parent
+    path.reverse()
+    return path
+
+
+def _run_span(run_texts, start, end):
+    """
+    Convert paragraph character offsets into (start_run, start_offset, end_run, end_offset).
+    The end position is exclusive. Returns None if the offsets fall outside the runs.
+    """
+    span = []
+    position = 0
+    for run_index, text in enumerate(run_texts):
+        run_end = position + len(text)
+        if not span and position <= start < run_end:
+            span.extend([run_index, start - position])
+        if span and position < end <= run_end:
+            span.extend([run_index, end - position])
+            return span
+        position = run_end
+    return None
+
+
+def apply_run_replacements(run_texts, edits):
+    """
+    Splice replacement values into a paragraph's run texts in a single pass.
+    edits is a list of ((start_run, start_offset, end_run, end_offset), value) in
+    paragraph order. The value lands in the run where its placeholder starts and
+    the rest of the placeholder is trimmed from the following runs; runs that end
+    up holding nothing but placeholder text come back as None so they can be dropped.
+    """
+    texts = list(run_texts)
+    # Work backwards so earlier offsets stay valid
+    for (start_run, start_offset, end_run, end_offset), value in reversed(edits):
+        if start_run == end_run:
+            text = texts[start_run]
+            texts[start_run] = text[:start_offset] + value + text[end_offset:]
+            continue
+        tail = texts[end_run][end_offset:]
+        texts[start_run] = texts[start_run][:start_offset] + value
+        for index in range(start_run + 1, end_run):
+            texts[index] = None
+        texts[end_run] = tail if tail else None
+    return texts
+
+
+class PlaceholderSlot:
+    """
+    A paragraph in the template that contains one or more placeholders
+    """
+
+    def __init__(self, path, location, placeholders, signature=False, run_texts=None):
+        self.path = path                  # child indices from <w:body> to the <w:p>
+        self.location = location          # {"paragraph": i} or {"table", "row", "cell", "paragraph"}
+        self.placeholders = placeholders  # [{"field", "start", "end", "runs"}] in paragraph order
+        self.signature = signature        # paragraph lives in the signature table
+        self.run_texts = run_texts        # text of each <w:r> in the template paragraph
+        self.fields = list(dict.fromkeys(p["field"] for p in placeholders))
+
+    def resolve(self, body):
+        """
+        Find this slot's <w:p> element in a freshly loaded document body
+        """
+        element = body
+        for index in self.path:
+            element = element[index]
+        return element
+
+    def run_edits(self, form_data):
+        """
+        The (run span, value) edits needed for this paragraph, or None when the
+        placeholders can't be mapped onto runs (e.g. they sit inside a hyperlink).
+        Non-blank values replace their placeholder; the signature date is always
+        replaced, even when blank, so the placeholder never reaches the output.
+        """
+        if self.run_texts is None:
+            return None
+        edits = []
+        for placeholder in self.placeholders:
+            if placeholder["runs"] is None:
+                return None
+            field_name = placeholder["field"]
+            value = form_data.get(field_name, "")
+            if value.strip() or (self.signature and field_name == "Date (signature)"):
+                edits.append((placeholder["runs"], value))
+        return edits
+
+    def replace_text(self, text, form_data):
+        """
+        Apply the placeholder rules to this paragraph's whole text. Used when
+        run_edits can't be, at the cost of collapsing the paragraph into one run.
+        """
+        for field_name in self.fields:
+            value = form_data.get(field_name, "")
+            if value.strip():
+                text = text.replace(f"<<{field_name}>>", value)
+        if self.signature and SIGNATURE_DATE_PLACEHOLDER in text:
+            text = form_data.get("Date (signature)", "")
+        return text
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "location": self.location,
+            "placeholders": self.placeholders,
+            "signature": self.signature,
+            "run_texts": self.run_texts,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["path"], data["location"], data["placeholders"], data.get("signature", False),
+                   data.get("run_texts"))
+
+
+def fill_paragraph(p, slot, form_data):
+    """
+    Fill the placeholders of one <w:p> element described by slot.
+    Only runs whose text changes are rewritten; the paragraph text is never re-read.
+    Returns the number of placeholders replaced.
+    """
+    edits = slot.run_edits(form_data)
+    if edits is None:
+        paragraph = Paragraph(p, None)
+        text = paragraph.text
+        new_text = slot.replace_text(text, form_data)
+        if new_text != text:
+            paragraph.text = new_text
+            return len(slot.placeholders)
+        return 0
+    if not edits:
+        return 0
+    new_texts = apply_run_replacements(slot.run_texts, edits)
+    for r, old_text, new_text in zip(p.r_lst, slot.run_texts, new_texts):
+        if new_text is None:
+            p.remove(r)
+        elif new_text != old_text:
+            Run(r, None).text = new_text
+    return len(edits)
+
+
+def slot_for_paragraph(paragraph, body=None, location=None, signature=False):
+    """
+    Build a slot for a paragraph if it contains any placeholders.
+    The element path is only recorded when body is given.
+    """
+    text = paragraph.text
+    if "<<" not in text:
+        return None
+    run_texts = [run.text for run in paragraph.runs]
+    # Hyperlink text is part of the paragraph but not of its runs, so offsets wouldn't line up
+    runs_cover_text = "".join(run_texts) == text
+    placeholders = []
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        placeholders.append({
+            "field": match.group(1),
+            "start": match.start(),
+            "end": match.end(),
+            "runs": _run_span(run_texts, match.start(), match.end()) if runs_cover_text else None,
+        })
+    if not placeholders:
+        return None
+    path = _element_path(paragraph._p, body) if body is not None else None
+    return PlaceholderSlot(path, location, placeholders, signature, run_texts if runs_cover_text else None)
+
+
+def iter_form_paragraphs(doc):
+    """
+    Yield (paragraph, location, in_signature_table) for every body paragraph and
+    every paragraph of the top-level table cells, visiting merged cells once
+    """
+    for paragraph_idx, paragraph in enumerate(doc.paragraphs):
+        yield paragraph, {"paragraph": paragraph_idx}, False
+
+    for table_idx, table in enumerate(doc.tables):
+        for row_idx, row in enumerate(table.rows):
+            seen_cells = set()
+            for cell_idx, cell in enumerate(row.cells):
+                # Merged cells are returned once per grid column they span
+                if id(cell._tc) in seen_cells:
+                    continue
+                seen_cells.add(id(cell._tc))
+                for paragraph_idx, paragraph in enumerate(cell.paragraphs):
+                    location = {"table": table_idx, "row": row_idx, "cell": cell_idx, "paragraph": paragraph_idx}
+                    yield paragraph, location, table_idx == SIGNATURE_TABLE_INDEX
+
+
+def scan_document(doc):
+    """
+    Index every placeholder in the body paragraphs and top-level table cells of a document
+    """
+    body = doc.element.body
+    slots = []
+    for paragraph, location, signature in iter_form_paragraphs(doc):
+        slot = slot_for_paragraph(paragraph, body, location, signature)
+        if slot:
+            slots.append(slot)
+    return slots
+
+
+class _StableZipWriter:
+    """
+    python-docx's zip package writer, but with a fixed timestamp on every member
+    instead of the current time
+    """
+
+    def __init__(self, pkg_file):
+        self._zipf = zipfile.ZipFile(pkg_file, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def write(self, pack_uri, blob):
+        info = zipfile.ZipInfo(pack_uri.membername, date_time=ZIP_TIMESTAMP)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o600 << 16  # What ZipFile.writestr gives a plain name
+        self._zipf.writestr(info, blob)
+
+    def close(self):
+        self._zipf.close()
+
+
+def save_document(doc, output_path):
+    """
+    Save a python-docx Document like Document.save, with deterministic output:
+    parts are written in package order and every member gets ZIP_TIMESTAMP
+    """
+    package = doc.part.package
+    parts = list(package.iter_parts())
+    for part in parts:
+        part.before_marshal()
+    start = output_path.tell() if hasattr(output_path, 'write') else 0
+    writer = _StableZipWriter(output_path)
+    try:
+        PackageWriter._write_content_types_stream(writer, parts)
+        PackageWriter._write_pkg_rels(writer, package.rels)
+        PackageWriter._write_parts(writer, parts)
+    finally:
+        writer.close()
+    end = output_path.tell() if hasattr(output_path, 'write') else os.path.getsize(output_path)
+    count("bytes_written", end - start)
+    return output_path
+
+
+class CompiledTemplate:
+    """
+    A template held in memory together with its placeholder index
+    """
+
+    engine = 'docx'
+
+    def __init__(self, path, content_hash, data, slots):
+        self.path = path
+        self.hash = content_hash
+        self.data = data
+        self.slots = slots
+        self.fields = list(dict.fromkeys(f for slot in slots for f in slot.fields))
+        # Slots split the way the form is laid out, so each part can be timed separately
+        self.slot_groups = [
+            ("fill_paragraphs", [slot for slot in slots if "table" not in slot.location]),
+            ("fill_tables", [slot for slot in slots if "table" in slot.location and not slot.signature]),
+            ("fill_signature", [slot for slot in slots if slot.signature]),
+        ]
+
+    @classmethod
+    def compile(cls, path, data=None, content_hash=None):
+        """
+        Parse a template and build its placeholder index
+        """
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        if content_hash is None:
+            content_hash = hashlib.sha256(data).hexdigest()
+        slots = scan_document(Document(io.BytesIO(data)))
+        return cls(path, content_hash, data, slots)
+
+    def document(self):
+        """
+        A fresh python-docx Document loaded from the in-memory template
+        """
+        return Document(io.BytesIO(self.data))
+
+    def fill(self, doc, form_data):
+        """
+        Replace placeholders in a document loaded from this template.
+        Only indexed paragraphs are visited; the result is the same as
+        render.fill_document, which scans the whole document.
+        """
+        body = doc.element.body
+        replaced = 0
+        for name, slots in self.slot_groups:
+            with phase(name):
+                for slot in slots:
+                    replaced += fill_paragraph(slot.resolve(body), slot, form_data)
+        count("paragraphs_scanned", len(self.slots))
+        count("placeholders_replaced", replaced)
+        return doc
+
+    def render(self, form_data, output_path):
+        """
+        Render form data to output_path (a file path or writable stream)
+        """
+        with phase("load_template"):
+            doc = self.document()
+        self.fill(doc, form_data)
+        paths = checked_photo_paths(form_data)
+        if paths:
+            add_photos(doc, paths)
+        with phase("save"):
+            save_document(doc, output_path)
+        return output_path
+
+    def index_to_dict(self):
+        return {
+            "version": INDEX_VERSION,
+            "hash": self.hash,
+            "slots": [slot.to_dict() for slot in self.slots],
+        }
+
+
+def _read_index_cache(cache_dir, content_hash):
+    cache_path = os.path.join(cache_dir, f"{content_hash}.json")
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r') as f:
+            index = json.load(f)
+        if index.get("version") != INDEX_VERSION or index.get("hash") != content_hash:
+            return None
+        return [PlaceholderSlot.from_dict(slot) for slot in index["slots"]]
+    except Exception as e:
+        print(f"Ignoring unreadable template cache {cache_path}: {e}", file=sys.stderr)
+        return None
+
+
+def _write_index_cache(cache_dir, template):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = os.path.join(cache_dir, f"{template.hash}.json")
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(template.index_to_dict(), f)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        print(f"Could not write template cache: {e}", file=sys.stderr)
+
+
+def compile_template(path, data, content_hash, cache_dir=CACHE_DIR):
+    """
+    Compile a template already read into memory, using the disk index cache
+    in cache_dir when it has this hash (cache_dir=None skips it)
+    """
+    slots = _read_index_cache(cache_dir, content_hash) if cache_dir else None
+    if slots is not None:
+        return CompiledTemplate(path, content_hash, data, slots)
+    template = CompiledTemplate.compile(path, data, content_hash)
+    if cache_dir:
+        _write_index_cache(cache_dir, template)
+    return template
+
+
+def load_template(path, cache_dir=CACHE_DIR):
+    """
+    Return the compiled template for path, using the memory and disk caches.
+    Pass cache_dir=None to skip the disk cache.
+    """
+    from templateregistry import default_registry
+    return default_registry().compiled(path, cache_dir)
+
+
+def clear_template_cache():
+    """
+    Forget all compiled templates held in memory
+    """
+    from templateregistry import default_registry
+    default_registry().clear()
@@ -0,0 +1,207 @@
+"""
+Registry of parsed, ready-to-render templates.
+
+Every template is compiled once and kept in memory by content hash, with
+each render engine built on it alongside, so a batch mixing templates never
+parses the same one twice. Looking a template up only stats the file: it is
+re-read when its mtime or size changes, and recompiled only if its
+contents (SHA-256) actually differ. At most max_templates are held; the
+least recently used is dropped first.
+
+A registry can be given a directory of templates (main.py --templates DIR).
+Templates in it can then be picked by name ("form12" or "form12.docx") per
+job, listed with names() and compiled ahead of time with preload().
+
+render.load_engine() and template.load_template() use the process-wide
+default_registry(); worker processes each have their own.
+"""
+
+import collections
+import hashlib
+import os
+import threading
+
+from render import ENGINES
+
+# Compiled templates kept in memory at once
+MAX_TEMPLATES = 16
+TEMPLATE_EXTENSION = '.docx'
+# Stands in for template.CACHE_DIR, so python-docx is only imported once something is compiled
+DEFAULT_CACHE_DIR = object()
+
+_default = None
+_default_lock = threading.Lock()
+
+
+class _Entry:
+    """
+    One compiled template and the engines built from it
+    """
+
+    __slots__ = ('compiled', 'engines')
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.engines = {'docx': compiled}
+
+
+class TemplateRegistry:
+    """
+    Compiled templates by content hash, looked up by path or by name in directory
+    """
+
+    def __init__(self, directory=None, max_templates=MAX_TEMPLATES, cache_dir=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        self.max_templates = max(1, max_templates)
+        self.cache_dir = cache_dir
+        self.stats = {"hits": 0, "loads": 0, "reloads": 0, "evictions": 0}
+        # Content hash -> _Entry, least recently used first
+        self._entries = collections.OrderedDict()
+        # Absolute path -> (mtime_ns, size, content hash) when last read
+        self._paths = {}
+        # Held while compiling, so concurrent jobs wait for one parse instead of each doing their own
+        self._lock = threading.RLock()
+
+    # Names
+
+    def names(self):
+        """
+        Templates in the directory, by name
+        """
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        return sorted(os.path.splitext(entry.name)[0] for entry in os.scandir(self.directory)
+                      if entry.is_file() and entry.name.lower().endswith(TEMPLATE_EXTENSION)
+                      and not entry.name.startswith('~$'))  # Word's lock files
+
+    def resolve(self, template):
+        """
+        Path of a template given by name (looked up in the directory) or by path
+        """
+        if self.directory and os.path.basename(template) == template:
+            file_name = template if template.lower().endswith(TEMPLATE_EXTENSION) else template + TEMPLATE_EXTENSION
+            candidate = os.path.join(self.directory, file_name)
+            if os.path.exists(candidate):
+                return candidate
+        return template
+
+    def has(self, name):
+        """
+        Whether name is one of the directory's templates (not an arbitrary path)
+        """
+        return os.path.splitext(name)[0] in self.names() if os.path.basename(name) == name else False
+
+    # Lookup
+
+    def get(self, template='template.docx', engine='docx'):
+        """
+        The ready-to-render engine for a template name or path
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown render engine: {engine}")
+        path = os.path.abspath(self.resolve(template))
+        with self._lock:
+            entry = self._entry(path, self.cache_dir)
+            rendered = entry.engines.get(engine)
+            if rendered is None:
+                from fastdocx import ZipTemplate
+                rendered = entry.engines[engine] = ZipTemplate(entry.compiled)
+            return rendered
+
+    def compiled(self, template, cache_dir):
+        """
+        The compiled template, compiling it with the disk index cache in
+        cache_dir if it isn't in memory (None skips the disk cache)
+        """
+        path = os.path.abspath(self.resolve(template))
+        with self._lock:
+            return self._entry(path, cache_dir).compiled
+
+    def _entry(self, path, cache_dir):
+        stat = os.stat(path)
+        known = self._paths.get(path)
+        if known and known[:2] == (stat.st_mtime_ns, stat.st_size) and known[2] in self._entries:
+            self._entries.move_to_end(known[2])
+            self.stats["hits"] += 1
+            return self._entries[known[2]]
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        content_hash = hashlib.sha256(data).hexdigest()
+        self._paths[path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+        entry = self._entries.get(content_hash)
+        if entry is not None:
+            # Touched or copied, but the same contents
+            self._entries.move_to_end(content_hash)
+            self.stats["hits"] += 1
+            return entry
+
+        if known and known[2] != content_hash:
+            self.stats["reloads"] += 1
+            self._forget(known[2])
+        self.stats["loads"] += 1
+        from template import CACHE_DIR, compile_template
+        if cache_dir is DEFAULT_CACHE_DIR:
+            cache_dir = CACHE_DIR
+        entry = self._entries[content_hash] = _Entry(compile_template(path, data, content_hash, cache_dir))
+        while len(self._entries) > self.max_templates:
+            evicted, _ = self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+            self._paths = {p: k for p, k in self._paths.items() if k[2] != evicted}
+        return entry
+
+    def _forget(self, content_hash):
+        # Drop an edited template's old version, unless another path still has those contents
+        if not any(known[2] == content_hash for known in self._paths.values()):
+            self._entries.pop(content_hash, None)
+
+    def preload(self, engines=('docx',), progress=None):
+        """
+        Compile the directory's templates (up to max_templates) ahead of the
+        first job; returns the number loaded. A template that fails to load is
+        reported and skipped.
+        """
+        loaded = 0
+        for name in self.names()[:self.max_templates]:
+            try:
+                for engine in engines:
+                    self.get(name, engine)
+                loaded += 1
+                if progress:
+                    progress(name)
+            except Exception as e:
+                print(f"Could not load template {name}: {e}")
+        return loaded
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def report(self):
+        return ("Templates: {loaded} in memory, {hits} lookups served from memory, {loads} compiled, "
+                "{reloads} reloaded after a change, {evictions} evicted").format(loaded=len(self), **self.stats)
+
+
+def default_registry():
+    """
+    The process-wide registry used by render.load_engine and template.load_template
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = TemplateRegistry()
+        return _default
+
+
+def configure(directory=None, max_templates=MAX_TEMPLATES):
+    """
+    Point the default registry at a template directory (main.py --templates)
+    """
+    registry = default_registry()
+    registry.directory = directory
+    registry.max_templates = max(1, max_templates)
+    return registry
@@ -0,0 +1,231 @@
+"""
+Form fields derived from a template's <<field>> placeholders.
+
+The GUI's field list used to be FORM_FIELD_CONFIGS only, so a template
+passed with --template whose placeholders differ simply had fields that
+never matched. scan_template() reads word/document.xml in document order
+and records every placeholder with the numbered heading it falls under and
+a text/textarea guess from its table cell: a tall row or a cell holding
+several paragraphs is a textarea.
+
+field_configs_for_template() turns the scan into FORM_FIELD_CONFIGS-style
+tuples. Fields FORM_FIELD_CONFIGS already knows keep their configured type
+and header titles, and GUI-only fields (the manual signature notice) are
+kept next to their neighbours; anything else comes from the scan. It warns
+about placeholders FORM_FIELD_CONFIGS doesn't know and known fields the
+template has no placeholder for.
+
+Scans are cached in .form12_cache/schemas/ keyed by the template's SHA-256,
+so later starts only hash the file. Only the standard library is used, so
+the GUI can build its form before python-docx has been imported.
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+
+from formfields import FORM_FIELD_CONFIGS
+
+CACHE_DIR = os.path.join('.form12_cache', 'schemas')
+# Bump when the cached scan layout changes so stale caches are ignored
+SCHEMA_VERSION = 1
+PLACEHOLDER_PATTERN = re.compile(r"<<(.+?)>>")
+# Numbered section headings, e.g. "2. Property description"
+SECTION_PATTERN = re.compile(r"^(\d+)\.\s")
+# Rows at least this tall (twentieths of a point; 1080 is three quarters of an inch) are for long answers
+TEXTAREA_MIN_HEIGHT = 1080
+# Field types the GUI shows that have no placeholder of their own (photos go at the end of the document)
+GUI_ONLY_TYPES = ("disabled_text", "photos")
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class TemplateSchema:
+    """
+    The form fields of one template, and what didn't line up with FORM_FIELD_CONFIGS
+    """
+
+    def __init__(self, content_hash, field_configs, unknown_placeholders, missing_fields):
+        self.hash = content_hash
+        self.field_configs = field_configs
+        # Placeholders FORM_FIELD_CONFIGS has no field for, and known fields with no placeholder
+        self.unknown_placeholders = unknown_placeholders
+        self.missing_fields = missing_fields
+
+    def warnings(self):
+        messages = []
+        if self.unknown_placeholders:
+            messages.append("Template placeholders with no known form field (shown as plain fields): "
+                            + ", ".join(self.unknown_placeholders))
+        if self.missing_fields:
+            messages.append("Form fields with no placeholder in the template (left out of the form): "
+                            + ", ".join(self.missing_fields))
+        return messages
+
+
+def _paragraph_text(p):
+    return "".join(t.text or "" for t in p.iter(f"{W}t"))
+
+
+def _paragraph_style(p):
+    style = p.find(f"{W}pPr/{W}pStyle")
+    return style.get(f"{W}val", "") if style is not None else ""
+
+
+def scan_document_xml(xml):
+    """
+    Placeholders in document order: a list of {"field", "section", "type"},
+    where section is the title of the numbered heading above (or None)
+    """
+    from xml.etree import ElementTree
+
+    body = ElementTree.fromstring(xml).find(f"{W}body")
+    section = None
+    found = []
+    seen = set()
+
+    def add(text, field_type):
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            field = match.group(1)
+            if field not in seen:
+                seen.add(field)
+                found.append({"field": field, "section": section, "type": field_type})
+
+    for element in body:
+        if element.tag == f"{W}p":
+            text = _paragraph_text(element)
+            if _paragraph_style(element).lower().startswith("heading") and SECTION_PATTERN.match(text.strip()):
+                section = text.strip()
+            add(text, "text")
+        elif element.tag == f"{W}tbl":
+            for row in element.findall(f"{W}tr"):
+                height = row.find(f"{W}trPr/{W}trHeight")
+                tall = height is not None and int(height.get(f"{W}val", "0")) >= TEXTAREA_MIN_HEIGHT
+                for cell in row.findall(f"{W}tc"):
+                    paragraphs = cell.findall(f"{W}p")
+                    field_type = "textarea" if tall or len(paragraphs) > 1 else "text"
+                    for p in paragraphs:
+                        add(_paragraph_text(p), field_type)
+    return found
+
+
+def scan_template(path, cache_dir=CACHE_DIR):
+    """
+    (content hash, placeholder scan) for a template, from the disk cache when possible
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{content_hash}.json") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached.get("version") == SCHEMA_VERSION and cached.get("hash") == content_hash:
+                return content_hash, cached["placeholders"]
+        except Exception as e:
+            print(f"Ignoring unreadable template schema cache {cache_path}: {e}", file=sys.stderr)
+
+    import zipfile  # Slow to import; only needed when the scan isn't cached
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        placeholders = scan_document_xml(archive.read("word/document.xml"))
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"version": SCHEMA_VERSION, "hash": content_hash, "placeholders": placeholders}, f)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            print(f"Could not write template schema cache: {e}", file=sys.stderr)
+    return content_hash, placeholders
+
+
+def build_field_configs(placeholders, known_configs=FORM_FIELD_CONFIGS):
+    """
+    (field configs, unknown placeholders, missing fields) for a placeholder
+    scan, keeping what known_configs says about the fields it knows
+    """
+    known_types = {config[0]: config[1] for config in known_configs if config[1] != "header"}
+    known_headers = [config for config in known_configs if config[1] == "header"]
+    placeholder_names = {entry["field"] for entry in placeholders}
+
+    # GUI-only fields go in front of the next known field the template has
+    gui_only_before = {}
+    waiting = []
+    for config in known_configs:
+        if config[1] in GUI_ONLY_TYPES:
+            waiting.append(config)
+        elif config[1] != "header" and config[0] in placeholder_names and waiting:
+            gui_only_before[config[0]] = waiting
+            waiting = []
+
+    configs = []
+    section = None
+    for entry in placeholders:
+        if entry["section"] != section:
+            section = entry["section"]
+            if section is not None:
+                configs.append(_header_config(section, known_headers))
+        configs.extend(gui_only_before.get(entry["field"], ()))
+        configs.append((entry["field"], known_types.get(entry["field"], entry["type"])))
+
+    unknown = [entry["field"] for entry in placeholders if entry["field"] not in known_types]
+    missing = [name for name, field_type in known_types.items()
+               if name not in placeholder_names and field_type not in GUI_ONLY_TYPES]
+    return configs, unknown, missing
+
+
+def _header_config(title, known_headers):
+    for config in known_headers:
+        # Known titles may add to the template's wording, e.g. "(Manual Signature Required)"
+        if config[2].startswith(title):
+            return config
+    return (f"header{SECTION_PATTERN.match(title).group(1)}", "header", title)
+
+
+def load_template_schema(path, cache_dir=CACHE_DIR, known_configs=FORM_FIELD_CONFIGS):
+    content_hash, placeholders = scan_template(path, cache_dir)
+    configs, unknown, missing = build_field_configs(placeholders, known_configs)
+    return TemplateSchema(content_hash, configs, unknown, missing)
+
+
+def field_configs_for_template(path, cache_dir=CACHE_DIR, known_configs=FORM_FIELD_CONFIGS):
+    """
+    Field configs for the GUI: derived from the template, printing any
+    mismatches; FORM_FIELD_CONFIGS if the template can't be read or has no placeholders
+    """
+    try:
+        schema = load_template_schema(path, cache_dir, known_configs)
+    except Exception as e:
+        print(f"Could not read the fields of template {path}: {e}")
+        return list(known_configs)
+    for message in schema.warnings():
+        print(f"Warning ({path}): {message}")
+    if not schema.field_configs:
+        return list(known_configs)
+    return schema.field_configs
+
+
+def run_schema_command(args, template_path):
+    """
+    Entry point for `main.py schema`; returns a process exit code (1 if the
+    template and the known fields don't line up)
+    """
+    import zipfile
+    try:
+        schema = load_template_schema(template_path)
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        print(f"Could not read template {template_path}: {e}")
+        return 1
+    for config in schema.field_configs:
+        if config[1] == "header":
+            print(config[2])
+        else:
+            print(f"  {config[0]} [{config[1]}]")
+    for message in schema.warnings():
+        print(f"Warning: {message}")
+    return 1 if schema.warnings() else 0
@@ -0,0 +1,258 @@
+"""
+Checks on form values before any document work is done.
+
+A malformed postcode or a date that isn't ISO used to be found only after
+the DOCX had been generated and sent. FIELD_RULES (next to
+FORM_FIELD_CONFIGS in formfields.py) names the rules each field must pass,
+and Validator compiles them once into per-field checks.
+
+Batches are checked column by column: every record's value of one field is
+gathered into a list and each of that field's rules runs over the whole
+list in one comprehension, with its regular expression already compiled.
+That checks hundreds of thousands of values a second, so render, merge and
+bundle validate everything before rendering anything and stop if a record
+fails. The result is a ValidationReport, written as JSON with
+--validation-report:
+
+    {"version": 1, "records": 2, "invalid_records": 1,
+     "by_rule": {"postcode": 1},
+     "errors": [{"record": 1, "source": "jobs/12.json", "field": "Postcode",
+                 "rule": "postcode", "value": "447", "message": "..."}]}
+
+The GUI runs the same compiled checks on each field as it changes.
+"""
+
+import datetime
+import re
+import sys
+
+from formfields import FIELD_RULES
+
+REPORT_VERSION = 1
+# Errors printed by the command-line tools before the rest are summarised
+PRINT_LIMIT = 20
+STATES = ("QLD", "NSW", "VIC", "TAS", "SA", "WA", "NT", "ACT")
+# Spacing and punctuation people put in phone numbers
+PHONE_SEPARATORS = str.maketrans("", "", " -()")
+
+
+def _text(value):
+    return value if isinstance(value, str) else "" if value is None else str(value)
+
+
+def _required(column):
+    return [i for i, value in enumerate(column) if not value.strip()]
+
+
+def _pattern(pattern, flags=0, translate=None):
+    match = re.compile(pattern, flags).fullmatch
+    if translate is None:
+        return lambda column: [i for i, value in enumerate(column) if value and not match(value.strip())]
+    return lambda column: [i for i, value in enumerate(column) if value and not match(value.translate(translate))]
+
+
+_iso_date_shape = _pattern(r"\d{4}-\d{2}-\d{2}")
+
+
+def _iso_date(column):
+    failed = set(_iso_date_shape(column))
+    for i, value in enumerate(column):
+        if value and i not in failed:
+            try:
+                datetime.date.fromisoformat(value.strip())
+            except ValueError:  # e.g. 2025-02-30
+                failed.add(i)
+    return sorted(failed)
+
+
+# Rule name -> (check, message). A check takes a column of values and returns
+# the indices of those that fail.
+RULES = {
+    "required": (_required, "is required"),
+    "postcode": (_pattern(r"\d{4}"), "must be a 4-digit postcode"),
+    "state": (_pattern("|".join(STATES), re.IGNORECASE), "must be one of " + ", ".join(STATES)),
+    "phone": (_pattern(r"(?:0[2378]\d{8}|04\d{8}|1[38]00\d{6}|13\d{4}|\+61[2-478]\d{8})", translate=PHONE_SEPARATORS),
+              "must be a 10-digit Australian phone number, e.g. 07 4656 8330"),
+    "mobile": (_pattern(r"(?:04\d{8}|\+614\d{8})", translate=PHONE_SEPARATORS),
+               "must be a 10-digit mobile number starting 04"),
+    "email": (_pattern(r"[^@\s]+@[^@\s]+\.[^@\s]+"), "must be an email address"),
+    "iso_date": (_iso_date, "must be a date written YYYY-MM-DD"),
+}
+
+
+class ValidationReport:
+    """
+    Errors found in a batch of records, in record order
+    """
+
+    def __init__(self):
+        self.records = 0
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def invalid_records(self):
+        return len({error["record"] for error in self.errors})
+
+    def to_dict(self):
+        by_rule = {}
+        for error in self.errors:
+            by_rule[error["rule"]] = by_rule.get(error["rule"], 0) + 1
+        return {"version": REPORT_VERSION, "records": self.records, "invalid_records": self.invalid_records(),
+                "by_rule": by_rule, "errors": self.errors}
+
+    def write(self, path):
+        from globalstore import atomic_write_json
+        atomic_write_json(path, self.to_dict())
+
+    def summary(self):
+        if self.ok:
+            return f"Validated {self.records} forms: no problems found"
+        return (f"Validated {self.records} forms: {len(self.errors)} problems in "
+                f"{self.invalid_records()} forms")
+
+    def print_errors(self, limit=PRINT_LIMIT, file=None):
+        for error in self.errors[:limit]:
+            where = error["source"] if error["source"] is not None else f"record {error['record']}"
+            if error["field"] is None:
+                print(f"{where}: {error['message']}", file=file)
+            else:
+                print(f"{where}: {error['field']} {error['message']} (got {error['value']!r})", file=file)
+        if len(self.errors) > limit:
+            print(f"... and {len(self.errors) - limit} more", file=file)
+
+
+class Validator:
+    """
+    FIELD_RULES compiled into per-field checks
+    """
+
+    def __init__(self, field_rules=FIELD_RULES):
+        unknown = sorted({rule for rules in field_rules.values() for rule in rules} - set(RULES))
+        if unknown:
+            raise ValueError(f"Unknown validation rules: {', '.join(unknown)}")
+        # Field -> [(rule name, check, message)]
+        self.checks = {field: [(rule, *RULES[rule]) for rule in rules] for field, rules in field_rules.items()}
+
+    def check(self, field_name, value):
+        """
+        Messages for one field's value (empty if it is fine); the GUI calls this on every change
+        """
+        return [message for _, check, message in self.checks.get(field_name, ()) if check([_text(value)])]
+
+    def check_form(self, form_data, fields=None):
+        """
+        First message for each failing field of one form, limited to fields if given
+        """
+        problems = {}
+        for field_name in self.checks:
+            if fields is None or field_name in fields:
+                messages = self.check(field_name, form_data.get(field_name))
+                if messages:
+                    problems[field_name] = messages[0]
+        return problems
+
+    def validate(self, records, sources=None, report=None, fields=None):
+        """
+        Check a batch of form mappings column by column; adds to report (a new
+        ValidationReport if not given) and returns it. sources labels each record
+        in the report, e.g. its file name; fields limits the checks to the fields
+        a template has.
+        """
+        report = ValidationReport() if report is None else report
+        first = report.records
+        errors = []
+        for field_name, checks in self.checks.items():
+            if fields is not None and field_name not in fields:
+                continue
+            column = [_text(record.get(field_name)) for record in records]
+            for rule, check, message in checks:
+                for i in check(column):
+                    errors.append({"record": first + i, "source": sources[i] if sources is not None else None,
+                                   "field": field_name, "rule": rule, "value": column[i], "message": message})
+        errors.sort(key=lambda error: error["record"])  # Stable, so fields stay in rule order
+        report.errors.extend(errors)
+        report.records += len(records)
+        return report
+
+
+_default = None
+
+
+def default_validator():
+    """
+    The Validator for FIELD_RULES, compiled on first use
+    """
+    global _default
+    if _default is None:
+        _default = Validator()
+    return _default
+
+
+def template_fields(template_path):
+    """
+    The input fields of a template, so rules for fields it doesn't have are
+    skipped; None (check every field) if the template can't be read. Prints
+    nothing, since a bundle may be going to stdout.
+    """
+    from formfields import input_fields
+    from templateschema import load_template_schema
+    try:
+        configs = load_template_schema(template_path).field_configs
+    except Exception:
+        return None
+    return set(input_fields(configs)) if configs else None
+
+
+def validate_files(json_paths, fields=None, validator=None):
+    """
+    Load saved form JSON files and check them as one batch; a file that can't
+    be read is an error too
+    """
+    from render import load_form_data
+
+    records, sources, report = [], [], ValidationReport()
+    for json_path in json_paths:
+        try:
+            records.append(load_form_data(json_path))
+            sources.append(json_path)
+        except Exception as e:
+            # Numbered ahead of the readable files, each counting as a record of its own
+            report.errors.append({"record": report.records, "source": json_path, "field": None,
+                                  "rule": "readable", "value": None, "message": f"could not be read: {e}"})
+            report.records += 1
+    validator = validator or default_validator()
+    return validator.validate(records, sources, report, fields)
+
+
+def finish_validation(report, report_path=None, file=None):
+    """
+    Print a batch's problems and write the report if asked; returns True if
+    rendering should go ahead
+    """
+    if report_path:
+        report.write(report_path)
+    if not report.ok:
+        report.print_errors(file=file)
+        print(f"{report.summary()}; nothing was rendered (fix them, or pass --no-validate)", file=file)
+    return report.ok
+
+
+def run_validate_command(args, template_path):
+    """
+    Entry point for `main.py validate`; returns a process exit code
+    """
+    from render import expand_batch_paths
+
+    json_paths = expand_batch_paths(args.forms)
+    if not json_paths:
+        print("No form JSON files matched", file=sys.stderr)
+        return 1
+    report = validate_files(json_paths, template_fields(template_path))
+    if args.report:
+        report.write(args.report)
+    report.print_errors(limit=args.limit)
+    print(report.summary())
+    return 0 if report.ok else 1
@@ -0,0 +1,510 @@
+"""
+Watch-folder daemon: render DOCX output for form JSON files dropped into a
+directory tree.
+
+A state file in the output directory records, for every source file, the
+stat signature (mtime and size) and content hash it was last rendered from.
+A rescan only stats files; a file is read and hashed only when its signature
+has changed, and rendered only when its content has. Restarting the daemon,
+or touching a file without changing it, renders nothing.
+
+A file is treated as still being written until its size and mtime have
+stayed the same for `settle` seconds since the watcher first saw them, so
+partially copied forms are not rendered. The file's own mtime is no guide:
+cp -p, rsync -t and unzip give a half-written file its original, old mtime.
+
+Changes are picked up with inotify on Linux and by periodic rescans
+everywhere else (and as a safety net alongside inotify).
+"""
+
+import collections
+import hashlib
+import json
+import os
+import select
+import struct
+import time
+
+import instrumentation
+from globalstore import atomic_write_json
+from photos import allowed_photo_dirs
+from render import JobResult, cache_from_args, default_worker_count, load_engine, normalise_form_data, render_form
+
+STATE_NAME = '.watch-state.json'
+STATE_VERSION = 1
+# Seconds a file must be left unchanged before it is rendered
+SETTLE_SECONDS = 2.0
+# Seconds between rescans when polling
+POLL_INTERVAL = 5.0
+# Seconds between full rescans when inotify is doing the work
+FULL_RESCAN_INTERVAL = 600.0
+# Renders between state file writes during a large batch
+SAVE_EVERY = 200
+
+
+class WatchState:
+    """
+    Source file signatures and hashes, keyed by path relative to the watched directory
+    """
+
+    def __init__(self, path, template_key):
+        self.path = path
+        self.template_key = template_key
+        self.files = {}
+        self.dirty = False
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return self
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable watch state {self.path}: {e}")
+            return self
+        if state.get("version") != STATE_VERSION or state.get("template") != self.template_key:
+            # A different template (or engine) changes every output, so start over
+            print("Template changed since the last run; every form will be rendered again")
+            self.dirty = True
+            return self
+        self.files = state.get("files", {})
+        return self
+
+    def save(self):
+        if not self.dirty:
+            return
+        atomic_write_json(self.path, {"version": STATE_VERSION, "template": self.template_key,
+                                      "files": self.files}, indent=None)
+        self.dirty = False
+
+    def record(self, rel_path, signature, digest, output=None, error=None):
+        entry = {"mtime_ns": signature[0], "size": signature[1], "sha256": digest}
+        if output:
+            entry["output"] = output
+        if error:
+            entry["error"] = error
+        self.files[rel_path] = entry
+        self.dirty = True
+
+    def forget(self, rel_path):
+        if self.files.pop(rel_path, None) is not None:
+            self.dirty = True
+
+    def unchanged(self, rel_path, signature):
+        entry = self.files.get(rel_path)
+        return entry is not None and entry["mtime_ns"] == signature[0] and entry["size"] == signature[1]
+
+
+class FolderWatcher:
+    """
+    Renders new and changed form JSON under source_dir into out_dir, mirroring
+    the directory layout. out_dir may sit inside source_dir; it is never scanned.
+    """
+
+    def __init__(self, source_dir, out_dir, template, write_json=True, workers=1, cache=None,
+                 settle=SETTLE_SECONDS, state_path=None, progress=None):
+        self.source_dir = os.path.abspath(source_dir)
+        self.out_dir = os.path.abspath(out_dir)
+        self.template = template
+        self.write_json = write_json
+        self.workers = workers
+        self.cache = cache
+        self.settle = settle
+        self.progress = progress
+        os.makedirs(self.out_dir, exist_ok=True)
+        template_key = f"{template.hash}:{template.engine}"
+        self.state = WatchState(state_path or os.path.join(self.out_dir, STATE_NAME), template_key).load()
+        # rel_path -> (signature, time first seen with that signature) for files still settling
+        self._pending = {}
+
+    # Scanning
+
+    def _skip_dir(self, path, name):
+        return name.startswith('.') or name == '__pycache__' or path == self.out_dir
+
+    def walk(self):
+        """
+        (rel_path, stat) of every form JSON file under source_dir
+        """
+        stack = [self.source_dir]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not self._skip_dir(entry.path, entry.name):
+                                stack.append(entry.path)
+                        elif entry.name.lower().endswith('.json') and not entry.name.startswith('.'):
+                            yield self._rel(entry.path), entry.stat()
+                    except OSError:
+                        continue  # Vanished mid-scan
+
+    def _rel(self, path):
+        # Paths come from walking source_dir, so slicing is enough (relpath is slow at this volume)
+        rel_path = path[len(self.source_dir) + 1:]
+        return rel_path if os.sep == '/' else rel_path.replace(os.sep, '/')
+
+    def _ready(self, rel_path, stat, now):
+        """
+        True once a changed file has settled; unchanged files are never ready
+        """
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if self.state.unchanged(rel_path, signature):
+            self._pending.pop(rel_path, None)
+            return False
+        pending = self._pending.get(rel_path)
+        if pending is None or pending[0] != signature:
+            # New or still growing: start (or restart) the settle timer
+            self._pending[rel_path] = (signature, now)
+            return self.settle <= 0
+        return now - pending[1] >= self.settle
+
+    def scan(self, now=None):
+        """
+        Stat the whole tree; returns the files ready to render and forgets deleted ones
+        """
+        now = time.time() if now is None else now
+        ready = []
+        seen = set()
+        for rel_path, stat in self.walk():
+            seen.add(rel_path)
+            if self._ready(rel_path, stat, now):
+                ready.append(rel_path)
+        for rel_path in [path for path in self.state.files if path not in seen]:
+            self.state.forget(rel_path)
+        for rel_path in [path for path in self._pending if path not in seen]:
+            del self._pending[rel_path]
+        return ready
+
+    def check(self, rel_paths, now=None):
+        """
+        Like scan, but only for the given files (from change notifications)
+        """
+        now = time.time() if now is None else now
+        ready = []
+        for rel_path in rel_paths:
+            try:
+                stat = os.stat(os.path.join(self.source_dir, rel_path))
+            except OSError:
+                self.state.forget(rel_path)
+                self._pending.pop(rel_path, None)
+                continue
+            if self._ready(rel_path, stat, now):
+                ready.append(rel_path)
+        return ready
+
+    @property
+    def pending(self):
+        return set(self._pending)
+
+    # Rendering
+
+    def output_path_for(self, rel_path):
+        return os.path.join(self.out_dir, *os.path.splitext(rel_path)[0].split('/')) + '.docx'
+
+    def _jobs(self, rel_paths):
+        """
+        Read and hash each ready file; yields (rel_path, signature, digest, form_data, error)
+        for the ones whose content really changed
+        """
+        for rel_path in rel_paths:
+            path = os.path.join(self.source_dir, rel_path)
+            try:
+                stat = os.stat(path)
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                self.state.forget(rel_path)
+                self._pending.pop(rel_path, None)
+                continue
+            self._pending.pop(rel_path, None)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            digest = hashlib.sha256(data).hexdigest()
+            entry = self.state.files.get(rel_path)
+            if entry is not None and entry["sha256"] == digest:
+                # Touched or copied over with the same contents
+                self.state.record(rel_path, signature, digest, entry.get("output"), entry.get("error"))
+                continue
+            try:
+                form_data = normalise_form_data(json.loads(data.decode('utf-8-sig')), rel_path)
+            except ValueError as e:
+                yield rel_path, signature, digest, None, f"Invalid form JSON: {e}"
+                continue
+            yield rel_path, signature, digest, form_data, None
+
+    def process(self, rel_paths):
+        """
+        Render the given ready files; returns their JobResults
+        """
+        results = []
+        since_save = 0
+
+        def finished(rel_path, signature, digest, result):
+            nonlocal since_save
+            output = os.path.relpath(result.output, self.out_dir) if result.ok else None
+            self.state.record(rel_path, signature, digest, output, result.error)
+            results.append(result)
+            if self.progress:
+                self.progress(result)
+            since_save += 1
+            if since_save >= SAVE_EVERY:
+                self.state.save()
+                since_save = 0
+
+        jobs = self._jobs(rel_paths)
+        try:
+            if self.workers > 1 and len(rel_paths) > 1:
+                self._process_parallel(jobs, finished)
+            else:
+                for rel_path, signature, digest, form_data, error in jobs:
+                    finished(rel_path, signature, digest, self._render(rel_path, form_data, error))
+        finally:
+            self.state.save()
+        return results
+
+    def _render(self, rel_path, form_data, error):
+        if error:
+            return JobResult(rel_path, error=error)
+        output_path = self.output_path_for(rel_path)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        return render_form(form_data, output_path, self.template, self.write_json, rel_path, self.cache)
+
+    def _process_parallel(self, jobs, finished):
+        """
+        Render on a process pool with a bounded number in flight, so a large
+        first scan doesn't hold every form in memory
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from render import _init_worker, _render_form_in_worker
+
+        in_flight = collections.deque()
+
+        def finish_next():
+            rel_path, signature, digest, outcome = in_flight.popleft()
+            if isinstance(outcome, JobResult):
+                result = outcome
+            else:
+                try:
+                    result = outcome.result()
+                except Exception as e:
+                    result = JobResult(rel_path, error=f"worker pool failed: {e}")
+            finished(rel_path, signature, digest, result)
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.template, self.cache, instrumentation.settings(),
+                                           allowed_photo_dirs())) as executor:
+            for rel_path, signature, digest, form_data, error in jobs:
+                if error:
+                    outcome = JobResult(rel_path, error=error)
+                else:
+                    output_path = self.output_path_for(rel_path)
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    outcome = executor.submit(_render_form_in_worker, form_data, output_path,
+                                              self.write_json, rel_path)
+                in_flight.append((rel_path, signature, digest, outcome))
+                while len(in_flight) >= self.workers * 4:
+                    finish_next()
+            while in_flight:
+                finish_next()
+
+    # Running
+
+    def run_once(self, wait=False):
+        """
+        One scan and render pass; files still settling are left for the next
+        pass. With wait, files seen for the first time are given settle seconds
+        and scanned again, so a single run (--once) renders them too.
+        """
+        results = self.process(self.scan())
+        if wait and self._pending:
+            time.sleep(self.settle)
+            results += self.process(self.scan())
+        return results
+
+    def run(self, interval=POLL_INTERVAL, use_inotify=None, should_stop=None):
+        """
+        Watch until should_stop() returns True (or forever). use_inotify=None
+        uses inotify when the platform has it and polls otherwise.
+        """
+        should_stop = should_stop or (lambda: False)
+        notifier = None
+        if use_inotify is not False:
+            notifier = Inotify.create()
+            if notifier is None and use_inotify:
+                raise OSError("inotify is not available on this system")
+        try:
+            if notifier:
+                notifier.watch_tree(self.source_dir, self._skip_dir)
+            self.run_once()
+            last_full_scan = time.monotonic()
+            while not should_stop():
+                if notifier is None:
+                    time.sleep(min(interval, self.settle) if self._pending else interval)
+                    self.run_once()
+                    continue
+                # Wake up in time to render files that are settling
+                timeout = min(self.settle, 1.0) if self._pending else 1.0
+                changed, rescan = notifier.read(timeout, self._skip_dir)
+                if rescan or time.monotonic() - last_full_scan > FULL_RESCAN_INTERVAL:
+                    self.run_once()
+                    last_full_scan = time.monotonic()
+                else:
+                    paths = {self._rel(path) for path in changed if path.lower().endswith('.json')
+                             and not os.path.basename(path).startswith('.')}
+                    self.process(self.check(paths | self.pending))
+        finally:
+            if notifier:
+                notifier.close()
+            self.state.save()
+
+
+class Inotify:
+    """
+    Minimal recursive inotify watcher through ctypes (Linux only)
+    """
+
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MODIFY
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, libc, fd):
+        self._libc = libc
+        self.fd = fd
+        self._dirs = {}
+
+    @classmethod
+    def create(cls):
+        """
+        An Inotify instance, or None where inotify isn't available
+        """
+        import ctypes
+        import ctypes.util
+        import sys
+
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+            fd = libc.inotify_init1(cls.IN_NONBLOCK)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    @classmethod
+    def available(cls):
+        notifier = cls.create()
+        if notifier is None:
+            return False
+        notifier.close()
+        return True
+
+    def watch_tree(self, root, skip_dir):
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK)
+            if wd < 0:
+                continue  # Removed already, or out of watches; the periodic rescan covers it
+            self._dirs[wd] = directory
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False) and not skip_dir(entry.path, entry.name):
+                            stack.append(entry.path)
+            except OSError:
+                continue
+
+    def read(self, timeout, skip_dir):
+        """
+        Wait up to timeout seconds; returns (changed file paths, whether a full rescan is needed)
+        """
+        changed = set()
+        rescan = False
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed, rescan
+        while True:
+            try:
+                buffer = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = self.EVENT.unpack_from(buffer, offset)
+                name = buffer[offset + self.EVENT.size:offset + self.EVENT.size + length].rstrip(b'\0')
+                offset += self.EVENT.size + length
+                if mask & self.IN_Q_OVERFLOW:
+                    rescan = True
+                    continue
+                if mask & self.IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                directory = self._dirs.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name))
+                if mask & self.IN_ISDIR:
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO) and not skip_dir(path, os.path.basename(path)):
+                        # Files may have landed before the watch was added; rescan to catch them
+                        self.watch_tree(path, skip_dir)
+                        rescan = True
+                    elif mask & self.IN_MOVED_FROM:
+                        rescan = True
+                    continue
+                changed.add(path)
+        return changed, rescan
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def print_watch_result(result):
+    if result.ok:
+        cached = " (cached)" if result.cached else ""
+        print(f"{result.source} -> {result.output}{cached} ({result.elapsed * 1000:.1f} ms)")
+    else:
+        print(f"{result.source} FAILED: {result.error}")
+
+
+def run_watch_command(args, template_path):
+    """
+    Entry point for `main.py watch`; returns a process exit code
+    """
+    template = load_engine(template_path, args.engine)
+    workers = args.workers if args.workers > 0 else default_worker_count()
+    watcher = FolderWatcher(args.source, args.out, template, write_json=not args.no_json, workers=workers,
+                            cache=cache_from_args(args), settle=args.settle, progress=print_watch_result)
+    if args.once:
+        results = watcher.run_once(wait=True)
+        failed = sum(1 for result in results if not result.ok)
+        print(f"Rendered {len(results) - failed} forms ({failed} failed); "
+              f"{len(watcher.state.files)} tracked, {len(watcher.pending)} still being written")
+        return 0 if not failed else 1
+    use_inotify = False if args.poll else None
+    mode = "polling" if args.poll or not Inotify.available() else "inotify"
+    print(f"Watching {watcher.source_dir} for form JSON ({mode}); writing to {watcher.out_dir}")
+    try:
+        watcher.run(interval=args.interval, use_inotify=use_inotify)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    return 0
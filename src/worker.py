@@ -0,0 +1,95 @@
+"""
+Background worker for slow file operations in the GUI.
+
+Jobs run one at a time, in submission order, on a worker thread so the Tk main
+loop never blocks on template loading, rendering or network-share writes. Tk
+widgets may only be touched from the main thread, so jobs report progress and
+results through a queue that the main loop drains with root.after.
+"""
+
+import queue
+import threading
+
+POLL_INTERVAL_MS = 50
+
+
+class BackgroundWorker:
+    """
+    Single worker thread with results delivered back to the Tk main loop
+    """
+
+    def __init__(self, root, on_status=None):
+        self.root = root
+        self.on_status = on_status
+        self.pending = 0
+        self._jobs = queue.Queue()
+        self._events = queue.Queue()
+        self._polling = False
+        self._thread = threading.Thread(target=self._run, name="form-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, on_success=None, on_error=None, description=None):
+        """
+        Run func(progress) on the worker thread; progress(message) updates the status bar.
+        on_success(result) or on_error(exception) is then called on the main thread.
+        """
+        self.pending += 1
+        self._jobs.put((func, on_success, on_error))
+        if description:
+            self._status(description)
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            func, on_success, on_error = job
+            try:
+                result = func(lambda message: self._events.put(("progress", message)))
+            except Exception as e:
+                self._events.put(("error", on_error, e))
+            else:
+                self._events.put(("done", on_success, result))
+
+    def _poll(self):
+        """
+        Drain worker events on the main thread; keeps polling while jobs are outstanding
+        """
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "progress":
+                self._status(event[1])
+                continue
+            self.pending -= 1
+            kind, callback, value = event
+            if callback:
+                try:
+                    callback(value)
+                except Exception as e:
+                    print(f"Error in background job callback: {e}")
+            elif kind == "error":
+                self._status(f"Error: {value}")
+        if self.pending:
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def _status(self, message):
+        if self.on_status:
+            if self.pending > 1:
+                message = f"{message} ({self.pending} jobs in progress)"
+            self.on_status(message)
+
+    def shutdown(self, wait=True):
+        """
+        Stop the worker after the queued jobs have finished
+        """
+        self._jobs.put(None)
+        if wait:
+            self._thread.join()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for the autosave journal.
+"""
+
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+from autosave import AutosaveJournal, read_journal
+
+FIELDS = {"Street address": "", "Suburb/locality": "Charleville", "Postcode": ""}
+
+
+def open_journal(tmp_path, **kwargs):
+    kwargs.setdefault("flush_delay", 60)
+    journal = AutosaveJournal(str(tmp_path / "autosave.jsonl"), **kwargs)
+    journal.start(FIELDS, "job.json")
+    journal.flush()
+    return journal
+
+
+def test_edits_are_recovered_after_a_crash(tmp_path):
+    journal = open_journal(tmp_path)
+    assert not read_journal(journal.path).dirty
+
+    for text in ("1", "12", "12 Alfred", "12 Alfred St"):
+        journal.record("Street address", text)
+    journal.record("Postcode", "4470")
+    journal.flush()
+    with open(journal.path, 'a') as f:
+        f.write('{"set": {"Postcode": "99')  # Cut short by the crash
+
+    state = read_journal(journal.path)
+    assert state.dirty and state.json_path == "job.json"
+    assert state.fields == {"Street address": "12 Alfred St", "Suburb/locality": "Charleville", "Postcode": "4470"}
+    assert journal.stats["writes"] == 1  # Five edits, one append
+
+
+def test_saving_marks_the_form_clean_unless_it_changed_meanwhile(tmp_path):
+    journal = open_journal(tmp_path)
+    journal.record("Street address", "12 Alfred St")
+    sequence = journal.sequence
+    journal.mark_saved("saved.json", sequence)
+    journal.flush()
+    state = read_journal(journal.path)
+    assert not state.dirty and state.json_path == "saved.json"
+
+    sequence = journal.sequence
+    journal.record("Postcode", "4470")  # Typed while the save was running
+    journal.mark_saved("saved.json", sequence)
+    journal.flush()
+    assert read_journal(journal.path).dirty
+
+
+def test_edits_are_batched_by_the_timer(tmp_path):
+    journal = open_journal(tmp_path, flush_delay=0.05)
+    for n in range(200):
+        journal.record("Street address", str(n))
+    deadline = time.monotonic() + 5
+    while journal.stats["writes"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    journal.close()
+    assert journal.stats["writes"] == 1
+    assert read_journal(journal.path).fields["Street address"] == "199"
+
+
+def test_journal_is_compacted_and_restarted(tmp_path):
+    journal = open_journal(tmp_path, compact_threshold=10)
+    for n in range(25):
+        journal.record("Street address", str(n))
+        journal.flush()
+    with open(journal.path) as f:
+        assert len(f.readlines()) < 10
+    assert read_journal(journal.path).fields["Street address"] == "24"
+
+    journal.start({"Street address": "new form"})
+    journal.flush()
+    state = read_journal(journal.path)
+    assert state.fields == {"Street address": "new form"} and not state.dirty and state.json_path is None
+
+    journal.discard()
+    assert read_journal(journal.path) is None
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for the benchmark suite's regression gate.
+"""
+
+import os
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'benchmarks'))
+
+from bench_suite import Metric, best_of, compare, load_baseline, run_suite, save_baseline
+
+
+def test_compare_flags_only_regressions_past_the_threshold():
+    baseline = {
+        "render.latency_p50_ms": {"value": 10.0},
+        "render.throughput_per_s": {"value": 100.0},
+        "store.add_unchanged_us": {"value": 2.0},
+        "render.peak_mib": {"value": 1.0},
+    }
+    results = {metric.name: metric for metric in [
+        Metric("render.latency_p50_ms", 13.0, "ms"),                             # 30% slower
+        Metric("render.throughput_per_s", 90.0, "forms/s", higher_is_better=True),  # 10% fewer
+        Metric("store.add_unchanged_us", 2.4, "us"),                             # 20%, and under the noise floor
+        Metric("render.peak_mib", 0.5, "MiB"),                                   # Better
+        Metric("render.new_metric_ms", 99.0, "ms"),                              # Not in the baseline
+    ]}
+
+    regressions = compare(results, baseline, threshold=0.25)
+    assert [name for name, *_ in regressions] == ["render.latency_p50_ms"]
+    assert compare(results, baseline, threshold=0.05)[1][0] == "render.throughput_per_s"
+
+
+def test_timings_are_normalised_by_machine_speed():
+    baseline = {"render.latency_p50_ms": {"value": 10.0, "calibration": 0.020}}
+    # Twice as slow, but the calibration workload was twice as slow too
+    slow_machine = {"render.latency_p50_ms": Metric("render.latency_p50_ms", 20.0, "ms", calibration=0.040)}
+    assert compare(slow_machine, baseline, threshold=0.25) == []
+    slow_code = {"render.latency_p50_ms": Metric("render.latency_p50_ms", 20.0, "ms", calibration=0.020)}
+    assert compare(slow_code, baseline, threshold=0.25)[0][3] == 1.0
+
+
+def test_best_of_rounds():
+    rounds = [{"a_ms": Metric("a_ms", value, "ms"), "b_per_s": Metric("b_per_s", rate, "forms/s", True)}
+              for value, rate in [(5.0, 100.0), (4.0, 90.0), (6.0, 120.0)]]
+    best = best_of(rounds)
+    assert (best["a_ms"].value, best["b_per_s"].value) == (4.0, 120.0)
+
+
+def test_suite_runs_and_round_trips_a_baseline(tmp_path):
+    results = run_suite(["small"], [200], repeat=2, batch=2)
+
+    assert results["render.zip.small.throughput_per_s"].value > 0
+    assert results["store.200.add_new_ms"].value > 0
+    save_baseline(str(tmp_path / "baseline.json"), results)
+    baseline = load_baseline(str(tmp_path / "baseline.json"))
+    assert set(baseline) == set(results)
+    assert compare(results, baseline, threshold=0.0) == []
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for streamed bundles of rendered forms.
+"""
+
+import hashlib
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import zipfile
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+import instrumentation
+from bundle import MANIFEST_NAME, BundleWriter, open_bundle_output, write_bundle
+from render import load_engine
+
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, 'template.docx')
+
+
+class Pipe(io.RawIOBase):
+    """
+    A write-only stream that can't seek or tell, like stdout piped elsewhere
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def getvalue(self):
+        return b"".join(self.chunks)
+
+
+def write_jobs(tmp_path, count):
+    paths = []
+    for n in range(count):
+        path = tmp_path / f"job{n}.json"
+        path.write_text("not json" if n == 1 else json.dumps({"Street address": f"{n} Main Street"}))
+        paths.append(str(path))
+    return paths
+
+
+def test_bundle_streams_to_an_unseekable_output(tmp_path):
+    template = load_engine(TEMPLATE_PATH, 'zip')
+    pipe = Pipe()
+    results = write_bundle(write_jobs(tmp_path, 3), pipe, template)
+    assert [r.ok for r in results] == [True, False, True]
+
+    with zipfile.ZipFile(io.BytesIO(pipe.getvalue())) as archive:
+        assert archive.namelist() == ["job0.docx", "job0.json", "job2.docx", "job2.json", MANIFEST_NAME]
+        assert archive.testzip() is None
+        manifest = json.loads(archive.read(MANIFEST_NAME))
+        assert manifest["template"]["sha256"] == template.hash
+        assert [entry["source"] for entry in manifest["failed"]] == [str(tmp_path / "job1.json")]
+        for entry in manifest["forms"]:
+            for part in ("docx", "json"):
+                data = archive.read(entry[part]["name"])
+                assert hashlib.sha256(data).hexdigest() == entry[part]["sha256"]
+        assert json.loads(archive.read("job2.json")) == {"Street address": "2 Main Street"}
+
+    expected = io.BytesIO()
+    template.render({"Street address": "0 Main Street"}, expected)
+    with zipfile.ZipFile(io.BytesIO(pipe.getvalue())) as archive:
+        assert archive.read("job0.docx") == expected.getvalue()
+
+
+def test_names_are_unique_and_large_bundles_use_zip64(tmp_path):
+    pipe = Pipe()
+    with BundleWriter(pipe, load_engine(TEMPLATE_PATH, 'zip'), write_json=False) as bundle:
+        assert bundle.add({}, "job").output == "job.docx"
+        assert bundle.add({}, "job").output == "job-2.docx"
+        assert bundle.add({}, "JOB").output == "JOB-3.docx"
+        # More entries than a plain ZIP can count
+        for n in range(zipfile.ZIP_FILECOUNT_LIMIT):
+            bundle._write(f"filler/{n}", b"", False)
+    with zipfile.ZipFile(io.BytesIO(pipe.getvalue())) as archive:
+        assert len(archive.infolist()) == zipfile.ZIP_FILECOUNT_LIMIT + 4
+
+
+def test_bundle_can_be_sent_to_a_socket(tmp_path):
+    listener = socket.create_server(('127.0.0.1', 0))
+    received = []
+
+    def accept():
+        conn, _ = listener.accept()
+        with conn:
+            received.append(conn.makefile('rb').read())
+
+    thread = threading.Thread(target=accept)
+    thread.start()
+    output, close = open_bundle_output(connect=f"127.0.0.1:{listener.getsockname()[1]}")
+    try:
+        write_bundle(write_jobs(tmp_path, 1), output, load_engine(TEMPLATE_PATH, 'zip'))
+    finally:
+        close()
+    thread.join(5)
+    listener.close()
+    with zipfile.ZipFile(io.BytesIO(received[0])) as archive:
+        assert archive.namelist() == ["job0.docx", "job0.json", MANIFEST_NAME]
+
+
+def test_profiling_a_bundle_writes_nothing_beside_it(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    instrumentation.configure(profile='cprofile')
+    try:
+        pipe = Pipe()
+        with BundleWriter(pipe, load_engine(TEMPLATE_PATH, 'zip'), write_json=False) as bundle:
+            assert bundle.add({}, "job").ok
+        assert instrumentation.recorder().summary()
+    finally:
+        instrumentation.disable()
+    assert os.listdir(tmp_path) == []
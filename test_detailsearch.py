@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for the type-ahead index behind the global details picker.
+"""
+
+import os
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+from detailsearch import DetailIndex, DetailIndexes, DetailUsage, describe
+from globalstore import GlobalDetailsStore, record_key
+
+CERTIFIERS = [
+    {"name": "Kevin Mizen", "contact": "A1160915", "approval_number": "BA7860"},
+    {"name": "Kate Mills", "contact": "A2000001", "approval_number": "BA9911"},
+    {"name": "Alan Brown", "contact": "A3000002", "approval_number": "BA7001"},
+]
+
+
+def names(records):
+    return [record["name"] for record in records]
+
+
+def test_words_match_as_prefixes_of_any_searched_attribute():
+    index = DetailIndex("building_certifier", CERTIFIERS)
+    assert names(index.search("k")[0]) == ["Kate Mills", "Kevin Mizen"]
+    assert names(index.search("kev miz")[0]) == ["Kevin Mizen"]
+    assert names(index.search("ba7")[0]) == ["Alan Brown", "Kevin Mizen"]
+    assert names(index.search("a116")[0]) == ["Kevin Mizen"]
+    assert index.search("mizen brown") == ([], 0)
+    assert index.search("") == (index.search("  ")[0], 3)
+
+
+def test_recently_used_records_come_first_and_results_are_limited():
+    index = DetailIndex("building_certifier", CERTIFIERS)
+    used = {record_key("building_certifier", CERTIFIERS[1]): 100.0,
+            record_key("building_certifier", CERTIFIERS[0]): 200.0,
+            ("Removed", "BA1"): 300.0}
+    assert names(index.search("", used)[0]) == ["Kevin Mizen", "Kate Mills", "Alan Brown"]
+    assert names(index.search("a", used)[0]) == ["Kevin Mizen", "Kate Mills", "Alan Brown"]
+    records, total = index.search("", used, limit=2)
+    assert names(records) == ["Kevin Mizen", "Kate Mills"] and total == 3
+
+
+def test_usage_round_trips_through_disk(tmp_path):
+    path = str(tmp_path / "usage.json")
+    usage = DetailUsage(path)
+    usage.touch("building_certifier", CERTIFIERS[2], when=50.0)
+    usage.touch("appointed_competent_person", {"name": "Jacob Ross Barton"}, when=60.0)
+    usage.save()
+
+    reloaded = DetailUsage(path)
+    assert reloaded.used("building_certifier") == {("Alan Brown", "BA7001"): 50.0}
+    assert reloaded.used("appointed_competent_person") == {"Jacob Ross Barton": 60.0}
+
+
+def test_indexes_are_rebuilt_when_the_store_changes(tmp_path):
+    store = GlobalDetailsStore(str(tmp_path / "global.json"), flush_delay=0)
+    store.load()
+    indexes = DetailIndexes(store)
+    store.add("building_certifier", CERTIFIERS[0])
+    assert names(indexes.get("building_certifier").search("kev")[0]) == ["Kevin Mizen"]
+    assert indexes.current("building_certifier")
+
+    store.add("building_certifier", CERTIFIERS[0])  # Unchanged, so the index is still current
+    assert indexes.current("building_certifier")
+    store.add("building_certifier", CERTIFIERS[1])
+    assert not indexes.current("building_certifier")
+    assert names(indexes.get("building_certifier").search("k")[0]) == ["Kate Mills", "Kevin Mizen"]
+    store.close()
+
+
+def test_describe():
+    assert describe("building_certifier", CERTIFIERS[0]) == "Kevin Mizen - BA7860 - A1160915"
+    assert describe("appointed_competent_person", {"name": "Jacob", "company": ""}) == "Jacob"
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests that the python-docx and zip render engines produce equivalent documents.
+"""
+
+import io
+import json
+import os
+import sys
+import zipfile
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+import pytest
+from docx import Document
+
+from render import load_engine
+
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, 'template.docx')
+DEFAULTS_PATH = os.path.join(PROJECT_DIR, 'defaults.json')
+
+
+def load_defaults():
+    with open(DEFAULTS_PATH) as f:
+        return json.load(f)
+
+
+def render_to_bytes(engine, form_data):
+    out = io.BytesIO()
+    load_engine(TEMPLATE_PATH, engine).render(form_data, out)
+    return out.getvalue()
+
+
+def document_text(data):
+    doc = Document(io.BytesIO(data))
+    texts = [p.text for p in doc.paragraphs]
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                texts.extend(p.text for p in cell.paragraphs)
+    return texts
+
+
+@pytest.mark.parametrize("overrides", [
+    {},
+    {"Date (signature)": ""},
+    {"Street address": "Lot 3 & 4 <rear>\tShed", "Basis of certification": " leading\nand trailing "},
+])
+def test_engines_give_equivalent_text(overrides):
+    form_data = dict(load_defaults(), **overrides)
+    assert document_text(render_to_bytes('zip', form_data)) == document_text(render_to_bytes('docx', form_data))
+
+
+def test_zip_engine_document_xml_matches_python_docx():
+    form_data = load_defaults()
+    docx_xml = zipfile.ZipFile(io.BytesIO(render_to_bytes('docx', form_data))).read('word/document.xml')
+    zip_xml = zipfile.ZipFile(io.BytesIO(render_to_bytes('zip', form_data))).read('word/document.xml')
+    assert zip_xml == docx_xml
+
+
+def test_zip_engine_copies_other_parts_unchanged():
+    rendered = zipfile.ZipFile(io.BytesIO(render_to_bytes('zip', load_defaults())))
+    template = zipfile.ZipFile(TEMPLATE_PATH)
+
+    assert rendered.testzip() is None
+    assert rendered.namelist() == template.namelist()
+    for info in template.infolist():
+        if info.filename != 'word/document.xml':
+            assert rendered.getinfo(info.filename).compress_size == info.compress_size
+            assert rendered.read(info.filename) == template.read(info.filename)
+
+
+def test_zip_engine_rejects_control_characters():
+    with pytest.raises(ValueError):
+        render_to_bytes('zip', dict(load_defaults(), **{"Street address": "bad\x01value"}))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for the search index over saved inspection forms.
+"""
+
+import json
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+import pytest
+
+from formindex import FormIndex, parse_query
+
+FORMS = {
+    "slab.json": {"Street address": "12 Alfred Street", "Suburb/locality": "Charleville",
+                  "Lot and plan details": "Lot 3 RP123456", "Building development approval number": "BA7860",
+                  "Aspect of building work (indicate the aspect)": "Slab inspection",
+                  "Date (signature)": "2024-03-15"},
+    "frame.json": {"Street address": "4 Galatea Street", "Suburb/locality": "Charleville",
+                   "Lot and plan details": "Lot 12 SP998877", "Building development approval number": "BA9911",
+                   "Aspect of building work (indicate the aspect)": "Frame inspection",
+                   "Date (signature)": "2024-05-02"},
+}
+
+
+def write_forms(directory, forms=FORMS):
+    os.makedirs(directory, exist_ok=True)
+    for name, form in forms.items():
+        with open(os.path.join(directory, name), 'w') as f:
+            json.dump(form, f)
+
+
+@pytest.fixture(params=[True, False], ids=["fts5", "like"])
+def index(request, tmp_path):
+    index = FormIndex(str(tmp_path / "forms.sqlite"))
+    index._connect()
+    index.fts = index.fts and request.param
+    yield index
+    index.close()
+
+
+def names(results):
+    return sorted(os.path.basename(result.path) for result in results)
+
+
+def test_search_by_field_and_free_text(tmp_path, index):
+    write_forms(str(tmp_path / "forms"))
+    assert index.scan([str(tmp_path / "forms")]) == (2, 0)
+
+    assert names(index.search("alfred")) == ["slab.json"]
+    assert names(index.search("charleville")) == ["frame.json", "slab.json"]
+    assert names(index.search("lot:3 plan:RP123")) == ["slab.json"]
+    assert names(index.search("ba:BA99")) == ["frame.json"]
+    assert names(index.search("date:2024-05")) == ["frame.json"]
+    assert names(index.search("frame charleville")) == ["frame.json"]
+    assert index.search("galatea alfred") == []
+    assert len(index.search("")) == 2
+
+
+def test_rescans_are_incremental(tmp_path, index):
+    directory = str(tmp_path / "forms")
+    write_forms(directory)
+    (tmp_path / "forms" / "global.json").write_text('{"building_certifier": []}')
+    (tmp_path / "forms" / "notes.json").write_text('["not a form"]')
+    index.scan([directory])
+
+    assert index.scan([directory]) == (0, 0)
+    past = time.time() - 100
+    os.utime(os.path.join(directory, "slab.json"), (past, past))
+    assert index.scan([directory]) == (0, 0)  # Touched, but the contents are the same
+
+    write_forms(directory, {"slab.json": dict(FORMS["slab.json"], **{"Street address": "7 Edward Street"})})
+    os.remove(os.path.join(directory, "frame.json"))
+    assert index.scan([directory]) == (1, 1)
+    assert names(index.search("edward")) == ["slab.json"]
+    assert index.search("alfred") == [] and len(index) == 1
+
+
+def test_add_keeps_the_index_current(tmp_path, index):
+    path = str(tmp_path / "saved.json")
+    write_forms(str(tmp_path), {"saved.json": FORMS["slab.json"]})
+    index.add(path)
+    assert names(index.search("alfred")) == ["saved.json"]
+
+    write_forms(str(tmp_path), {"saved.json": FORMS["frame.json"]})
+    index.add(path)
+    assert names(index.search("galatea")) == ["saved.json"]
+    assert index.search("alfred") == []
+
+    os.remove(path)
+    index.add(path)
+    assert len(index) == 0
+
+
+def test_parse_query():
+    assert parse_query('lot:3 "RP 123" 10:30 ba:BA1') == [
+        ("lot_plan", "3"), (None, "RP"), (None, "123"), (None, "10"), (None, "30"), ("reference", "BA1")]
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for the compact FormRecord layout.
+"""
+
+import io
+import json
+import os
+import pickle
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+import pytest
+
+from formrecord import FORM_SCHEMA, FormRecord, FormSchema, ValuePool
+from render import load_engine, write_form_json
+
+FORM = {
+    "Street address": "12 Alfred Street",
+    "Suburb/locality": "Charleville",
+    "Building development approval number": "BA7860",
+    "Date (signature)": "2024-03-15",
+}
+
+
+def test_json_round_trip_keeps_every_key():
+    data = dict(FORM, **{"Site photo note": "rear"})
+    record = FormRecord.from_json(json.dumps(data))
+    assert record.to_dict() == data
+    assert json.loads(record.to_json()) == data
+    assert record.extra == {"Site photo note": "rear"}
+    assert FormRecord.from_dict(FORM).extra is None
+
+
+def test_behaves_like_the_dict_it_came_from():
+    record = FormRecord.from_dict(FORM)
+    assert record == FORM and dict(record) == FORM and len(record) == len(FORM)
+    assert record["Street address"] == "12 Alfred Street"
+    assert record.get("Postcode", "") == "" and "Postcode" not in record
+    assert record.get("Unknown") is None
+    with pytest.raises(KeyError):
+        record["Postcode"]
+
+    changed = record.replace({"Postcode": "4470", "Extra": "x"})
+    assert changed["Postcode"] == "4470" and changed["Extra"] == "x"
+    assert "Postcode" not in record
+
+
+def test_values_are_pooled_and_field_names_shared():
+    pool = ValuePool()
+    first = FormRecord.from_json(json.dumps(FORM), pool=pool)
+    second = FormRecord.from_json(json.dumps(FORM), pool=pool)
+    assert first["Suburb/locality"] is second["Suburb/locality"]
+    assert len(pool) == len(FORM)
+    assert first.schema is second.schema is FORM_SCHEMA
+    assert list(first)[0] is FORM_SCHEMA.names[FORM_SCHEMA.positions["Street address"]]
+
+
+def test_pickles_without_the_schema():
+    record = FormRecord.from_dict(FORM)
+    assert pickle.loads(pickle.dumps(record)) == record
+    assert len(pickle.dumps(record)) < len(pickle.dumps(FORM))
+
+    schema = FormSchema(["A", "B"])
+    other = FormRecord(("1", None), schema)
+    assert pickle.loads(pickle.dumps(other)).to_dict() == {"A": "1"}
+    with pytest.raises(ValueError):
+        FormRecord(("1",), schema)
+
+
+def test_records_render_and_write_like_dicts(tmp_path):
+    record = FormRecord.from_dict(FORM)
+    engine = load_engine(os.path.join(PROJECT_DIR, 'template.docx'), 'zip')
+    from_dict, from_record = io.BytesIO(), io.BytesIO()
+    engine.render(FORM, from_dict)
+    engine.render(record, from_record)
+    assert from_record.getvalue() == from_dict.getvalue()
+
+    json_path = write_form_json(record, str(tmp_path / "form.docx"))
+    with open(json_path) as f:
+        assert json.load(f) == FORM
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests for the form data model and the virtualized row layout; the view itself
+is only exercised where a display is available.
+"""
+
+import os
+import sys
+import tkinter as tk
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+import pytest
+
+from formview import FormModel, FormView, RowLayout, row_kind
+
+CONFIGS = [
+    ("header1", "header", "1. Section"),
+    ("Name", "text"),
+    ("Notes", "textarea"),
+    ("Signature (Manual)", "disabled_text"),
+]
+
+
+def test_model_holds_values_and_notifies_listeners():
+    model = FormModel(CONFIGS)
+    changes = []
+    model.add_listener(lambda name, value, source: changes.append((name, value, source)))
+
+    model.update({"Name": "Jacob", "Notes": "Checked", "Unknown field": "ignored"})
+    model.set("Name", "Jacob")  # Unchanged, no notification
+    model.set("Name", "Kevin", source="view")
+
+    assert "header1" not in model
+    assert model.data() == {"Name": "Kevin", "Notes": "Checked", "Signature (Manual)": ""}
+    assert changes == [("Name", "Jacob", None), ("Notes", "Checked", None), ("Name", "Kevin", "view")]
+
+    model.clear()
+    assert set(model.data().values()) == {""}
+
+
+def test_model_keeps_loaded_values_as_strings():
+    model = FormModel(CONFIGS)
+    model.update({"Name": 4470, "Notes": None})
+    assert model.data() == {"Name": "4470", "Notes": "", "Signature (Manual)": ""}
+
+
+def test_visible_range_only_covers_rows_in_view():
+    kinds = [row_kind(config) for config in CONFIGS * 2500]  # 10,000 rows
+    layout = RowLayout(kinds, heights={"header": 30, "text": 30, "textarea": 80, "disabled_text": 30})
+
+    assert layout.total_height == 2500 * 170
+    assert layout.visible_range(0, 100, overscan=0) == range(0, 3)
+    # Rows 4-7 repeat the pattern starting at y=170
+    assert layout.visible_range(170 * 1000 + 35, 10, overscan=0) == range(4001, 4002)
+    assert layout.visible_range(170 * 1000 + 35, 10, overscan=2) == range(3999, 4004)
+    assert layout.visible_range(layout.total_height + 500, 300, overscan=0) == range(9999, 10000)
+
+
+def test_measured_height_moves_later_rows():
+    layout = RowLayout(["header", "text", "text"], heights={"header": 30, "text": 30})
+
+    assert layout.set_height("text", 40)
+    assert not layout.set_height("text", 40)
+    assert layout.offsets == [0, 30, 70, 110]
+
+
+@pytest.fixture
+def root():
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display")
+    root.geometry("600x200")
+    yield root
+    root.destroy()
+
+
+def test_focused_field_keeps_its_keystrokes_when_scrolled_away(root):
+    model = FormModel([(f"Field {n}", "text") for n in range(200)])
+    view = FormView(root, model)
+    view.grid(row=0, column=0, sticky="nsew")
+    root.columnconfigure(0, weight=1)
+    root.rowconfigure(0, weight=1)
+    root.update()
+
+    view.focus_field("Field 1")
+    root.update()
+    view.yview("moveto", 1.0)
+    root.update()
+    assert 1 not in view.layout.visible_range(view.canvas.canvasy(0), view.canvas.winfo_height())
+
+    # Where keystrokes go, whether or not the window manager has given us the focus
+    root.focus_lastfor().insert("end", "typed")
+    assert model.get("Field 1") == "typed"
+    assert [name for name, value in model.data().items() if value] == ["Field 1"]
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Tests for the journalled global details store.
+"""
+
+import json
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+import globalstore
+from globalstore import LOCK_STALE_SECONDS, FileLock, GlobalDetailsStore
+
+PERSON = {"name": "Jacob Ross Barton", "company": "Murweh Shire Council", "mobile": "0476755014"}
+CERTIFIER = {"name": "Kevin Mizen", "contact": "A1160915", "approval_number": "BA7860"}
+
+
+def open_store(tmp_path, **kwargs):
+    kwargs.setdefault("flush_delay", 0)
+    store = GlobalDetailsStore(str(tmp_path / "global.json"), **kwargs)
+    store.load()
+    return store
+
+
+def test_missing_file_is_created(tmp_path):
+    open_store(tmp_path)
+    with open(tmp_path / "global.json") as f:
+        assert json.load(f) == {"building_certifier": [], "appointed_competent_person": []}
+
+
+def test_unchanged_records_are_not_written(tmp_path):
+    store = open_store(tmp_path)
+    assert store.add("building_certifier", CERTIFIER)
+    assert store.add("appointed_competent_person", PERSON)
+    log_size = os.path.getsize(tmp_path / "global.json.log")
+
+    assert not store.add("building_certifier", dict(CERTIFIER, contact="changed"))
+    assert not store.add("appointed_competent_person", dict(PERSON))
+    assert os.path.getsize(tmp_path / "global.json.log") == log_size
+
+
+def test_competent_person_is_overridden_by_name(tmp_path):
+    store = open_store(tmp_path)
+    store.add("appointed_competent_person", PERSON)
+    assert store.add("appointed_competent_person", dict(PERSON, mobile="0400000000"))
+
+    assert store.records("appointed_competent_person") == [dict(PERSON, mobile="0400000000")]
+
+
+def test_journal_is_replayed_and_compacted(tmp_path):
+    store = open_store(tmp_path)
+    store.add("building_certifier", CERTIFIER)
+
+    other = open_store(tmp_path)
+    assert other.records("building_certifier") == [CERTIFIER]
+
+    store.close()
+    assert not os.path.exists(tmp_path / "global.json.log")
+    with open(tmp_path / "global.json") as f:
+        assert json.load(f)["building_certifier"] == [CERTIFIER]
+
+
+def test_changes_from_other_writers_are_picked_up(tmp_path):
+    first = open_store(tmp_path, compact_threshold=1)
+    second = open_store(tmp_path)
+
+    first.add("building_certifier", CERTIFIER)  # Compacts straight away
+    second.add("appointed_competent_person", PERSON)
+
+    reloaded = open_store(tmp_path)
+    assert reloaded.records("building_certifier") == [CERTIFIER]
+    assert reloaded.records("appointed_competent_person") == [PERSON]
+
+
+def test_partial_journal_line_is_ignored(tmp_path):
+    store = open_store(tmp_path)
+    store.add("building_certifier", CERTIFIER)
+    with open(tmp_path / "global.json.log", "a") as f:
+        f.write('{"type": "building_certifier", "rec')
+
+    assert open_store(tmp_path).records("building_certifier") == [CERTIFIER]
+
+
+def test_burst_of_changes_is_written_once(tmp_path):
+    store = open_store(tmp_path, flush_delay=60)
+    store.add("building_certifier", CERTIFIER)
+    store.add("appointed_competent_person", PERSON)
+    store.add("appointed_competent_person", PERSON)
+    assert store.dirty
+    assert not os.path.exists(tmp_path / "global.json.log")
+
+    store.flush()
+
+    assert not store.dirty
+    assert (store.stats["changed"], store.stats["skipped"], store.stats["writes"]) == (2, 1, 1)
+    with open(tmp_path / "global.json.log") as f:
+        assert len(f.readlines()) == 2
+
+
+def test_timer_flushes_pending_changes(tmp_path):
+    store = open_store(tmp_path, flush_delay=0.01)
+    store.add("building_certifier", CERTIFIER)
+    store._timer.join(5)
+
+    assert not store.dirty
+    assert open_store(tmp_path).records("building_certifier") == [CERTIFIER]
+
+
+def test_close_flushes_and_compacts(tmp_path):
+    store = open_store(tmp_path, flush_delay=60)
+    store.add("building_certifier", CERTIFIER)
+    store.close()
+
+    assert not os.path.exists(tmp_path / "global.json.log")
+    with open(tmp_path / "global.json") as f:
+        assert json.load(f)["building_certifier"] == [CERTIFIER]
+
+
+def test_unreadable_file_is_kept_aside(tmp_path, capsys):
+    (tmp_path / "global.json").write_text('{"building_certifier": [{"name": "Kevin')
+    store = open_store(tmp_path)
+    store.add("building_certifier", CERTIFIER)
+    store.close()
+
+    assert (tmp_path / "global.json.corrupt").read_text().startswith('{"building_certifier"')
+    with open(tmp_path / "global.json") as f:
+        assert json.load(f)["building_certifier"] == [CERTIFIER]
+    assert "global.json.corrupt" in capsys.readouterr().out
+
+    (tmp_path / "global.json").write_text("not json")
+    open_store(tmp_path)
+    assert (tmp_path / "global.json.corrupt2").read_text() == "not json"
+
+
+def test_read_only_load_leaves_files_alone(tmp_path):
+    path = str(tmp_path / "global.json")
+    assert GlobalDetailsStore(path).load(read_only=True)["building_certifier"] == []
+    assert not os.path.exists(path)
+
+    (tmp_path / "global.json").write_text("not json")
+    store = GlobalDetailsStore(path)
+    store.load(read_only=True)
+    store.add("building_certifier", CERTIFIER)
+    store.close()
+    assert sorted(os.listdir(tmp_path)) == ["global.json"]
+    assert (tmp_path / "global.json").read_text() == "not json"
+
+
+def test_stale_lock_is_taken_over_but_a_fresh_one_is_not(tmp_path):
+    lock_path = str(tmp_path / "global.json.lock")
+    with open(lock_path, 'w') as f:
+        f.write("12345")
+    past = time.time() - LOCK_STALE_SECONDS - 5
+    os.utime(lock_path, (past, past))
+    with FileLock(lock_path):
+        with open(lock_path) as f:
+            assert f.read() == str(os.getpid())
+        # A second waiter sees a fresh lock and gives up rather than breaking it
+        try:
+            with FileLock(lock_path, timeout=0.1):
+                raise AssertionError("took a fresh lock")
+        except TimeoutError:
+            pass
+        assert os.path.exists(lock_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_breaking_a_stale_lock_never_removes_a_fresh_one(tmp_path, monkeypatch):
+    lock_path = str(tmp_path / "global.json.lock")
+    with open(lock_path, 'w') as f:
+        f.write("stale")
+    past = time.time() - LOCK_STALE_SECONDS - 5
+    os.utime(lock_path, (past, past))
+    rename = os.rename
+
+    def racing_rename(src, dst):
+        # Another process breaks the stale lock and takes a new one just before our rename
+        os.remove(src)
+        with open(src, 'w') as f:
+            f.write("fresh")
+        rename(src, dst)
+
+    monkeypatch.setattr(globalstore.os, "rename", racing_rename)
+    assert FileLock(lock_path)._break_if_stale()
+    with open(lock_path) as f:
+        assert f.read() == "fresh"
+    assert os.listdir(tmp_path) == ["global.json.lock"]
+
+
+def test_a_fresh_lock_that_cant_be_put_back_is_left_alone(tmp_path, monkeypatch):
+    lock_path = str(tmp_path / "global.json.lock")
+    with open(lock_path, 'w') as f:
+        f.write("stale")
+    past = time.time() - LOCK_STALE_SECONDS - 5
+    os.utime(lock_path, (past, past))
+    rename = os.rename
+
+    def racing_rename(src, dst):
+        os.remove(src)
+        with open(src, 'w') as f:
+            f.write("fresh")
+        rename(src, dst)
+
+    def racing_link(src, dst):
+        # A third process takes the lock before ours can be put back
+        with open(dst, 'w') as f:
+            f.write("third")
+        raise FileExistsError(dst)
+
+    monkeypatch.setattr(globalstore.os, "rename", racing_rename)
+    monkeypatch.setattr(globalstore.os, "link", racing_link)
+    assert FileLock(lock_path)._break_if_stale()
+    with open(lock_path) as f:
+        assert f.read() == "third"
+    [stale] = [name for name in os.listdir(tmp_path) if name.endswith(".stale")]
+    assert (tmp_path / stale).read_text() == "fresh"
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for per-phase timing instrumentation and profiling hooks.
+"""
+
+import io
+import json
+import os
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+import pytest
+
+import instrumentation
+from instrumentation import Histogram, measure, phase
+from render import load_engine, render_form
+
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, 'template.docx')
+DEFAULTS_PATH = os.path.join(PROJECT_DIR, 'defaults.json')
+
+
+@pytest.fixture(autouse=True)
+def instrumentation_off():
+    yield
+    instrumentation.disable()
+
+
+def load_defaults():
+    with open(DEFAULTS_PATH) as f:
+        return json.load(f)
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_disabled_by_default():
+    with measure("render") as timings, phase("save"):
+        pass
+    assert timings is None
+    assert instrumentation.recorder() is None
+
+
+@pytest.mark.parametrize("engine, phases", [
+    ("docx", ["load_template", "fill_paragraphs", "fill_tables", "fill_signature", "save", "write_json"]),
+    ("zip", ["fill", "compress", "assemble", "save", "write_json"]),
+])
+def test_render_phases_and_counts(tmp_path, engine, phases):
+    timings_path = tmp_path / "timings.jsonl"
+    instrumentation.configure(str(timings_path))
+    output = str(tmp_path / "form.docx")
+
+    result = render_form(load_defaults(), output, load_engine(TEMPLATE_PATH, engine), source="defaults")
+
+    assert result.ok
+    [line] = read_lines(timings_path)
+    assert line["op"] == "render" and line["source"] == "defaults" and line["output"] == output
+    assert list(line["phases_ms"]) == phases
+    assert line["counts"]["bytes_written"] == os.path.getsize(output)
+    assert line["counts"]["placeholders_replaced"] > 0
+    assert sum(line["phases_ms"].values()) <= line["total_ms"]
+    assert "render.save" in instrumentation.recorder().summary()
+
+
+def test_nested_measure_becomes_a_phase():
+    instrumentation.configure()
+    with measure("generate") as outer:
+        with measure("render", io.BytesIO()):
+            load_engine(TEMPLATE_PATH, 'zip').render({}, io.BytesIO())
+    assert "render" in outer.phases and "compress" in outer.phases
+    assert list(instrumentation.recorder().snapshot()["counts"]) == ["generate"]
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for ms in range(1, 101):
+        histogram.add(ms / 1000)
+    assert 0.045 <= histogram.percentile(0.5) <= 0.06
+    assert histogram.percentile(1.0) == histogram.max == 0.1
+    assert Histogram().percentile(0.5) is None
+
+
+@pytest.mark.parametrize("profiler", ["cprofile", "tracemalloc"])
+def test_profile_report_is_written_next_to_the_output(tmp_path, profiler):
+    instrumentation.configure(profile=profiler)
+    output = str(tmp_path / "form.docx")
+    render_form(load_defaults(), output, load_engine(TEMPLATE_PATH, 'zip'))
+
+    with open(f"{output}.{profiler}.txt") as f:
+        report = f.read()
+    assert json.loads(report.splitlines()[0])["op"] == "render"
+    assert ("function calls" if profiler == "cprofile" else "Peak traced memory") in report
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming CSV / JSON Lines mail-merge.
+"""
+
+import csv
+import json
+import os
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+import pytest
+
+from merge import CHECKPOINT_NAME, RecordLayers, iter_rows, run_merge
+
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, 'template.docx')
+
+DEFAULTS = {"State": "QLD", "Suburb/locality": "Charleville",
+            "Appointed competent person name (in full)": "Jacob Ross Barton"}
+GLOBAL_DETAILS = {
+    "building_certifier": [{"name": "Kevin Mizen", "contact": "A1160915", "approval_number": "BA7860"}],
+    "appointed_competent_person": [{"name": "Jacob Ross Barton", "mobile": "0476755014"}],
+}
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["street address", "SUBURB / LOCALITY", "Building certifier's name (in full)",
+                         "Reference documentation", "Job no"])
+        writer.writerows(rows)
+
+
+def merge(source, out_dir, **kwargs):
+    kwargs.setdefault("engine", "zip")
+    return run_merge(str(source), str(out_dir), TEMPLATE_PATH, defaults=DEFAULTS,
+                     global_details=GLOBAL_DETAILS, **kwargs)
+
+
+def read_output(out_dir, name):
+    with open(os.path.join(out_dir, name)) as f:
+        return json.load(f)
+
+
+def test_rows_are_layered_over_defaults_and_global_records(tmp_path):
+    source = tmp_path / "jobs.csv"
+    write_csv(source, [["12 Alfred St", "", "Kevin Mizen", "Plans rev B\nSite photos", "J1"],
+                       ["3 Wills St", "Augathella", "", "", "J2"]])
+    out_dir = tmp_path / "out"
+
+    stats = merge(source, out_dir)
+
+    assert (stats.rendered, stats.failed) == (2, 0)
+    assert stats.unmapped == ["Job no"]
+    first = read_output(out_dir, "jobs-000001.json")
+    assert first["Street address"] == "12 Alfred St"
+    assert first["Suburb/locality"] == "Charleville"  # Blank cell keeps the default
+    assert first["Reference documentation"] == "Plans rev B\nSite photos"
+    # Certifier matched by name only: no approval number from another job
+    assert first["Building certifier reference number"] == "A1160915"
+    assert "Building development approval number" not in first
+    assert first["Mobile"] == "0476755014"
+    assert read_output(out_dir, "jobs-000002.json")["Suburb/locality"] == "Augathella"
+    assert os.path.exists(out_dir / "jobs-000002.docx")
+    assert not os.path.exists(out_dir / CHECKPOINT_NAME)
+
+
+def test_certifier_matched_by_approval_number_fills_everything():
+    layers = RecordLayers(DEFAULTS, GLOBAL_DETAILS)
+    merged = layers.merge({"Building certifier's name (in full)": "Kevin Mizen",
+                           "Building development approval number": "BA7860"})
+    assert merged["Building certifier reference number"] == "A1160915"
+    assert merged["Building development approval number"] == "BA7860"
+
+
+def test_interrupted_merge_resumes_after_last_finished_row(tmp_path):
+    source = tmp_path / "jobs.csv"
+    write_csv(source, [[f"{n} Alfred St", "", "", f"line one\nline {n}", f"J{n}"] for n in range(1, 8)])
+    out_dir = tmp_path / "out"
+
+    def interrupt_after_three(row, result):
+        if row.number == 3:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        merge(source, out_dir, progress=interrupt_after_three, checkpoint_every=100, name_column="Job no")
+    with open(out_dir / CHECKPOINT_NAME) as f:
+        assert json.load(f)["row"] == 3
+
+    finished = []
+    stats = merge(source, out_dir, progress=lambda row, result: finished.append(row.number),
+                  name_column="Job no")
+
+    assert finished == [4, 5, 6, 7]
+    assert (stats.rendered, stats.failed) == (7, 0)
+    assert read_output(out_dir, "000004-J4.json")["Reference documentation"] == "line one\nline 4"
+    assert not os.path.exists(out_dir / CHECKPOINT_NAME)
+
+
+def test_bad_json_lines_fail_only_their_row(tmp_path):
+    source = tmp_path / "jobs.jsonl"
+    with open(source, 'w') as f:
+        f.write('{"Street address": "1 Edward St", "Postcode": 4470}\n')
+        f.write('{"Street address": \n')
+        f.write('\n')
+        f.write('["not", "an", "object"]\n')
+        f.write('{"Street address": "5 Edward St"}\n')
+    out_dir = tmp_path / "out"
+
+    stats = merge(source, out_dir, workers=2)
+
+    assert (stats.rendered, stats.failed) == (2, 2)
+    assert read_output(out_dir, "jobs-000001.json")["Postcode"] == "4470"
+    assert read_output(out_dir, "jobs-000004.json")["Street address"] == "5 Edward St"
+
+
+def test_rows_are_read_lazily(tmp_path):
+    source = tmp_path / "jobs.jsonl"
+    with open(source, 'w') as f:
+        for n in range(1000):
+            f.write(json.dumps({"Street address": f"{n} Alfred St"}) + "\n")
+
+    rows = iter_rows(str(source), 'jsonl')
+    assert next(rows) is None  # No header for JSON Lines
+    first = next(rows)
+    assert (first.number, first.data) == (1, {"Street address": "0 Alfred St"})
+    # Resuming from a row's offset continues with the next row
+    resumed = iter_rows(str(source), 'jsonl', first.offset, first.number)
+    next(resumed)
+    assert next(resumed).data == {"Street address": "1 Alfred St"}
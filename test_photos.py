@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Tests for downscaling and embedding inspection photos.
+"""
+
+import io
+import os
+import sys
+import zipfile
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from photos import (EMU_PER_PIXEL, PHOTOS_FIELD, PhotoCache, allow_photos, checked_photo_paths, photo_paths,
+                    prepare_photos, shared_photo_cache)
+from render import load_engine
+from rendercache import form_key
+
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, 'template.docx')
+
+
+@pytest.fixture(autouse=True)
+def photo_dir(tmp_path):
+    allow_photos([str(tmp_path)])
+    yield tmp_path
+    allow_photos(())
+
+
+def phone_photo(path, colour=(120, 90, 60)):
+    """
+    A landscape JPEG tagged to be shown rotated a quarter turn, as phones save portrait shots
+    """
+    image = Image.new('RGB', (3000, 2000), colour)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise to view
+    image.save(path, 'JPEG', quality=95, exif=exif.tobytes())
+    return str(path)
+
+
+def test_photos_are_turned_upright_downscaled_and_cached(tmp_path):
+    paths = [phone_photo(tmp_path / "a.jpg"), phone_photo(tmp_path / "b.jpg", (10, 200, 30))]
+    cache = PhotoCache(str(tmp_path / "cache"))
+
+    results = prepare_photos(paths, cache, workers=2)
+    assert [r.source for r in results] == paths
+    assert all(r.ok and not r.cached for r in results)
+    assert results[0].size == (1067, 1600)
+    assert Image.open(io.BytesIO(results[0].data)).size == (1067, 1600)
+    assert results[0].bytes_saved > 0 and results[0].elapsed > 0
+    assert "saved" in results[0].describe()
+
+    again = prepare_photos(paths, cache)
+    assert all(r.cached for r in again) and [r.data for r in again] == [r.data for r in results]
+    assert cache.stats["hits"] == 2
+
+    missing = prepare_photos([str(tmp_path / "missing.jpg")], cache)[0]
+    assert not missing.ok and "FAILED" in missing.describe()
+
+
+def test_photo_field_lists_paths():
+    assert photo_paths({PHOTOS_FIELD: " a.jpg; b.jpg ;\nc.jpg;"}) == ["a.jpg", "b.jpg", "c.jpg"]
+    assert photo_paths({}) == []
+
+
+@pytest.mark.parametrize("engine", ["docx", "zip"])
+def test_photos_are_embedded_in_the_document(tmp_path, monkeypatch, engine):
+    monkeypatch.chdir(tmp_path)  # Keep the photo cache out of the project
+    photo = phone_photo(tmp_path / "site.jpg")
+    form_data = {"Street address": "12 Alfred St", PHOTOS_FIELD: photo}
+    output = io.BytesIO()
+    load_engine(TEMPLATE_PATH, engine).render(form_data, output)
+
+    with zipfile.ZipFile(output) as docx:
+        # The template's own image is a PNG
+        media = [name for name in docx.namelist() if name.startswith("word/media/") and name.endswith(".jpg")]
+        assert len(media) == 1
+        assert docx.getinfo(media[0]).file_size < os.path.getsize(photo)
+        assert b"site.jpg" in docx.read("word/document.xml")
+
+
+def test_render_cache_key_follows_photo_contents(tmp_path):
+    template = load_engine(TEMPLATE_PATH, 'zip')
+    photo = phone_photo(tmp_path / "site.jpg")
+    form_data = {PHOTOS_FIELD: photo}
+    key = form_key(template, form_data)
+    assert key != form_key(template, {})
+
+    phone_photo(tmp_path / "site.jpg", (0, 0, 0))
+    assert form_key(template, form_data) != key
+
+
+def test_small_photos_are_not_enlarged(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    photo = tmp_path / "small.png"
+    Image.new('RGB', (200, 100), (200, 10, 10)).save(photo)
+    result = prepare_photos([str(photo)])[0]
+    assert result.size == (200, 100) and result.bytes_saved >= 0
+
+    output = io.BytesIO()
+    load_engine(TEMPLATE_PATH, 'docx').render({PHOTOS_FIELD: str(photo)}, output)
+    with zipfile.ZipFile(output) as docx:
+        assert f'cx="{200 * EMU_PER_PIXEL}" cy="{100 * EMU_PER_PIXEL}"'.encode() in docx.read("word/document.xml")
+    assert shared_photo_cache() is shared_photo_cache()
+
+
+def test_photos_are_only_read_from_allowed_directories(tmp_path):
+    inside = phone_photo(tmp_path / "site.jpg")
+    outside_dir = tmp_path.parent / f"{tmp_path.name}-outside"
+    outside_dir.mkdir()
+    outside = phone_photo(outside_dir / "secret.jpg")
+    os.symlink(outside, tmp_path / "link.jpg")
+    template = load_engine(TEMPLATE_PATH, 'zip')
+
+    assert checked_photo_paths({PHOTOS_FIELD: inside}) == [inside]
+    escapes = (outside, str(tmp_path / "link.jpg"), str(tmp_path / ".." / outside_dir.name / "secret.jpg"))
+    for path in escapes:
+        with pytest.raises(ValueError, match="outside the allowed"):
+            load_engine(TEMPLATE_PATH, 'zip').render({PHOTOS_FIELD: path}, io.BytesIO())
+        with pytest.raises(ValueError):
+            form_key(template, {PHOTOS_FIELD: path})
+
+    allow_photos(())
+    with pytest.raises(ValueError, match="--photo-dir"):
+        template.render({PHOTOS_FIELD: inside}, io.BytesIO())
+    assert checked_photo_paths({}) == []
+    allow_photos(None)
+    assert checked_photo_paths({PHOTOS_FIELD: outside}) == [outside]
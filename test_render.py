@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Tests for headless DOCX rendering.
+"""
+
+import json
+import os
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+from docx import Document
+from lxml import etree
+
+from render import fill_document, format_summary, output_paths_for, render_batch, render_batch_parallel
+from template import apply_run_replacements, clear_template_cache, load_template
+
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, 'template.docx')
+DEFAULTS_PATH = os.path.join(PROJECT_DIR, 'defaults.json')
+
+
+def document_text(path):
+    """
+    Collect the text of every body and table paragraph in a DOCX
+    """
+    doc = Document(path)
+    texts = [p.text for p in doc.paragraphs]
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                texts.extend(p.text for p in cell.paragraphs)
+    return "\n".join(texts)
+
+
+def test_render_batch_fills_placeholders(tmp_path):
+    with open(DEFAULTS_PATH) as f:
+        form_data = json.load(f)
+    form_data["Street address"] = "12 Alfred Street"
+    job = tmp_path / "job.json"
+    job.write_text(json.dumps(form_data))
+
+    results = render_batch([str(job)], str(tmp_path / "out"), TEMPLATE_PATH)
+
+    assert results[0].ok
+    text = document_text(results[0].output)
+    assert "12 Alfred Street" in text
+    assert "Murweh Shire Council" in text
+    assert "<<Street address>>" not in text
+    assert os.path.exists(str(tmp_path / "out" / "job.json"))
+
+
+def test_render_batch_isolates_failures(tmp_path):
+    bad = tmp_path / "bad.json"
+    bad.write_text("[1, 2]")
+    good = tmp_path / "good.json"
+    good.write_text(json.dumps({"Street address": "1 Main Street"}))
+
+    results = render_batch([str(bad), str(good)], str(tmp_path / "out"), TEMPLATE_PATH, write_json=False)
+
+    assert not results[0].ok
+    assert results[1].ok
+    assert "1 of 2 forms (1 failed)" in format_summary(results, 1.0)
+
+
+def test_forms_with_the_same_name_get_their_own_output(tmp_path):
+    paths = []
+    for directory, suburb in (("a", "Roma"), ("b", "Mitchell"), ("c", "Injune")):
+        (tmp_path / directory).mkdir()
+        job = tmp_path / directory / ("12.json" if directory != "c" else "12.JSON")
+        job.write_text(json.dumps({"Suburb/locality": suburb}))
+        paths.append(str(job))
+    out = str(tmp_path / "out")
+    assert [os.path.basename(p) for p in output_paths_for(paths, out)] == ["12.docx", "12-2.docx", "12-3.docx"]
+
+    results = render_batch_parallel(paths, out, TEMPLATE_PATH, workers=2)
+    assert [os.path.basename(r.output) for r in results] == ["12.docx", "12-2.docx", "12-3.docx"]
+    with open(os.path.join(out, "12-2.json")) as f:
+        assert json.load(f) == {"Suburb/locality": "Mitchell"}
+
+
+def test_compiled_template_matches_single_pass_scan(tmp_path):
+    with open(DEFAULTS_PATH) as f:
+        form_data = json.load(f)
+    template = load_template(TEMPLATE_PATH, cache_dir=str(tmp_path))
+
+    for variant in (form_data, dict(form_data, **{"Date (signature)": ""}), {}):
+        expected = fill_document(template.document(), variant)
+        actual = template.fill(template.document(), variant)
+        assert etree.tostring(actual.element) == etree.tostring(expected.element)
+
+
+def test_template_index_is_cached_on_disk(tmp_path):
+    clear_template_cache()
+    template = load_template(TEMPLATE_PATH, cache_dir=str(tmp_path))
+    assert (tmp_path / f"{template.hash}.json").exists()
+
+    clear_template_cache()
+    reloaded = load_template(TEMPLATE_PATH, cache_dir=str(tmp_path))
+    assert [s.to_dict() for s in reloaded.slots] == [s.to_dict() for s in template.slots]
+    assert "Street address" in reloaded.fields
+
+
+def test_parallel_batch_keeps_order_and_isolates_failures(tmp_path):
+    paths = []
+    for i in range(6):
+        job = tmp_path / f"job{i}.json"
+        job.write_text("not json" if i == 2 else json.dumps({"Street address": f"{i} Main Street"}))
+        paths.append(str(job))
+
+    results = render_batch_parallel(paths, str(tmp_path / "out"), TEMPLATE_PATH, write_json=False, workers=2)
+
+    assert [r.source for r in results] == paths
+    assert [r.ok for r in results] == [True, True, False, True, True, True]
+    assert "5 Main Street" in document_text(results[5].output)
+
+
+def test_run_replacement_handles_split_placeholders():
+    run_texts = ["Name: <", "<", "Street", " address>", "> and <<State>>!"]
+    edits = [((0, 6, 4, 1), "1 Main St"), ((4, 6, 4, 15), "QLD")]
+
+    assert apply_run_replacements(run_texts, edits) == ["Name: 1 Main St", None, None, None, " and QLD!"]
+
+
+def test_fill_keeps_run_formatting(tmp_path):
+    template = load_template(TEMPLATE_PATH, cache_dir=str(tmp_path))
+    doc = template.fill(template.document(), {"Postal address": "95-101 Alfred Street"})
+
+    paragraph = doc.tables[7].rows[5].cells[1].paragraphs[0]
+    assert paragraph.text == "95-101 Alfred Street"
+    assert paragraph.runs[0]._r.rPr is not None
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests for deterministic rendering and the content-addressed render cache.
+"""
+
+import io
+import json
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+import pytest
+
+from render import load_engine, render_batch
+from rendercache import RenderCache, form_key
+
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, 'template.docx')
+DEFAULTS_PATH = os.path.join(PROJECT_DIR, 'defaults.json')
+
+
+def load_defaults():
+    with open(DEFAULTS_PATH) as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("engine", ["docx", "zip"])
+def test_rendering_is_deterministic(engine):
+    template = load_engine(TEMPLATE_PATH, engine)
+    first, second = io.BytesIO(), io.BytesIO()
+    template.render(load_defaults(), first)
+    time.sleep(1.1)  # Zip timestamps have two-second resolution; make sure a stamp could change
+    template.render(load_defaults(), second)
+    assert first.getvalue() == second.getvalue()
+
+
+def test_key_ignores_field_order_and_unused_fields():
+    template = load_engine(TEMPLATE_PATH, 'zip')
+    form_data = load_defaults()
+    reordered = dict(reversed(list(form_data.items())), **{"Not in the template": "x"})
+
+    assert form_key(template, form_data) == form_key(template, reordered)
+    assert form_key(template, form_data) != form_key(template, dict(form_data, State="NSW"))
+    assert form_key(template, form_data) != form_key(load_engine(TEMPLATE_PATH, 'docx'), form_data)
+
+
+@pytest.mark.parametrize("link", [False, True])
+def test_hits_reuse_identical_bytes(tmp_path, link):
+    template = load_engine(TEMPLATE_PATH, 'zip')
+    cache = RenderCache(str(tmp_path / "cache"), link=link)
+    form_data = load_defaults()
+
+    assert not cache.render(template, form_data, str(tmp_path / "first.docx"))
+    assert cache.render(template, form_data, str(tmp_path / "second.docx"))
+    # A different form rendered over a hardlinked output must not change the cached copy
+    assert not cache.render(template, dict(form_data, State="NSW"), str(tmp_path / "second.docx"))
+    assert cache.render(template, form_data, str(tmp_path / "third.docx"))
+
+    with open(tmp_path / "first.docx", 'rb') as f:
+        expected = f.read()
+    with open(tmp_path / "third.docx", 'rb') as f:
+        assert f.read() == expected
+    assert (cache.stats["hits"], cache.stats["misses"]) == (2, 2)
+    assert "2 hits, 2 misses" in cache.report()
+
+
+def test_eviction_by_age_then_size(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_age=3600)
+    now = time.time()
+    for n, age in enumerate([7200, 30, 20, 10]):
+        source = tmp_path / f"{n}.docx"
+        source.write_bytes(b"x" * 100)
+        cache.store(f"{n:064x}", str(source))
+        os.utime(cache.path_for(f"{n:064x}"), (now - age, now - age))
+
+    cache.max_bytes = 250
+    assert cache.evict(now) == 2  # The expired entry, then the oldest until under 250 bytes
+    assert sorted(os.path.basename(path)[:64] for _, _, path in cache.entries()) == [f"{2:064x}", f"{3:064x}"]
+
+
+def test_batch_reports_cache_hits(tmp_path):
+    json_path = tmp_path / "form.json"
+    json_path.write_text(json.dumps(load_defaults()))
+    cache = RenderCache(str(tmp_path / "cache"), link=True)
+
+    first = render_batch([str(json_path)], str(tmp_path / "out"), TEMPLATE_PATH, engine='zip', cache=cache)
+    second = render_batch([str(json_path)], str(tmp_path / "out"), TEMPLATE_PATH, engine='zip', cache=cache)
+
+    assert [r.cached for r in first + second] == [False, True]
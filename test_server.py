@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Tests for the HTTP render service, using a local asyncio client.
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+from render import load_engine
+from server import RenderServer, attachment_name, percentile
+
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, 'template.docx')
+DEFAULTS_PATH = os.path.join(PROJECT_DIR, 'defaults.json')
+
+
+class SlowTemplate:
+    """
+    Stands in for an engine; each render blocks until released
+    """
+
+    path = "slow.docx"
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def render(self, form_data, output):
+        self.release.wait(5)
+        output.write(json.dumps(form_data).encode())
+
+
+async def request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+    if body is not None:
+        head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+    writer.write(head.encode() + b"\r\n" + (body or b""))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    status = int(head.split(b" ")[1])
+    headers = dict(line.split(": ", 1) for line in head.decode().split("\r\n")[1:])
+    return status, headers, payload
+
+
+def run_with_server(template, scenario, **kwargs):
+    async def main():
+        server = RenderServer(template, port=0, **kwargs)
+        port = await server.start()
+        try:
+            return await scenario(server, port)
+        finally:
+            await server.close()
+    return asyncio.run(main())
+
+
+def test_render_returns_the_same_docx_as_the_engine():
+    template = load_engine(TEMPLATE_PATH, 'zip')
+    with open(DEFAULTS_PATH, 'rb') as f:
+        body = f.read()
+
+    async def scenario(server, port):
+        return await request(port, 'POST', '/render?name=job-12.docx', body)
+
+    status, headers, payload = run_with_server(template, scenario)
+
+    expected = io.BytesIO()
+    template.render(json.loads(body), expected)
+    assert status == 200
+    assert headers["Content-Disposition"] == 'attachment; filename="job-12.docx"'
+    assert payload == expected.getvalue()
+
+
+def test_bad_requests_are_rejected():
+    async def scenario(server, port):
+        return [
+            (await request(port, 'POST', '/render', b'["not", "an", "object"]'))[0],
+            (await request(port, 'POST', '/render', b'{"broken": '))[0],
+            (await request(port, 'GET', '/render'))[0],
+            (await request(port, 'GET', '/nowhere'))[0],
+        ]
+
+    assert run_with_server(load_engine(TEMPLATE_PATH, 'zip'), scenario) == [400, 400, 405, 404]
+
+
+def test_full_queue_answers_429_and_metrics_report_it():
+    template = SlowTemplate()
+
+    async def wait_for(condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    async def scenario(server, port):
+        # One render in progress plus one waiting fills the server; the rest are turned away
+        requests = [asyncio.ensure_future(request(port, 'POST', '/render', b'{"n": "0"}'))]
+        await wait_for(lambda: server.metrics.in_flight == 1)
+        requests += [asyncio.ensure_future(request(port, 'POST', '/render', b'{"n": "%d"}' % n)) for n in range(1, 4)]
+        await wait_for(lambda: server.metrics.rejected == 2)
+        status, _, payload = await request(port, 'GET', '/metrics')
+        template.release.set()
+        results = await asyncio.gather(*requests)
+        return json.loads(payload), sorted(result[0] for result in results)
+
+    metrics, statuses = run_with_server(template, scenario, workers=1, queue_size=1)
+
+    assert statuses == [200, 200, 429, 429]
+    assert metrics["rejected"] == 2
+    assert metrics["queue_depth"] == 1
+    assert metrics["in_flight"] == 1
+    assert metrics["responses"] == {"429": 2}
+
+
+def test_attachment_names_cannot_inject_headers():
+    assert attachment_name("job-12.docx") == "job-12.docx"
+    assert attachment_name("../../etc/job_3.docx") == "job_3.docx"
+    for name in ("", "..", "a\r\nSet-Cookie: x=1.docx", 'a".docx', "caf\u00e9.docx"):
+        assert attachment_name(name) == "form12.docx"
+
+    template = load_engine(TEMPLATE_PATH, 'zip')
+
+    async def scenario(server, port):
+        return await request(port, 'POST', '/render?name=a.docx%0d%0aSet-Cookie:%20x=1', b'{}')
+
+    status, headers, _ = run_with_server(template, scenario)
+    assert status == 200 and "Set-Cookie" not in headers
+    assert headers["Content-Disposition"] == 'attachment; filename="form12.docx"'
+
+
+def test_photo_paths_are_refused():
+    template = load_engine(TEMPLATE_PATH, 'zip')
+
+    async def scenario(server, port):
+        body = json.dumps({"Inspection photos": "/etc/ssl/certs/photo.jpg"}).encode()
+        return await request(port, 'POST', '/render', body)
+
+    status, _, payload = run_with_server(template, scenario)
+    assert status == 400 and b"Inspection photos" in payload
+
+
+def test_latency_percentiles():
+    values = [n / 1000 for n in range(1, 101)]
+    assert percentile(values, 0.50) == 0.05
+    assert percentile(values, 0.99) == 0.099
+    assert percentile([], 0.5) is None
+
+    template = load_engine(TEMPLATE_PATH, 'zip')
+
+    async def scenario(server, port):
+        for _ in range(3):
+            await request(port, 'POST', '/render', b'{}')
+        return json.loads((await request(port, 'GET', '/metrics'))[2])
+
+    metrics = run_with_server(template, scenario)
+    assert metrics["latency_samples"] == 3
+    assert metrics["render_latency_ms"]["p50"] > 0
+    assert metrics["responses"] == {"200": 3}
+
+
+def test_requests_can_pick_a_template_from_the_registry(tmp_path):
+    from docx import Document
+    from templateregistry import TemplateRegistry
+
+    doc = Document()
+    doc.add_paragraph("Notice: <<Street address>>")
+    doc.save(str(tmp_path / "notice.docx"))
+    registry = TemplateRegistry(str(tmp_path), cache_dir=None)
+    body = b'{"Street address": "12 Alfred St"}'
+
+    async def scenario(server, port):
+        listed = json.loads((await request(port, 'GET', '/templates'))[2])
+        notice = await request(port, 'POST', '/render?template=notice', body)
+        unknown = await request(port, 'POST', '/render?template=../template', body)
+        return listed, notice, unknown[0]
+
+    listed, notice, unknown = run_with_server(load_engine(TEMPLATE_PATH, 'zip'), scenario, registry=registry)
+
+    assert listed == {"templates": ["notice"]}
+    assert notice[0] == 200
+    assert Document(io.BytesIO(notice[2])).paragraphs[0].text == "Notice: 12 Alfred St"
+    assert unknown == 404
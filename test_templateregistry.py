@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the registry of compiled templates.
+"""
+
+import os
+import shutil
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+from docx import Document
+
+import template
+from merge import run_merge
+from templateregistry import TemplateRegistry
+
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, 'template.docx')
+
+
+def build_template(path, text):
+    doc = Document()
+    doc.add_paragraph(text)
+    doc.save(path)
+
+
+def counting_compiles(monkeypatch):
+    compiled = []
+    compile_template = template.compile_template
+
+    def compile_and_count(path, data, content_hash, cache_dir=None):
+        compiled.append(os.path.basename(path))
+        return compile_template(path, data, content_hash, cache_dir)
+
+    monkeypatch.setattr(template, "compile_template", compile_and_count)
+    return compiled
+
+
+def test_templates_are_picked_by_name_and_compiled_once(tmp_path, monkeypatch):
+    compiled = counting_compiles(monkeypatch)
+    shutil.copy(TEMPLATE_PATH, tmp_path / "form12.docx")
+    build_template(str(tmp_path / "notice.docx"), "Notice for <<Street address>>")
+    (tmp_path / "~$form12.docx").write_bytes(b"Word lock file")
+    registry = TemplateRegistry(str(tmp_path), cache_dir=None)
+
+    assert registry.names() == ["form12", "notice"]
+    assert registry.has("notice.docx") and not registry.has("missing") and not registry.has(TEMPLATE_PATH)
+    assert registry.preload(('docx', 'zip')) == 2
+    for name in ("form12", "notice", "notice.docx", str(tmp_path / "notice.docx")):
+        registry.get(name, 'zip')
+    assert sorted(compiled) == ["form12.docx", "notice.docx"]
+    assert registry.get("notice").fields == ["Street address"]
+    assert registry.get("form12", 'zip') is registry.get("form12", 'zip')
+
+
+def test_changed_templates_are_reloaded_only_when_their_contents_change(tmp_path, monkeypatch):
+    compiled = counting_compiles(monkeypatch)
+    path = str(tmp_path / "notice.docx")
+    build_template(path, "<<Street address>>")
+    registry = TemplateRegistry(str(tmp_path), cache_dir=None)
+    first = registry.get("notice")
+
+    # Touched but unchanged: re-hashed, not recompiled
+    os.utime(path, ns=(1, 1))
+    assert registry.get("notice") is first
+
+    build_template(path, "<<Postcode>>")
+    os.utime(path, ns=(2, 2))
+    assert registry.get("notice").fields == ["Postcode"]
+    assert compiled == ["notice.docx", "notice.docx"]
+    assert registry.stats["reloads"] == 1 and len(registry) == 1
+
+
+def test_least_recently_used_templates_are_evicted(tmp_path, monkeypatch):
+    compiled = counting_compiles(monkeypatch)
+    for name in ("a", "b", "c"):
+        build_template(str(tmp_path / f"{name}.docx"), f"<<{name}>>")
+    registry = TemplateRegistry(str(tmp_path), max_templates=2, cache_dir=None)
+
+    for name in ("a", "b", "a", "c", "a"):
+        registry.get(name)
+    assert compiled == ["a.docx", "b.docx", "c.docx"]
+    assert len(registry) == 2 and registry.stats["evictions"] == 1
+    registry.get("b")
+    assert compiled[-1] == "b.docx"
+
+
+def test_merge_rows_pick_their_template(tmp_path):
+    build_template(str(tmp_path / "notice.docx"), "Notice: <<Street address>>")
+    registry = TemplateRegistry(str(tmp_path), cache_dir=None)
+    source = tmp_path / "jobs.csv"
+    source.write_text("Street address,Form\n1 Main St,\n2 Main St,notice\n3 Main St,nothing\n")
+
+    results = []
+    stats = run_merge(str(source), str(tmp_path / "out"), TEMPLATE_PATH, write_json=False,
+                      template_column="Form", registry=registry,
+                      progress=lambda row, result: results.append(result))
+
+    assert stats.rendered == 2 and stats.failed == 1 and stats.unmapped == []
+    assert results[2].error == "Unknown template: nothing"
+    assert Document(results[1].output).paragraphs[0].text == "Notice: 2 Main St"
+    assert "1 Main St" in "\n".join(cell.text for table in Document(results[0].output).tables
+                                    for row in table.rows for cell in row.cells)
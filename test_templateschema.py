@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for deriving the form fields from a template's placeholders.
+"""
+
+import os
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+from docx import Document
+from docx.shared import Inches
+
+import templateschema
+from formfields import FORM_FIELD_CONFIGS
+from templateschema import field_configs_for_template, load_template_schema
+
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, 'template.docx')
+
+
+def build_template(path):
+    doc = Document()
+    doc.add_heading("1. Site", level=4)
+    doc.add_paragraph("Address: <<Street address>>")
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "<<Site notes>>"
+    table.rows[0].height = Inches(1.5)
+    table.cell(1, 0).text = "<<Weather>>"
+    doc.add_heading("2. Sign-off", level=4)
+    doc.add_paragraph("<<Date (signature)>>")
+    doc.save(path)
+
+
+def test_default_template_gives_the_configured_form(tmp_path):
+    schema = load_template_schema(TEMPLATE_PATH, cache_dir=str(tmp_path))
+    assert schema.warnings() == []
+    # The same fields, types and headers, plus a header for section 1
+    assert schema.field_configs[0] == ("header1", "header", "1. Indicate the aspect of the building work")
+    assert schema.field_configs[1:] == FORM_FIELD_CONFIGS
+
+
+def test_other_templates_get_their_own_fields_and_warnings(tmp_path, capsys):
+    path = str(tmp_path / "other.docx")
+    build_template(path)
+    schema = load_template_schema(path, cache_dir=None)
+    assert schema.field_configs == [
+        ("header1", "header", "1. Site"),
+        ("Street address", "text"),
+        ("Site notes", "textarea"),  # Tall row
+        ("Weather", "text"),
+        ("header2", "header", "2. Sign-off"),
+        ("Inspection photos", "photos"),  # GUI-only fields go before the next field the template has
+        ("Signature (Manual)", "disabled_text"),
+        ("Date (signature)", "text"),
+    ]
+    assert schema.unknown_placeholders == ["Site notes", "Weather"]
+    assert "Suburb/locality" in schema.missing_fields and "Signature (Manual)" not in schema.missing_fields
+
+    assert field_configs_for_template(path, cache_dir=None) == schema.field_configs
+    output = capsys.readouterr().out
+    assert "no known form field" in output and "no placeholder in the template" in output
+
+
+def test_scans_are_cached_by_template_hash(tmp_path, monkeypatch):
+    path = str(tmp_path / "other.docx")
+    build_template(path)
+    cache_dir = str(tmp_path / "cache")
+    first = load_template_schema(path, cache_dir=cache_dir)
+    assert os.listdir(cache_dir) == [f"{first.hash}.json"]
+
+    def no_scan(xml):
+        raise AssertionError("template scanned again")
+
+    monkeypatch.setattr(templateschema, "scan_document_xml", no_scan)
+    assert load_template_schema(path, cache_dir=cache_dir).field_configs == first.field_configs
+
+
+def test_unreadable_template_falls_back_to_the_configured_form(tmp_path):
+    assert field_configs_for_template(str(tmp_path / "missing.docx"), cache_dir=None) == FORM_FIELD_CONFIGS
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests for checking form values before rendering.
+"""
+
+import json
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+import pytest
+
+from formfields import FIELD_RULES
+from merge import validate_merge
+from validation import Validator, default_validator, template_fields, validate_files
+
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, 'template.docx')
+
+GOOD = {
+    "State": "QLD",
+    "Postcode": "4470",
+    "Building development approval number": "BA7860",
+    "Business phone number": "07 4656 8330",
+    "Mobile": "0476 755 014",
+    "Email address": "office@example.com.au",
+    "Date request to inspect received from building certifier": "2025-11-18",
+    "Date (signature)": "2025-11-19",
+}
+
+
+def test_good_forms_pass():
+    assert default_validator().check_form(GOOD) == {}
+    with open(os.path.join(PROJECT_DIR, 'defaults.json')) as f:
+        defaults = json.load(f)
+    assert default_validator().check_form(dict(defaults, **GOOD)) == {}
+    # Only required fields may be left blank
+    assert default_validator().check_form({"Building development approval number": "BA1"}) == {}
+
+
+@pytest.mark.parametrize("field, value", [
+    ("Postcode", "447"),
+    ("Postcode", "44700"),
+    ("State", "Queensland"),
+    ("Building development approval number", "  "),
+    ("Business phone number", "07 4656 833"),
+    ("Mobile", "0746568330"),
+    ("Email address", "office.example.com"),
+    ("Date (signature)", "19/11/2025"),
+    ("Date request to inspect received from building certifier", "2025-02-30"),
+])
+def test_bad_values_are_caught(field, value):
+    problems = default_validator().check_form(dict(GOOD, **{field: value}))
+    assert list(problems) == [field]
+    assert default_validator().check(field, value) == [problems[field]]
+
+
+def test_batch_report_lists_each_problem():
+    records = [GOOD, dict(GOOD, Postcode="447", **{"Date (signature)": "19/11/2025"}), GOOD, {}]
+    report = default_validator().validate(records, sources=["a.json", "b.json", "c.json", "d.json"])
+    assert not report.ok and report.records == 4 and report.invalid_records() == 2
+
+    data = report.to_dict()
+    assert data["by_rule"] == {"postcode": 1, "iso_date": 1, "required": 1}
+    assert [(e["source"], e["field"], e["value"]) for e in data["errors"]] == [
+        ("b.json", "Postcode", "447"),
+        ("b.json", "Date (signature)", "19/11/2025"),
+        ("d.json", "Building development approval number", ""),
+    ]
+    # A second batch carries on the record numbering
+    default_validator().validate([{}], report=report)
+    assert report.errors[-1]["record"] == 4
+
+
+def test_batches_are_checked_quickly():
+    records = [dict(GOOD, Postcode=str(4000 + n % 1000)) for n in range(20000)]
+    start = time.perf_counter()
+    report = default_validator().validate(records)
+    assert report.ok
+    assert time.perf_counter() - start < 2  # Typically well under 0.2 s
+
+
+def test_unknown_rules_are_rejected():
+    with pytest.raises(ValueError, match="postcod"):
+        Validator({"Postcode": ("postcod",)})
+    assert set(default_validator().checks) == set(FIELD_RULES)
+
+
+def test_files_and_merge_sources_are_validated(tmp_path):
+    good, bad, broken = tmp_path / "good.json", tmp_path / "bad.json", tmp_path / "broken.json"
+    good.write_text(json.dumps(GOOD))
+    bad.write_text(json.dumps(dict(GOOD, Mobile="0476 755")))
+    broken.write_text("not json")
+    report = validate_files([str(good), str(bad), str(broken)], template_fields(TEMPLATE_PATH))
+    assert [(e["source"], e["rule"]) for e in report.errors] == [(str(broken), "readable"), (str(bad), "mobile")]
+
+    report_path = tmp_path / "report.json"
+    report.write(str(report_path))
+    assert json.loads(report_path.read_text())["invalid_records"] == 2
+
+    # Each unreadable file is a record of its own
+    missing = tmp_path / "missing.json"
+    report = validate_files([str(broken), str(good), str(missing)], template_fields(TEMPLATE_PATH))
+    assert [(e["source"], e["record"]) for e in report.errors] == [(str(broken), 0), (str(missing), 1)]
+    assert report.records == 3 and report.invalid_records() == 2
+
+    source = tmp_path / "jobs.csv"
+    source.write_text("postcode,ba number,date signed\n"
+                      "4470,BA1,2025-11-19\n"
+                      "447,BA2,2025-11-19\n"
+                      "4470,,19/11/2025\n")
+    report = validate_merge(str(source), defaults=GOOD, mapping={"ba number": "Building development approval number",
+                                                                 "date signed": "Date (signature)"},
+                            chunk_size=2)
+    assert report.records == 3
+    assert [(e["source"], e["field"]) for e in report.errors] == [
+        (f"{source}:2", "Postcode"),
+        (f"{source}:3", "Date (signature)"),
+    ]
+
+    # A resumed merge only checks the rows it has still to render
+    header, first, second = source.read_text().splitlines(keepends=True)[:3]
+    checkpoint = {"offset": len(header + first + second), "row": 2, "header": ["postcode", "ba number", "date signed"]}
+    report = validate_merge(str(source), defaults=GOOD, mapping={"date signed": "Date (signature)"},
+                            checkpoint=checkpoint)
+    assert report.records == 1
+    assert [e["source"] for e in report.errors] == [f"{source}:3"]
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the watch-folder daemon.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+import pytest
+
+from render import load_engine
+from watch import STATE_NAME, FolderWatcher, Inotify
+
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, 'template.docx')
+
+
+@pytest.fixture(scope="module")
+def template():
+    return load_engine(TEMPLATE_PATH, 'zip')
+
+
+def write_form(path, **fields):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(dict({"State": "QLD"}, **fields), f)
+    # Backdated, as cp -p would leave it
+    past = time.time() - 60
+    os.utime(path, (past, past))
+
+
+def rendered(results):
+    return sorted(result.source for result in results if result.ok)
+
+
+def test_only_real_changes_are_rendered(tmp_path, template):
+    source, out = tmp_path / "drop", tmp_path / "drop" / "out"
+    write_form(str(source / "a.json"), Suburb="Roma")
+    write_form(str(source / "site" / "b.json"), Suburb="Mitchell")
+
+    watcher = FolderWatcher(str(source), str(out), template, settle=0)
+    assert rendered(watcher.run_once()) == ["a.json", "site/b.json"]
+    assert (out / "site" / "b.docx").exists() and (out / "site" / "b.json").exists()
+    assert watcher.run_once() == []
+
+    # A restart reads the state file; touching a file without changing it renders nothing
+    os.utime(source / "a.json")
+    restarted = FolderWatcher(str(source), str(out), template, settle=0)
+    assert restarted.run_once() == []
+    write_form(str(source / "site" / "b.json"), Suburb="Augathella")
+    assert rendered(restarted.run_once()) == ["site/b.json"]
+
+    os.remove(source / "a.json")
+    restarted.run_once()
+    with open(out / STATE_NAME) as f:
+        assert sorted(json.load(f)["files"]) == ["site/b.json"]
+
+
+def test_partially_written_files_wait_to_settle(tmp_path, template):
+    source = tmp_path / "drop"
+    source.mkdir()
+    watcher = FolderWatcher(str(source), str(tmp_path / "out"), template, settle=2)
+    path = source / "new.json"
+    path.write_text('{"State": "Q')
+    now = time.time()
+
+    assert watcher.scan(now) == []
+    path.write_text('{"State": "QLD", "Suburb/locality": "Roma"}')
+    os.utime(path, (now + 1.5, now + 1.5))
+    assert watcher.scan(now + 1.5) == []  # Changed again, so the timer restarted
+    assert watcher.scan(now + 3) == []
+    assert watcher.scan(now + 4) == ["new.json"]
+    assert rendered(watcher.process(["new.json"])) == ["new.json"]
+
+
+def test_old_mtimes_still_wait_to_settle(tmp_path, template):
+    source = tmp_path / "drop"
+    write_form(str(source / "copied.json"), Suburb="Roma")
+    watcher = FolderWatcher(str(source), str(tmp_path / "out"), template, settle=2)
+    now = time.time()
+
+    assert watcher.scan(now) == []
+    assert watcher.scan(now + 1) == []
+    assert watcher.scan(now + 2) == ["copied.json"]
+
+    watcher = FolderWatcher(str(source), str(tmp_path / "out"), template, settle=0.1)
+    assert rendered(watcher.run_once(wait=True)) == ["copied.json"]
+
+
+def test_invalid_json_is_reported_once(tmp_path, template):
+    source = tmp_path / "drop"
+    source.mkdir()
+    (source / "broken.json").write_text("{not json")
+    watcher = FolderWatcher(str(source), str(tmp_path / "out"), template, settle=0)
+
+    results = watcher.run_once()
+    assert [result.ok for result in results] == [False]
+    assert "Invalid form JSON" in results[0].error
+    assert watcher.run_once() == []
+
+
+@pytest.mark.skipif(not Inotify.available(), reason="inotify is not available")
+def test_inotify_picks_up_new_files(tmp_path, template):
+    source = tmp_path / "drop"
+    source.mkdir()
+    results = []
+    stop = threading.Event()
+    watcher = FolderWatcher(str(source), str(tmp_path / "out"), template, settle=0.2, progress=results.append)
+    thread = threading.Thread(target=watcher.run, kwargs={"use_inotify": True, "should_stop": stop.is_set})
+    thread.start()
+    try:
+        time.sleep(0.2)
+        (source / "nested").mkdir()
+        (source / "nested" / "job.json").write_text('{"State": "QLD"}')
+        deadline = time.monotonic() + 10
+        while not results and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        thread.join()
+    assert rendered(results) == ["nested/job.json"]
+    assert (tmp_path / "out" / "nested" / "job.docx").exists()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the GUI background worker, driven without a display.
+"""
+
+import os
+import sys
+import threading
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+from worker import BackgroundWorker
+
+
+class FakeRoot:
+    """
+    Stands in for tk.Tk: after() callbacks are run by pump() instead of a main loop
+    """
+
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, delay, callback):
+        self.callbacks.append(callback)
+
+    def pump(self):
+        while self.callbacks:
+            callbacks, self.callbacks = self.callbacks, []
+            for callback in callbacks:
+                callback()
+            time.sleep(0.01)
+
+
+def test_jobs_run_in_order_and_report_on_main_thread():
+    root = FakeRoot()
+    statuses = []
+    results = []
+    worker = BackgroundWorker(root, on_status=statuses.append)
+    main_thread = threading.current_thread()
+
+    def job(value):
+        def run(progress):
+            progress(f"working on {value}")
+            return value
+        return run
+
+    def on_success(value):
+        assert threading.current_thread() is main_thread
+        results.append(value)
+
+    for value in range(3):
+        worker.submit(job(value), on_success, description=f"queued {value}")
+    root.pump()
+    worker.shutdown()
+
+    assert results == [0, 1, 2]
+    assert worker.pending == 0
+    assert "working on 2" in statuses
+
+
+def test_errors_go_to_the_error_callback():
+    root = FakeRoot()
+    errors = []
+    worker = BackgroundWorker(root)
+
+    def fail(progress):
+        raise IOError("share unavailable")
+
+    worker.submit(fail, on_error=errors.append)
+    root.pump()
+    worker.shutdown()
+
+    assert [str(e) for e in errors] == ["share unavailable"]